@@ -1,6 +1,9 @@
 # backend/contabilidad/admin.py
 from django.contrib import admin
-from .models import Cuenta, AsientoContable, MovimientoContable, PeriodoContable
+from . import cache_reportes, catalogo
+from .models import (
+    Cuenta, AsientoContable, ConceptoExogena, MovimientoContable, PeriodoContable, SaldoCierre, SaldoCuentaPeriodo,
+)
 
 #class MovimientoContableInline(admin.TabularInline):
   #  """
@@ -16,6 +19,18 @@ class CuentaAdmin(admin.ModelAdmin):
     search_fields = ("codigo", "nombre")
     list_filter = ("padre",)
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        catalogo.reconstruir_ancestros()
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        catalogo.reconstruir_ancestros()
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        catalogo.reconstruir_ancestros()
+
 class MovimientoInline(admin.TabularInline):
     model = MovimientoContable
     extra = 0
@@ -82,7 +97,57 @@ class MovimientoContableAdmin(admin.ModelAdmin):
     """
     Configuración del admin para Movimientos Contables
     """
-    list_display = ['asiento', 'cuenta', 'debito', 'credito']
-    list_filter = ['asiento__fecha', 'cuenta']
+    list_display = ['asiento', 'fecha', 'cuenta', 'debito', 'credito']
+    list_filter = ['fecha', 'estado', 'cuenta']
     search_fields = ['asiento__concepto', 'cuenta__nombre']
 
+
+
+@admin.register(SaldoCuentaPeriodo)
+class SaldoCuentaPeriodoAdmin(admin.ModelAdmin):
+    """
+    Tabla resumen de solo lectura (se reconstruye con `manage.py reconstruir_saldos`)
+    """
+    list_display = ['cuenta', 'fiscal_year', 'fiscal_period', 'debito', 'credito']
+    list_filter = ['fiscal_year', 'fiscal_period']
+    search_fields = ['cuenta__codigo', 'cuenta__nombre']
+
+    def has_add_permission(self, request): return False
+    def has_change_permission(self, request, obj=None): return False
+
+
+@admin.register(SaldoCierre)
+class SaldoCierreAdmin(admin.ModelAdmin):
+    """
+    Fotos de cierre de solo lectura (se generan al cerrar el PeriodoContable)
+    """
+    list_display = ['anio', 'cuenta', 'saldo']
+    list_filter = ['anio']
+    search_fields = ['cuenta__codigo', 'cuenta__nombre']
+
+    def has_add_permission(self, request): return False
+    def has_change_permission(self, request, obj=None): return False
+
+
+@admin.register(ConceptoExogena)
+class ConceptoExogenaAdmin(admin.ModelAdmin):
+    """
+    Mapeo cuenta → concepto DIAN de Medios Magnéticos. Cambiarlo invalida los
+    reportes cacheados (versión global del libro).
+    """
+    list_display = ['formato', 'concepto', 'prefijo_cuenta', 'columna', 'calculo', 'activo']
+    list_editable = ['activo']
+    list_filter = ['formato', 'calculo', 'activo']
+    search_fields = ['concepto', 'prefijo_cuenta']
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        cache_reportes.incrementar_version(cache_reportes.LIBRO)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        cache_reportes.incrementar_version(cache_reportes.LIBRO)
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        cache_reportes.incrementar_version(cache_reportes.LIBRO)
\ No newline at end of file
@@ -0,0 +1,148 @@
+# contabilidad/busqueda.py
+"""
+Índice en memoria para autocompletar cuentas del PUC.
+
+Se arma una vez por proceso desde el catálogo y se reconstruye cuando cambia
+la versión 'catalogo' (ver cache_reportes.CATALOGO):
+- un trie de códigos: "1105" devuelve 1105, 110505, 110510... de menor a mayor profundidad;
+- un índice de palabras del nombre sin tildes ni mayúsculas ("deposito" encuentra
+  "Depósitos"), con búsqueda por prefijo sobre la lista ordenada de palabras.
+"""
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+from collections import deque
+
+from . import cache_reportes
+from .models import Cuenta
+
+LIMITE_DEFECTO = 20
+LIMITE_MAXIMO = 100
+VERIFICAR_CADA = 2  # segundos entre consultas de la versión del catálogo
+
+_PALABRA = re.compile(r"[a-z0-9ñ]+")
+
+
+def plegar(texto):
+    """Minúsculas y sin tildes (conserva la ñ)."""
+    texto = texto.lower().replace("ñ", "\0")
+    texto = "".join(c for c in unicodedata.normalize("NFKD", texto) if not unicodedata.combining(c))
+    return texto.replace("\0", "ñ")
+
+
+def palabras(texto):
+    return _PALABRA.findall(plegar(texto))
+
+
+class _Nodo:
+    __slots__ = ("hijos", "codigo")
+
+    def __init__(self):
+        self.hijos = {}
+        self.codigo = None
+
+
+class IndiceCuentas:
+    def __init__(self, cuentas):
+        """cuentas: iterable de (codigo, nombre)."""
+        self.nombres = {}
+        self.raiz = _Nodo()
+        por_palabra = {}
+        for codigo, nombre in cuentas:
+            self.nombres[codigo] = nombre
+            nodo = self.raiz
+            for c in codigo:
+                nodo = nodo.hijos.setdefault(c, _Nodo())
+            nodo.codigo = codigo
+            for p in set(palabras(nombre)):
+                por_palabra.setdefault(p, []).append(codigo)
+        self.palabras = sorted(por_palabra)
+        self.codigos_por_palabra = [frozenset(por_palabra[p]) for p in self.palabras]
+        self.primera_palabra = {codigo: (palabras(nombre) or [""])[0] for codigo, nombre in self.nombres.items()}
+
+    def por_codigo(self, prefijo, limite=None):
+        """Códigos que empiezan por `prefijo`, primero los más cortos (recorrido en anchura)."""
+        nodo = self.raiz
+        for c in prefijo:
+            nodo = nodo.hijos.get(c)
+            if nodo is None:
+                return []
+        encontrados, cola = [], deque([nodo])
+        while cola and (limite is None or len(encontrados) < limite):
+            nodo = cola.popleft()
+            if nodo.codigo is not None:
+                encontrados.append(nodo.codigo)
+            cola.extend(nodo.hijos[c] for c in sorted(nodo.hijos))
+        return encontrados
+
+    def por_palabra(self, prefijo):
+        """Conjunto de códigos con alguna palabra del nombre que empieza por `prefijo`."""
+        resultado = set()
+        i = bisect_left(self.palabras, prefijo)
+        while i < len(self.palabras) and self.palabras[i].startswith(prefijo):
+            resultado |= self.codigos_por_palabra[i]
+            i += 1
+        return resultado
+
+    def buscar(self, consulta, limite=LIMITE_DEFECTO):
+        """
+        Top `limite` de [(codigo, nombre)]. Los términos numéricos filtran por
+        prefijo de código y los demás por prefijo de palabra (todos deben cumplirse).
+        Orden: el nombre empieza por el primer término, luego palabra exacta,
+        luego menor profundidad y código.
+        """
+        terminos = palabras(consulta)
+        if not terminos:
+            return []
+        numeros = [t for t in terminos if t.isdigit()]
+        textos = [t for t in terminos if not t.isdigit()]
+
+        if numeros and not textos:
+            return [(c, self.nombres[c]) for c in self.por_codigo(numeros[0], limite)]
+
+        candidatos = None
+        for t in textos:
+            codigos = self.por_palabra(t)
+            candidatos = codigos if candidatos is None else candidatos & codigos
+            if not candidatos:
+                return []
+        if numeros:
+            candidatos = {c for c in candidatos if c.startswith(numeros[0])}
+
+        primero = textos[0]
+
+        def rango(codigo):
+            inicial = self.primera_palabra[codigo]
+            return (
+                not inicial.startswith(primero),
+                inicial != primero,
+                len(codigo),
+                codigo,
+            )
+
+        return [(c, self.nombres[c]) for c in sorted(candidatos, key=rango)[:limite]]
+
+
+_estado = {"indice": None, "version": None, "verificado": 0.0}
+_bloqueo = threading.Lock()
+
+
+def indice():
+    """Índice vigente; consulta la versión del catálogo a lo sumo cada VERIFICAR_CADA segundos."""
+    ahora = time.monotonic()
+    if _estado["indice"] is not None and ahora - _estado["verificado"] < VERIFICAR_CADA:
+        return _estado["indice"]
+    with _bloqueo:
+        version = cache_reportes.version(cache_reportes.CATALOGO)
+        if _estado["indice"] is None or version != _estado["version"]:
+            _estado["indice"] = IndiceCuentas(Cuenta.objects.values_list("codigo", "nombre").iterator())
+            _estado["version"] = version
+        _estado["verificado"] = ahora
+        return _estado["indice"]
+
+
+def invalidar():
+    """Fuerza la verificación de versión en la próxima búsqueda de este proceso."""
+    _estado["verificado"] = 0.0
@@ -0,0 +1,228 @@
+# contabilidad/cache_reportes.py
+"""
+Caché de resultados de reportes y ETags (GET condicional).
+
+La clave combina el reporte, sus parámetros normalizados y la versión del
+libro (suma de los contadores VersionDatos de los años que el reporte puede
+ver). Registrar o anular un asiento incrementa el contador de su año dentro
+de la misma transacción, así que las entradas viejas simplemente dejan de
+usarse y el backend las desaloja (LRU en locmem). La clave también lleva la
+versión del catálogo (nombres de cuenta) y la de los períodos contables (Mes 13).
+
+Solo se guardan respuestas acotadas (hasta FILAS_CACHE filas sumando todos los
+niveles, p.ej. cuentas y sus movimientos): los libros
+completos se recalculan y conservan únicamente el ETag.
+"""
+import hashlib
+import threading
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q, Sum
+from rest_framework.response import Response
+
+from .models import VersionDatos
+
+ALIAS = "reportes"
+LIBRO = "libro"
+CATALOGO = "catalogo"
+PERIODOS = "periodos"
+GLOBAL = 0
+
+FILAS_CACHE = 2000
+
+# Parámetros que producen archivos, flujos o páginas: no se cachean
+NO_CACHEABLES = ("formato", "stream", "salida", "cursor", "limite")
+
+_lock = threading.Lock()
+_contadores = {"aciertos": 0, "fallos": 0}
+
+
+def _cache():
+    return caches[ALIAS if ALIAS in settings.CACHES else "default"]
+
+
+def _contar(clave):
+    with _lock:
+        _contadores[clave] += 1
+
+
+def estadisticas():
+    with _lock:
+        return dict(_contadores)
+
+
+# --- Versiones ---
+
+def incrementar_version(ambito, *anios):
+    """Incrementa el contador de cada año (o el global si no se pasan años)."""
+    for anio in set(anios) or {GLOBAL}:
+        actualizados = VersionDatos.objects.filter(ambito=ambito, anio=anio).update(version=F('version') + 1)
+        if actualizados:
+            continue
+        try:
+            with transaction.atomic():
+                VersionDatos.objects.create(ambito=ambito, anio=anio, version=1)
+        except IntegrityError:
+            VersionDatos.objects.filter(ambito=ambito, anio=anio).update(version=F('version') + 1)
+
+
+def incrementar_version_libro(*asientos):
+    """Invalida los reportes que ven los años (fiscal y de fecha) de los asientos."""
+    anios = set()
+    for a in asientos:
+        anios.add(a.fiscal_year or a.fecha.year)
+        anios.add(a.fecha.year)
+    incrementar_version(LIBRO, *anios)
+
+
+def version(ambito, hasta_anio=None):
+    """Suma de contadores hasta `hasta_anio` (incluye el global). Crece con cada cambio."""
+    qs = VersionDatos.objects.filter(ambito=ambito)
+    if hasta_anio is not None:
+        qs = qs.filter(anio__lte=hasta_anio)
+    return qs.aggregate(v=Sum('version'))['v'] or 0
+
+
+# --- ETag / GET condicional ---
+
+def etag_para(clave, request):
+    """ETag fuerte: depende de la clave (que ya incluye la versión) y del formato negociado."""
+    medio = getattr(request, "accepted_media_type", "") or ""
+    return '"' + hashlib.sha1(f"{clave}|{medio}".encode("utf-8")).hexdigest() + '"'
+
+
+def _coincide(request, etag):
+    cabecera = request.META.get("HTTP_IF_NONE_MATCH", "")
+    if not cabecera:
+        return False
+    etiquetas = [e.strip() for e in cabecera.split(",")]
+    return "*" in etiquetas or etag in etiquetas or f"W/{etag}" in etiquetas
+
+
+def _marcar(resp, etag):
+    resp["ETag"] = etag
+    # Que el navegador revalide siempre con If-None-Match en vez de adivinar frescura
+    resp["Cache-Control"] = "private, no-cache"
+    return resp
+
+
+def no_modificado(etag):
+    return _marcar(Response(status=304), etag)
+
+
+def con_etag(calcular_clave):
+    """
+    Decorador para métodos de vistas DRF: `calcular_clave(self, request, *args, **kwargs)`
+    devuelve una cadena barata de obtener que cambia cuando cambian los datos.
+    Si coincide con If-None-Match se responde 304 antes de tocar el queryset.
+    """
+    def decorador(metodo):
+        @wraps(metodo)
+        def envoltura(self, request, *args, **kwargs):
+            etag = etag_para(calcular_clave(self, request, *args, **kwargs), request)
+            if _coincide(request, etag):
+                return no_modificado(etag)
+            resp = metodo(self, request, *args, **kwargs)
+            if resp.status_code == 200:
+                _marcar(resp, etag)
+            return resp
+        return envoltura
+    return decorador
+
+
+def clave_catalogo(view, request, *args, **kwargs):
+    normalizados = sorted((k, ",".join(sorted(request.query_params.getlist(k)))) for k in request.query_params)
+    return f"catalogo:{version(CATALOGO)}:{view.action}:{sorted(kwargs.items())}:{normalizados}"
+
+
+# --- Claves ---
+
+def _anio_limite(params):
+    """Último año que puede afectar el reporte, o None si no está acotado."""
+    for nombre in ("fecha_fin", "anio", "year"):
+        valor = params.get(nombre)
+        if valor:
+            digitos = valor[:4] if valor[:4].isdigit() else valor[-4:]
+            if digitos.isdigit():
+                return int(digitos)
+    return None
+
+
+def clave_reporte(nombre, kwargs, params):
+    normalizados = sorted(
+        (k, ",".join(sorted(params.getlist(k))))
+        for k in params
+        if k != "format"
+    )
+    crudo = repr((nombre, sorted(kwargs.items()), normalizados))
+    digest = hashlib.sha1(crudo.encode("utf-8")).hexdigest()
+    libro, catalogo, periodos = versiones_reporte(_anio_limite(params))
+    return f"reporte:{nombre}:{libro}.{catalogo}.{periodos}:{digest}"
+
+
+def versiones_reporte(hasta_anio=None):
+    """(libro hasta `hasta_anio`, catálogo, períodos) en una sola consulta."""
+    libro = Q(ambito=LIBRO) if hasta_anio is None else Q(ambito=LIBRO, anio__lte=hasta_anio)
+    sumas = dict(
+        VersionDatos.objects.filter(libro | Q(ambito__in=(CATALOGO, PERIODOS)))
+        .values_list("ambito").annotate(v=Sum("version")).order_by()
+    )
+    return sumas.get(LIBRO, 0), sumas.get(CATALOGO, 0), sumas.get(PERIODOS, 0)
+
+
+def _excede_filas(data, limite=None):
+    """
+    True si la respuesta tiene más de `limite` elementos de lista sumando todos
+    los niveles (p.ej. cuentas y sus movimientos). Deja de contar al pasarse.
+    """
+    limite = FILAS_CACHE if limite is None else limite
+    filas, pendientes = 0, [data]
+    while pendientes:
+        actual = pendientes.pop()
+        if isinstance(actual, dict):
+            pendientes.extend(actual.values())
+        elif isinstance(actual, (list, tuple)):
+            filas += len(actual)
+            if filas > limite:
+                return True
+            pendientes.extend(x for x in actual if isinstance(x, (dict, list, tuple)))
+    return False
+
+
+def cachear_reporte(nombre):
+    """
+    Decorador para el `get` de una APIView de reportes: responde 304 si el
+    cliente ya tiene la versión (ETag) y reutiliza la respuesta JSON (si tiene
+    hasta FILAS_CACHE filas) mientras no cambien las versiones de la clave.
+    """
+    def decorador(get):
+        @wraps(get)
+        def envoltura(self, request, *args, **kwargs):
+            params = request.query_params
+            clave = clave_reporte(nombre, kwargs, params)
+            etag = etag_para(clave, request)
+            if _coincide(request, etag):
+                return no_modificado(etag)
+
+            if any(p in params for p in NO_CACHEABLES):
+                resp = get(self, request, *args, **kwargs)
+            else:
+                cache = _cache()
+                data = cache.get(clave)
+                if data is not None:
+                    _contar("aciertos")
+                    return _marcar(Response(data, status=200), etag)
+
+                _contar("fallos")
+                resp = get(self, request, *args, **kwargs)
+                if isinstance(resp, Response) and resp.status_code == 200 and not _excede_filas(resp.data):
+                    cache.set(clave, resp.data)
+
+            if resp.status_code == 200:
+                _marcar(resp, etag)
+            return resp
+        return envoltura
+    return decorador
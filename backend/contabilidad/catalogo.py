@@ -0,0 +1,94 @@
+# contabilidad/catalogo.py
+"""
+Estructuras derivadas del Plan de Cuentas (PUC).
+"""
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from . import busqueda
+from .cache_reportes import CATALOGO, incrementar_version
+from .models import Cuenta, CuentaAncestro
+
+NIVELES_PUC = (1, 2, 4, 6)
+
+
+def ancestros_por_cuenta(padres):
+    """
+    padres: {codigo: codigo_padre | None}
+    Devuelve {codigo: [codigo, padre, abuelo, ...]} (la propia cuenta primero).
+    """
+    cadenas = {}
+    for codigo in padres:
+        cadena, actual, vistos = [], codigo, set()
+        while actual and actual not in vistos:
+            if actual in cadenas:
+                cadena.extend(cadenas[actual])
+                break
+            vistos.add(actual)
+            cadena.append(actual)
+            actual = padres.get(actual)
+        cadenas[codigo] = cadena
+    return cadenas
+
+
+def ruta_de(cadena):
+    """[codigo, padre, abuelo, ...] -> ("abuelo/padre/codigo/", profundidad)."""
+    return "".join(f"{c}/" for c in reversed(cadena)), len(cadena) - 1
+
+
+@transaction.atomic
+def reconstruir_ancestros():
+    """
+    Regenera la tabla de clausura CuentaAncestro y la ruta/profundidad de cada
+    Cuenta desde Cuenta.padre, y marca el catálogo como cambiado (ETag de
+    /cuentas/). Devuelve las filas de clausura creadas.
+    """
+    actuales = {c: (p, r, d) for c, p, r, d in Cuenta.objects.values_list('codigo', 'padre_id', 'ruta', 'profundidad')}
+    cadenas = ancestros_por_cuenta({c: v[0] for c, v in actuales.items()})
+    filas = [
+        CuentaAncestro(cuenta_id=codigo, ancestro_id=anc, distancia=dist, nivel_ancestro=len(anc))
+        for codigo, cadena in cadenas.items()
+        for dist, anc in enumerate(cadena)
+    ]
+    CuentaAncestro.objects.all().delete()
+    CuentaAncestro.objects.bulk_create(filas, batch_size=1000)
+
+    cambiadas = []
+    for codigo, cadena in cadenas.items():
+        ruta, profundidad = ruta_de(cadena)
+        if actuales[codigo][1:] != (ruta, profundidad):
+            cambiadas.append(Cuenta(codigo=codigo, ruta=ruta, profundidad=profundidad))
+    Cuenta.objects.bulk_update(cambiadas, ['ruta', 'profundidad'], batch_size=1000)
+    incrementar_version(CATALOGO)
+    transaction.on_commit(busqueda.invalidar)
+    return len(filas)
+
+
+def arbol(raiz=None, profundidad=None):
+    """
+    Subárbol anidado [{codigo, nombre, tiene_hijos, hijos: [...]}] en una sola
+    consulta por rango de `ruta`. Sin `raiz` parte de las cuentas de primer nivel;
+    `profundidad` limita los niveles bajo la raíz (None = todos).
+    Devuelve None si la raíz no existe.
+    """
+    qs = Cuenta.objects.annotate(tiene_hijos=Exists(Cuenta.objects.filter(padre=OuterRef('pk'))))
+    if raiz:
+        base = Cuenta.objects.filter(pk=raiz).values_list('ruta', 'profundidad').first()
+        if base is None:
+            return None
+        qs = qs.filter(ruta__startswith=base[0])
+        nivel = base[1]
+    else:
+        nivel = 0
+    if profundidad is not None:
+        qs = qs.filter(profundidad__lte=nivel + profundidad)
+
+    nodos, raices = {}, []
+    for codigo, nombre, padre, tiene_hijos in qs.order_by('ruta').values_list('codigo', 'nombre', 'padre_id', 'tiene_hijos'):
+        nodo = {'codigo': codigo, 'nombre': nombre, 'tiene_hijos': tiene_hijos, 'hijos': []}
+        nodos[codigo] = nodo
+        if codigo != raiz and padre in nodos:
+            nodos[padre]['hijos'].append(nodo)
+        else:
+            raices.append(nodo)
+    return raices
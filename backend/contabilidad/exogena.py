@@ -0,0 +1,328 @@
+# contabilidad/exogena.py
+"""
+Motor de Medios Magnéticos (información exógena DIAN).
+
+Una sola consulta recorre los movimientos del año agrupados por (tercero,
+cuenta); cada grupo se reparte en memoria entre los formatos pedidos según la
+tabla ConceptoExogena (manda el prefijo de cuenta más largo dentro de cada
+formato). Después se aplican los topes de cuantías menores: los registros por
+debajo del tope se acumulan en el tercero 222222222.
+
+Los formatos 1008/1009 son saldos al 31 de diciembre: para sus cuentas también
+se leen los años anteriores.
+
+escribir_zip() genera los XML del formato prescrito: los totales de cada
+encabezado salen de una pasada previa sobre los valores agregados y los
+registros se escriben en streaming, partidos en archivos de 5.000.
+"""
+from collections import defaultdict, namedtuple
+from datetime import datetime
+from decimal import ROUND_HALF_UP, Decimal
+from itertools import islice
+from xml.sax.saxutils import XMLGenerator
+
+from django.db.models import Q, Sum
+
+from terceros.models import Tercero
+
+from .models import AsientoContable, ConceptoExogena, MovimientoContable
+from .saldos import NETO
+
+CERO = Decimal('0')
+LOTE_TERCEROS = 2000
+
+Formato = namedtuple('Formato', 'nombre version columnas principal tope')
+
+# `principal`: columnas que se comparan con el tope de cuantías menores y se
+# suman en el total del encabezado. tope=0: el formato no agrupa cuantías menores.
+FORMATOS = {
+    '1001': Formato(
+        'Pagos o abonos en cuenta y retenciones practicadas', '10',
+        ('pago_deducible', 'pago_no_deducible', 'iva_mayor_valor', 'retencion_fuente', 'retencion_iva'),
+        ('pago_deducible', 'pago_no_deducible'), Decimal('100000'),
+    ),
+    '1003': Formato(
+        'Retenciones en la fuente que le practicaron', '7',
+        ('valor_base', 'retencion'), ('retencion',), CERO,
+    ),
+    '1005': Formato(
+        'Impuesto a las ventas descontable', '7',
+        ('impuesto_descontable', 'iva_devoluciones'), ('impuesto_descontable',), CERO,
+    ),
+    '1006': Formato(
+        'Impuesto a las ventas generado', '8',
+        ('impuesto_generado', 'iva_recuperado', 'impuesto_consumo'), ('impuesto_generado',), CERO,
+    ),
+    '1007': Formato(
+        'Ingresos recibidos', '9',
+        ('ingresos_brutos', 'devoluciones'), ('ingresos_brutos',), Decimal('500000'),
+    ),
+    '1008': Formato(
+        'Saldo de cuentas por cobrar al 31 de diciembre', '7',
+        ('saldo',), ('saldo',), Decimal('1000000'),
+    ),
+    '1009': Formato(
+        'Saldo de cuentas por pagar al 31 de diciembre', '7',
+        ('saldo',), ('saldo',), Decimal('1000000'),
+    ),
+}
+
+CUANTIAS_MENORES = {
+    'tipo_documento': '43',
+    'numero_documento': '222222222',
+    'nombre_razon_social': 'CUANTÍAS MENORES',
+}
+_MENORES = 0  # id ficticio del tercero de cuantías menores
+
+CALCULOS_SALDO = ('saldo_debito', 'saldo_credito')
+SIN_CONCEPTO = ('1005', '1006')  # formatos sin columna de concepto
+SOLO_POSITIVOS = ('1001',)  # pagos: las notas crédito netas no se reportan
+
+
+class Exogena:
+    """
+    exogena = Exogena(2025, ['1001', '1007'])
+    exogena.registros('1001')  -> iterador de dicts ordenado por concepto y tercero (id)
+    exogena.totales('1001')    -> (cantidad de registros, valor total)
+    """
+
+    def __init__(self, anio, formatos):
+        self.anio = anio
+        self.formatos = [f for f in formatos if f in FORMATOS]
+        self._destinos = {}
+        self._mapeos = self._cargar_mapeos()
+        self._datos = self._recorrer()
+
+    # --- Configuración ---
+
+    def _cargar_mapeos(self):
+        """{formato: {prefijo: [(concepto, columna, calculo)]}} de los conceptos activos."""
+        mapeos = {f: defaultdict(list) for f in self.formatos}
+        conceptos = ConceptoExogena.objects.filter(formato__in=self.formatos, activo=True)
+        for c in conceptos.values_list('formato', 'prefijo_cuenta', 'concepto', 'columna', 'calculo'):
+            formato, prefijo, concepto, columna, calculo = c
+            if columna in FORMATOS[formato].columnas:
+                mapeos[formato][prefijo].append((concepto, columna, calculo))
+        return mapeos
+
+    def destinos(self, cuenta):
+        """[(formato, concepto, columna, calculo)] de una cuenta (prefijo más largo por formato)."""
+        if cuenta not in self._destinos:
+            destinos = []
+            for formato, prefijos in self._mapeos.items():
+                for largo in range(len(cuenta), 0, -1):
+                    if cuenta[:largo] in prefijos:
+                        destinos.extend((formato, *d) for d in prefijos[cuenta[:largo]])
+                        break
+            self._destinos[cuenta] = destinos
+        return self._destinos[cuenta]
+
+    # --- Recorrido único ---
+
+    def _recorrer(self):
+        prefijos = {p for m in self._mapeos.values() for p in m}
+        prefijos_saldo = {p for m in self._mapeos.values() for p, ds in m.items() if any(d[2] in CALCULOS_SALDO for d in ds)}
+        datos = {f: defaultdict(lambda: defaultdict(lambda: CERO)) for f in self.formatos}
+        if not prefijos:
+            return datos
+
+        def por_prefijo(ps):
+            q = Q()
+            for p in ps:
+                q |= Q(cuenta__codigo__startswith=p)
+            return q
+
+        del_anio = Q(fiscal_year=self.anio)
+        periodo = del_anio
+        if prefijos_saldo:
+            periodo |= Q(fiscal_year__lt=self.anio) & por_prefijo(prefijos_saldo)
+        # Los asientos anulados y sus ajustes de anulación se cancelan: se omiten ambos
+        ajustes = AsientoContable.objects.filter(estado='anulado', ajusta_a__isnull=False).values('ajusta_a')
+        filas = (
+            MovimientoContable.objects
+            .filter(por_prefijo(prefijos), periodo, estado='vigente')
+            .exclude(asiento_id__in=ajustes)
+            .values('tercero_id', 'cuenta_id')
+            .annotate(
+                deb=Sum('debito', filter=del_anio),
+                cre=Sum('credito', filter=del_anio),
+                saldo=Sum(NETO),
+            )
+            .order_by()
+        )
+        for x in filas.iterator():
+            valores = {
+                'debito': x['deb'] or CERO,
+                'credito': x['cre'] or CERO,
+                'saldo_debito': x['saldo'] or CERO,
+                'saldo_credito': -(x['saldo'] or CERO),
+            }
+            for formato, concepto, columna, calculo in self.destinos(x['cuenta_id']):
+                datos[formato][(concepto, x['tercero_id'])][columna] += valores[calculo]
+
+        return {f: self._cuantias_menores(f, d) for f, d in datos.items()}
+
+    @staticmethod
+    def _cuantias_menores(formato, registros):
+        meta = FORMATOS[formato]
+        salida = {}
+        for (concepto, tercero), columnas in registros.items():
+            if not any(columnas.values()):
+                continue
+            principal = sum(columnas[c] for c in meta.principal)
+            if formato in SOLO_POSITIVOS and principal <= 0:
+                continue
+            if meta.tope and principal < meta.tope:
+                destino = salida.setdefault((concepto, _MENORES), defaultdict(lambda: CERO))
+                for c, v in columnas.items():
+                    destino[c] += v
+            else:
+                salida[(concepto, tercero)] = columnas
+        return salida
+
+    # --- Salida ---
+
+    def _claves(self, formato):
+        """Orden de salida: concepto y luego tercero (cuantías menores primero)."""
+        return sorted(self._datos[formato])
+
+    def valores(self, formato):
+        """Columnas de cada registro en el orden de registros(), sin consultar terceros."""
+        datos = self._datos[formato]
+        return (datos[k] for k in self._claves(formato))
+
+    def totales(self, formato):
+        """(CantReg, ValTotal) del formato: cantidad de registros y suma de sus columnas principales."""
+        registros = self._datos[formato]
+        principal = FORMATOS[formato].principal
+        return len(registros), sum((sum(cols[c] for c in principal) for cols in registros.values()), CERO)
+
+    def registros(self, formato):
+        """Registros del formato con los datos del tercero; los terceros se leen por lotes."""
+        meta = FORMATOS[formato]
+        datos = self._datos[formato]
+        claves = self._claves(formato)
+        for i in range(0, len(claves), LOTE_TERCEROS):
+            bloque = claves[i:i + LOTE_TERCEROS]
+            terceros = Tercero.objects.filter(pk__in={t for _, t in bloque}).only(
+                'tipo_documento', 'numero_documento', 'nombre_razon_social',
+            )
+            documentos = {
+                t.pk: {
+                    'tipo_documento': t.tipo_documento,
+                    'numero_documento': t.numero_documento,
+                    'nombre_razon_social': t.nombre_razon_social,
+                }
+                for t in terceros
+            }
+            documentos[_MENORES] = CUANTIAS_MENORES
+            for concepto, tercero in bloque:
+                columnas = datos[(concepto, tercero)]
+                registro = {} if formato in SIN_CONCEPTO else {'concepto': concepto}
+                registro.update(documentos[tercero])
+                registro.update((c, columnas[c]) for c in meta.columnas)
+                yield registro
+
+
+# --- XML de la DIAN ---
+
+REGISTROS_POR_ARCHIVO = 5000
+CODIFICACION = 'ISO-8859-1'
+CONCEPTO_ENVIO = '01'  # 01 inserción, 02 reemplazo
+
+TIPOS_DOCUMENTO_DIAN = {'CC': '13', 'NIT': '31', 'CE': '22', 'PA': '41'}
+
+# Elemento de cada registro y atributo de cada columna
+XML = {
+    '1001': ('pagos', {
+        'pago_deducible': 'pago', 'pago_no_deducible': 'pnded', 'iva_mayor_valor': 'ivaded',
+        'retencion_fuente': 'retfueprac', 'retencion_iva': 'reteivapr',
+    }),
+    '1003': ('rets', {'valor_base': 'vpag', 'retencion': 'vret'}),
+    '1005': ('impdes', {'impuesto_descontable': 'imp', 'iva_devoluciones': 'ivade'}),
+    '1006': ('impge', {'impuesto_generado': 'imp', 'iva_recuperado': 'iva', 'impuesto_consumo': 'impcon'}),
+    '1007': ('ingresos', {'ingresos_brutos': 'ingp', 'devoluciones': 'dev'}),
+    '1008': ('cxc', {'saldo': 'sal'}),
+    '1009': ('cxp', {'saldo': 'sal'}),
+}
+ATRIBUTOS_TERCERO = (('concepto', 'cpt'), ('tipo_documento', 'tdoc'), ('numero_documento', 'nid'), ('nombre_razon_social', 'raz'))
+
+
+def _pesos(valor):
+    """La DIAN recibe valores enteros en pesos."""
+    return int(valor.quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+
+def nombre_archivo(formato, anio, envio):
+    """Dmuisca_ + concepto (2) + formato (5) + versión (2) + año (4) + consecutivo (8)."""
+    version = FORMATOS[formato].version
+    return f"Dmuisca_{CONCEPTO_ENVIO}{int(formato):05d}{int(version):02d}{anio}{envio:08d}.xml"
+
+
+def cabeceras(exogena, formato, por_archivo=REGISTROS_POR_ARCHIVO):
+    """
+    Primera pasada, solo sobre los valores ya agregados: [(CantReg, ValorTotal)]
+    de cada archivo en que se parte el formato.
+    """
+    principal = FORMATOS[formato].principal
+    bloques = []
+    for i, columnas in enumerate(exogena.valores(formato)):
+        if i % por_archivo == 0:
+            bloques.append([0, 0])
+        bloques[-1][0] += 1
+        bloques[-1][1] += sum(_pesos(columnas[c]) for c in principal)
+    return [tuple(b) for b in bloques]
+
+
+def escribir_xml(destino, exogena, formato, envio, cantidad, total, registros, fecha_envio):
+    """Escribe un archivo del formato en `destino` (binario) elemento por elemento."""
+    meta = FORMATOS[formato]
+    elemento, atributos = XML[formato]
+    anio = exogena.anio
+    xml = XMLGenerator(destino, encoding=CODIFICACION, short_empty_elements=True)
+    xml.startDocument()
+    xml.startElement('mas', {
+        'xmlns:xsi': 'http://www.w3.org/2001/XMLSchema-instance',
+        'xsi:noNamespaceSchemaLocation': f'../xsd/{formato}.xsd',
+    })
+    xml.ignorableWhitespace('\n')
+    xml.startElement('Cab', {})
+    for etiqueta, valor in (
+        ('Ano', anio), ('CodCpt', int(CONCEPTO_ENVIO)), ('Formato', formato), ('Version', meta.version),
+        ('NumEnvio', envio), ('FecEnvio', fecha_envio.strftime('%Y-%m-%dT%H:%M:%S')),
+        ('FecInicial', f'{anio}-01-01'), ('FecFinal', f'{anio}-12-31'),
+        ('ValorTotal', total), ('CantReg', cantidad),
+    ):
+        xml.startElement(etiqueta, {})
+        xml.characters(str(valor))
+        xml.endElement(etiqueta)
+    xml.endElement('Cab')
+    xml.ignorableWhitespace('\n')
+    for r in registros:
+        attrs = {a: str(r[c]) for c, a in ATRIBUTOS_TERCERO if c in r}
+        attrs['tdoc'] = TIPOS_DOCUMENTO_DIAN.get(attrs['tdoc'], attrs['tdoc'])
+        attrs.update((a, str(_pesos(r[c]))) for c, a in atributos.items())
+        xml.startElement(elemento, attrs)
+        xml.endElement(elemento)
+        xml.ignorableWhitespace('\n')
+    xml.endElement('mas')
+    xml.endDocument()
+
+
+def escribir_zip(zf, exogena, formatos, envio=1, fecha_envio=None, por_archivo=REGISTROS_POR_ARCHIVO):
+    """
+    Agrega al ZipFile `zf` los XML de cada formato, partidos cada `por_archivo`
+    registros y numerados desde `envio`. Los registros se leen del iterador del
+    motor a medida que se escriben. Devuelve los nombres de archivo.
+    """
+    fecha_envio = fecha_envio or datetime.now()
+    nombres = []
+    for formato in formatos:
+        registros = exogena.registros(formato)
+        for cantidad, total in cabeceras(exogena, formato, por_archivo):
+            nombre = nombre_archivo(formato, exogena.anio, envio)
+            with zf.open(nombre, 'w') as destino:
+                escribir_xml(destino, exogena, formato, envio, cantidad, total, islice(registros, cantidad), fecha_envio)
+            nombres.append(nombre)
+            envio += 1
+    return nombres
@@ -0,0 +1,99 @@
+# contabilidad/exportadores.py
+"""
+Salidas de reportes que no cargan el resultado completo en memoria.
+Las filas llegan como iterables (normalmente `queryset.iterator()`) y se
+escriben a medida que se consumen.
+"""
+import csv
+import tempfile
+import zipfile
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import FileResponse, StreamingHttpResponse
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+from openpyxl.utils import get_column_letter
+
+CHUNK_SIZE = 2000
+
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+ZIP_CONTENT_TYPE = "application/zip"
+NEGRITA = Font(bold=True)
+
+
+class _Eco:
+    """Pseudo-buffer para csv.writer: devuelve la línea en lugar de guardarla."""
+    def write(self, value):
+        return value
+
+
+def respuesta_ndjson(registros, filename=None):
+    """Un objeto JSON por línea. `registros` es un iterable de dicts."""
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    lineas = (encoder.encode(r) + "\n" for r in registros)
+    resp = StreamingHttpResponse(lineas, content_type="application/x-ndjson")
+    if filename:
+        resp["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return resp
+
+
+def respuesta_csv(encabezados, filas, filename):
+    """CSV con BOM para que Excel respete las tildes. `filas` es un iterable de tuplas."""
+    writer = csv.writer(_Eco())
+
+    def generar():
+        yield "\ufeff" + writer.writerow(encabezados)
+        for fila in filas:
+            yield writer.writerow(fila)
+
+    resp = StreamingHttpResponse(generar(), content_type="text/csv; charset=utf-8")
+    resp["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return resp
+
+
+def respuesta_xlsx(hoja, encabezados, filas, filename, titulo=None, anchos=None, totales=None):
+    """
+    Libro de Excel en modo write_only: cada fila se escribe y se descarta, y
+    el archivo se arma en un temporal en disco que se sirve con FileResponse.
+
+    `filas` es un iterable de tuplas; `titulo` son líneas en negrita antes de
+    los encabezados y `totales` una fila final en negrita.
+    """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title=hoja)
+    for i, ancho in enumerate(anchos or [], start=1):
+        ws.column_dimensions[get_column_letter(i)].width = ancho
+
+    def negrita(valores):
+        fila = []
+        for v in valores:
+            celda = WriteOnlyCell(ws, value=v)
+            celda.font = NEGRITA
+            fila.append(celda)
+        return fila
+
+    for linea in titulo or []:
+        ws.append(negrita([linea]))
+    ws.append(negrita(encabezados))
+    for fila in filas:
+        ws.append(fila)
+    if totales:
+        ws.append(negrita(totales))
+
+    tmp = tempfile.TemporaryFile(suffix=".xlsx")
+    wb.save(tmp)
+    tmp.seek(0)
+    return FileResponse(tmp, as_attachment=True, filename=filename, content_type=XLSX_CONTENT_TYPE)
+
+
+def respuesta_zip(escribir, filename):
+    """
+    Zip armado en un temporal en disco: `escribir(zf)` agrega los archivos
+    (por ejemplo con zf.open(nombre, "w")) sin tenerlos completos en memoria.
+    """
+    tmp = tempfile.TemporaryFile(suffix=".zip")
+    with zipfile.ZipFile(tmp, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        escribir(zf)
+    tmp.seek(0)
+    return FileResponse(tmp, as_attachment=True, filename=filename, content_type=ZIP_CONTENT_TYPE)
\ No newline at end of file
@@ -0,0 +1,273 @@
+# contabilidad/importacion.py
+"""
+Importación masiva de asientos (NDJSON o CSV).
+
+Cada lote de asientos se valida en memoria con las mismas reglas de
+AsientoContableSerializer: las cuentas y los terceros se resuelven con una
+consulta IN por lote y el PeriodoContable se lee una vez por año y lote. Los
+asientos válidos se escriben con bulk_create en una transacción por lote; los
+inválidos se devuelven en el informe de errores con su número de fila.
+
+NDJSON: un asiento por línea
+    {"referencia": "N-001", "fecha": "2026-01-31", "tercero": "900123", "concepto": "Nómina",
+     "movimientos": [{"cuenta_codigo": "510506", "debito": 1000}, {"cuenta_codigo": "110505", "credito": 1000}]}
+
+CSV: un movimiento por fila; las filas consecutivas con la misma `referencia`
+forman un asiento.
+    referencia,fecha,tercero,concepto,descripcion,fiscal_year,fiscal_period,cuenta_codigo,debito,credito
+
+`tercero` es el número de documento (o el id si se envía `tercero_id`).
+"""
+import csv
+import io
+import json
+from collections import defaultdict
+from datetime import date, datetime
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from itertools import groupby, islice
+
+from django.db import transaction
+
+from terceros.models import Tercero
+
+from . import cache_reportes, saldos
+from .models import AsientoContable, Cuenta, MovimientoContable, PeriodoContable
+
+LOTE_ASIENTOS = 500
+DOS_DECIMALES = Decimal("0.01")
+FORMATOS = ("ndjson", "csv")
+
+CAMPOS_ASIENTO = ("concepto", "descripcion", "descripcion_adicional")
+LARGO_CONCEPTO = AsientoContable._meta.get_field("concepto").max_length
+
+
+class ErrorFormato(ValueError):
+    """El archivo no se puede leer con el formato indicado."""
+
+
+# --- Lectura ---
+
+def leer_ndjson(texto):
+    """Genera (fila, dict del asiento) por cada línea no vacía."""
+    for fila, linea in enumerate(texto, start=1):
+        if not linea.strip():
+            continue
+        try:
+            registro = json.loads(linea)
+        except ValueError:
+            yield fila, {"_error": "JSON inválido."}
+            continue
+        yield fila, registro if isinstance(registro, dict) else {"_error": "Se esperaba un objeto JSON."}
+
+
+def leer_csv(texto):
+    """Agrupa las filas consecutivas con la misma `referencia` en un asiento."""
+    lector = csv.DictReader(texto)
+    if not lector.fieldnames or "referencia" not in lector.fieldnames:
+        raise ErrorFormato("El CSV debe tener encabezados y una columna 'referencia'.")
+    filas = ((n, f) for n, f in enumerate(lector, start=2))  # la fila 1 es el encabezado
+    for _, grupo in groupby(filas, key=lambda x: x[1].get("referencia")):
+        grupo = list(grupo)
+        fila, primera = grupo[0]
+        asiento = {k: v for k, v in primera.items() if k not in ("cuenta_codigo", "debito", "credito") and v not in ("", None)}
+        asiento["movimientos"] = [
+            {"cuenta_codigo": f.get("cuenta_codigo"), "debito": f.get("debito"), "credito": f.get("credito")}
+            for _, f in grupo
+        ]
+        yield fila, asiento
+
+
+def leer(archivo, formato):
+    """`archivo` es un binario (upload o open(..., 'rb')). Devuelve el generador de asientos."""
+    if formato not in FORMATOS:
+        raise ErrorFormato(f"Formato '{formato}' no soportado. Use ndjson o csv.")
+    texto = io.TextIOWrapper(archivo, encoding="utf-8-sig", newline="")
+    return leer_csv(texto) if formato == "csv" else leer_ndjson(texto)
+
+
+# --- Validación ---
+
+def _fecha(valor):
+    if isinstance(valor, date):
+        return valor
+    for fmt in ("%Y-%m-%d", "%d/%m/%Y"):
+        try:
+            return datetime.strptime(str(valor), fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _monto(valor):
+    try:
+        return Decimal(str(valor or 0)).quantize(DOS_DECIMALES, rounding=ROUND_HALF_UP)
+    except InvalidOperation:
+        return None
+
+
+def _lineas(r):
+    """Los movimientos del asiento, o None si 'movimientos' no es una lista."""
+    lineas = r.get("movimientos") or []
+    return lineas if isinstance(lineas, list) else None
+
+
+def _entero(valor):
+    try:
+        return int(valor) if valor not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+class Importador:
+    """
+    Valida y escribe asientos por lotes. Acumula el informe en `creados`,
+    `movimientos` y `errores` ([{"fila", "referencia", "errores"}]).
+    """
+
+    def __init__(self, lote=LOTE_ASIENTOS):
+        self.lote = lote
+        self.creados = 0
+        self.movimientos = 0
+        self.errores = []
+
+    def importar(self, registros):
+        registros = iter(registros)
+        while True:
+            bloque = list(islice(registros, self.lote))
+            if not bloque:
+                break
+            self._procesar(bloque)
+        return self.informe()
+
+    def informe(self):
+        return {"creados": self.creados, "movimientos": self.movimientos, "errores": self.errores}
+
+    def _procesar(self, bloque):
+        codigos, documentos, ids = set(), set(), set()
+        for _, r in bloque:
+            for m in _lineas(r) or []:
+                if isinstance(m, dict) and m.get("cuenta_codigo"):
+                    codigos.add(str(m["cuenta_codigo"]).strip())
+            if r.get("tercero_id") not in (None, ""):
+                ids.add(_entero(r["tercero_id"]))
+            elif r.get("tercero") not in (None, ""):
+                documentos.add(str(r["tercero"]).strip())
+
+        cuentas = set(Cuenta.objects.filter(codigo__in=codigos).values_list("codigo", flat=True))
+        por_documento = dict(Tercero.objects.filter(numero_documento__in=documentos).values_list("numero_documento", "id"))
+        por_id = set(Tercero.objects.filter(id__in=ids - {None}).values_list("id", flat=True)) if ids else set()
+
+        cerrado = saldos.ultimo_anio_cerrado()
+        periodos = {}
+
+        validos = []
+        for fila, r in bloque:
+            errores, asiento, movs = self._validar(r, cuentas, por_documento, por_id, cerrado, periodos)
+            if errores:
+                self.errores.append({"fila": fila, "referencia": r.get("referencia"), "errores": errores})
+            else:
+                validos.append((asiento, movs))
+        if validos:
+            self._escribir(validos)
+
+    def _validar(self, r, cuentas, por_documento, por_id, cerrado, periodos):
+        if "_error" in r:
+            return [r["_error"]], None, None
+        errores = []
+
+        fecha = _fecha(r.get("fecha"))
+        if not fecha:
+            errores.append("La fecha es obligatoria (AAAA-MM-DD o DD/MM/AAAA).")
+
+        if r.get("tercero_id") not in (None, ""):
+            tercero_id = _entero(r["tercero_id"])
+            tercero_id = tercero_id if tercero_id in por_id else None
+        else:
+            tercero_id = por_documento.get(str(r.get("tercero") or "").strip())
+        if not tercero_id:
+            errores.append("Tercero inexistente o no informado.")
+
+        concepto = r.get("concepto")
+        if not concepto:
+            errores.append("El concepto es obligatorio.")
+        elif len(str(concepto)) > LARGO_CONCEPTO:
+            errores.append(f"El concepto supera los {LARGO_CONCEPTO} caracteres.")
+
+        movs = []
+        lineas = _lineas(r)
+        if lineas is None:
+            errores.append("'movimientos' debe ser una lista.")
+            lineas = []
+        elif not lineas:
+            errores.append("Debe registrar al menos un movimiento.")
+        total_deb = total_cre = Decimal("0.00")
+        for i, m in enumerate(lineas, start=1):
+            m = m if isinstance(m, dict) else {}
+            codigo = str(m.get("cuenta_codigo") or "").strip()
+            deb, cre = _monto(m.get("debito")), _monto(m.get("credito"))
+            if not codigo:
+                errores.append(f"Fila {i}: falta 'cuenta_codigo'.")
+            elif codigo not in cuentas:
+                errores.append(f"Fila {i}: no existe la cuenta con código '{codigo}'.")
+            if deb is None or cre is None:
+                errores.append(f"Fila {i}: valor no numérico.")
+                continue
+            if deb <= 0 and cre <= 0:
+                errores.append(f"Fila {i}: debe tener valor en Débito o en Crédito.")
+            if deb > 0 and cre > 0:
+                errores.append(f"Fila {i}: no puede tener Débito y Crédito a la vez.")
+            total_deb += deb
+            total_cre += cre
+            movs.append(MovimientoContable(cuenta_id=codigo, debito=deb, credito=cre))
+        if lineas and total_deb != total_cre:
+            errores.append("El asiento no cuadra (∑débitos ≠ ∑créditos).")
+
+        if errores:
+            return errores, None, None
+
+        fy = _entero(r.get("fiscal_year")) or fecha.year
+        fp = _entero(r.get("fiscal_period")) or fecha.month
+        if fy < 1 or not 1 <= fp <= 13:
+            return ["Año fiscal o período fiscal fuera de rango (período 1 a 13)."], None, None
+        p = periodos.get(fy) or periodos.setdefault(fy, PeriodoContable.leer(fy))
+        if fp == 13:
+            if not p.habilitar_mes13:
+                errores.append("Mes 13 deshabilitado para este año.")
+            elif not p.in_ajustes(fecha):
+                errores.append("Mes 13 solo permitido dentro de la ventana de ajustes del período.")
+        elif p.estado == "cerrado":
+            errores.append(f"Período {fy} cerrado. Use Mes 13 durante la ventana de ajustes.")
+        elif (fy, fp) != (fecha.year, fecha.month):
+            errores.append("El año y período fiscal deben corresponder a la fecha (salvo Mes 13).")
+        contable = saldos.fecha_contable(fecha, fy, fp)
+        if cerrado is not None and contable <= saldos.fin_de_anio(cerrado):
+            errores.append(f"La fecha contable {contable} cae en un año con saldos de cierre. Reabra el período.")
+        if errores:
+            return errores, None, None
+
+        asiento = AsientoContable(
+            fecha=fecha, fiscal_year=fy, fiscal_period=fp, tercero_id=tercero_id,
+            **{k: r.get(k) for k in CAMPOS_ASIENTO if r.get(k)},
+        )
+        return [], asiento, movs
+
+    @transaction.atomic
+    def _escribir(self, validos):
+        asientos = AsientoContable.objects.bulk_create([a for a, _ in validos])
+        movimientos = []
+        deltas = defaultdict(lambda: [saldos.CERO, saldos.CERO])
+        for asiento, movs in validos:
+            copia = asiento.campos_movimiento()
+            for m in movs:
+                m.asiento = asiento
+                for campo, valor in copia.items():
+                    setattr(m, campo, valor)
+                d = deltas[(m.cuenta_id, asiento.fiscal_year, asiento.fiscal_period)]
+                d[0] += m.debito
+                d[1] += m.credito
+                movimientos.append(m)
+        MovimientoContable.objects.bulk_create(movimientos, batch_size=saldos.LOTE)
+        saldos.aplicar_deltas(deltas)
+        cache_reportes.incrementar_version_libro(*asientos)
+        self.creados += len(asientos)
+        self.movimientos += len(movimientos)
@@ -1,63 +1,121 @@
 import csv
+from itertools import groupby
 from django.core.management.base import BaseCommand
-from contabilidad.models import Cuenta
+from django.db import transaction
+from contabilidad.models import Cuenta, MovimientoContable
+from contabilidad import catalogo
+
+LOTE = 1000
+
+
+def codigo_padre(codigo):
+    """Padre según la estructura del PUC: 1 → 2 → 4 → 6 dígitos → subcuentas."""
+    if len(codigo) == 2:
+        return codigo[:1]
+    elif len(codigo) == 4:
+        return codigo[:2]
+    elif len(codigo) == 6:
+        return codigo[:4]
+    elif len(codigo) > 6:  # Para subcuentas de más de 6 dígitos
+        return codigo[:6]
+    return None
+
+
+def leer_csv(ruta):
+    """Genera (codigo, nombre) fila a fila."""
+    with open(ruta, mode='r', encoding='utf-8-sig', newline='') as file:
+        for row in csv.DictReader(file):
+            codigo = (row.get('codigo') or '').strip()
+            if codigo:
+                yield codigo, (row.get('nombre') or '').strip()
+
 
 class Command(BaseCommand):
     help = 'Importa el Plan Único de Cuentas (PUC) desde un archivo CSV a la base de datos.'
 
     def add_arguments(self, parser):
         parser.add_argument('csv_file', type=str, help='La ruta del archivo CSV a importar.')
+        parser.add_argument(
+            '--upsert', action='store_true',
+            help='Agrega y actualiza cuentas sin borrar nada; no modifica las cuentas con movimientos.',
+        )
 
     def handle(self, *args, **options):
         csv_file_path = options['csv_file']
         self.stdout.write(self.style.SUCCESS(f'Iniciando la importación desde "{csv_file_path}"...'))
 
+        try:
+            if options['upsert']:
+                self.upsert(csv_file_path)
+            else:
+                self.reemplazar(csv_file_path)
+        except FileNotFoundError:
+            self.stdout.write(self.style.ERROR(f'Error: El archivo "{csv_file_path}" no fue encontrado.'))
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'Ocurrió un error inesperado: {e}'))
+
+    def reemplazar(self, csv_file_path):
         # Limpiar la tabla de Cuentas antes de importar para evitar duplicados
         Cuenta.objects.all().delete()
         self.stdout.write(self.style.WARNING('Se han eliminado todas las cuentas existentes.'))
 
-        accounts_to_create = []
-        parent_map = {}
+        nombres = dict(leer_csv(csv_file_path))
+        cuentas = [
+            Cuenta(codigo=codigo, nombre=nombre, padre_id=codigo_padre(codigo) if codigo_padre(codigo) in nombres else None)
+            for codigo, nombre in nombres.items()
+        ]
+        # Por longitud de código: los padres se insertan antes que sus hijos
+        Cuenta.objects.bulk_create(sorted(cuentas, key=lambda c: len(c.codigo)), batch_size=LOTE)
 
-        try:
-            with open(csv_file_path, mode='r', encoding='utf-8') as file:
-                reader = csv.DictReader(file)
-                for row in reader:
-                    codigo = row['codigo']
-                    nombre = row['nombre']
-
-                    # Determinar el código del padre
-                    parent_codigo = None
-                    if len(codigo) == 4:
-                        parent_codigo = codigo[:2]
-                    elif len(codigo) == 6:
-                        parent_codigo = codigo[:4]
-                    elif len(codigo) > 6: # Para subcuentas de más de 6 dígitos
-                        parent_codigo = codigo[:6]
-
-                    accounts_to_create.append({
-                        'codigo': codigo,
-                        'nombre': nombre,
-                        'parent_codigo': parent_codigo
-                    })
-
-            # Crear las cuentas en la base de datos
-            created_accounts = {}
-            for acc_data in sorted(accounts_to_create, key=lambda x: len(x['codigo'])):
-                parent = None
-                if acc_data['parent_codigo'] and acc_data['parent_codigo'] in created_accounts:
-                    parent = created_accounts[acc_data['parent_codigo']]
-
-                cuenta = Cuenta.objects.create(
-                    codigo=acc_data['codigo'],
-                    nombre=acc_data['nombre'],
-                    padre=parent
-                )
-                created_accounts[acc_data['codigo']] = cuenta
-
-            self.stdout.write(self.style.SUCCESS(f'¡Importación completada! Se han creado {len(created_accounts)} cuentas.'))
+        catalogo.reconstruir_ancestros()
+        self.stdout.write(self.style.SUCCESS(f'¡Importación completada! Se han creado {len(cuentas)} cuentas.'))
 
-        except FileNotFoundError:
-            self.stdout.write(self.style.ERROR(f'Error: El archivo "{csv_file_path}" no fue encontrado.'))
-        except Exception as e:
-            self.stdout.write(self.style.ERROR(f'Ocurrió un error inesperado: {e}'))
\ No newline at end of file
+    @transaction.atomic
+    def upsert(self, csv_file_path):
+        """
+        Inserta las cuentas nuevas y actualiza nombre/padre de las existentes con
+        bulk_create(update_conflicts=True), por niveles. Las cuentas que ya tienen
+        movimientos se dejan como están.
+        """
+        existentes = {c: (n, p) for c, n, p in Cuenta.objects.values_list('codigo', 'nombre', 'padre_id')}
+        nombres = dict(leer_csv(csv_file_path))
+        conocidas = nombres.keys() | existentes.keys()
+
+        agregadas = sin_cambios = 0
+        escribir, modificadas = [], []
+        for codigo, nombre in nombres.items():
+            padre = codigo_padre(codigo)
+            padre = padre if padre in conocidas else None
+            actual = existentes.get(codigo)
+            if actual is None:
+                agregadas += 1
+                escribir.append(Cuenta(codigo=codigo, nombre=nombre, padre_id=padre))
+            elif actual == (nombre, padre):
+                sin_cambios += 1
+            else:
+                modificadas.append(Cuenta(codigo=codigo, nombre=nombre, padre_id=padre))
+
+        # Solo se consulta el uso de las cuentas que cambiarían (índice por cuenta)
+        en_uso = set()
+        for i in range(0, len(modificadas), LOTE):
+            codigos = [c.codigo for c in modificadas[i:i + LOTE]]
+            en_uso.update(
+                MovimientoContable.objects.filter(cuenta_id__in=codigos).values_list('cuenta_id', flat=True).order_by().distinct()
+            )
+        protegidas = len(en_uso)
+        cambiadas = len(modificadas) - protegidas
+        escribir += [c for c in modificadas if c.codigo not in en_uso]
+
+        escribir.sort(key=lambda c: len(c.codigo))
+        for _, nivel in groupby(escribir, key=lambda c: len(c.codigo)):
+            Cuenta.objects.bulk_create(
+                list(nivel), batch_size=LOTE,
+                update_conflicts=True, unique_fields=['codigo'], update_fields=['nombre', 'padre'],
+            )
+
+        if escribir:
+            catalogo.reconstruir_ancestros()
+        self.stdout.write(self.style.SUCCESS(
+            f'¡Importación completada! Agregadas: {agregadas}, actualizadas: {cambiadas}, '
+            f'sin cambios: {sin_cambios}, en uso (no modificadas): {protegidas}.'
+        ))
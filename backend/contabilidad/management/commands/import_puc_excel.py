@@ -0,0 +1,136 @@
+import os
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import ProtectedError
+from contabilidad.models import Cuenta
+from contabilidad import catalogo
+
+try:
+    import pandas as pd
+except ImportError:  # dependencia opcional (pip install pandas openpyxl)
+    pd = None
+
+LOTE = 1000
+
+# Posibles nombres de columnas comunes
+COLUMNAS_CODIGO = ['codigo', 'Codigo', 'CODIGO', 'Cuenta', 'CUENTA', 'Código']
+COLUMNAS_NOMBRE = ['nombre', 'Nombre', 'NOMBRE', 'Descripcion', 'DESCRIPCION', 'Descripción', 'Cuenta Contable']
+COLUMNAS_PADRE = ['padre', 'Padre', 'PADRE', 'codigo_padre', 'Codigo_Padre']
+
+
+def _columna(df, candidatas):
+    return next((c for c in candidatas if c in df.columns), None)
+
+
+def _limpiar_codigos(serie):
+    """Texto sin espacios ni '.0' final (códigos leídos como número); vacíos → NA."""
+    serie = serie.astype('string').str.strip().str.replace(r'\.0$', '', regex=True)
+    return serie.mask(serie.isin(['', 'nan', 'None']))
+
+
+def resolver_padres(codigos, conocidos):
+    """
+    Padre = prefijo existente más largo del código (1 -> 11 -> 1105 -> 110505),
+    resuelto por columnas: una pasada por longitud de prefijo.
+    """
+    padres = pd.Series(pd.NA, index=codigos.index, dtype='string')
+    if codigos.empty:
+        return padres
+    largos = codigos.str.len()
+    for largo in range(int(largos.max()) - 1, 0, -1):
+        prefijo = codigos.str[:largo]
+        libres = padres.isna() & (largos > largo) & prefijo.isin(conocidos)
+        padres = padres.mask(libres, prefijo)
+    return padres
+
+
+class Command(BaseCommand):
+    help = 'Importa el Plan de Cuentas desde un Excel (o CSV) con pandas, resolviendo la jerarquía en bloque.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', type=str, help='Ruta del archivo PUC (.xlsx, .xls o .csv).')
+        parser.add_argument('--hoja', default=0, help='Hoja del Excel (nombre o índice). Por defecto la primera.')
+        parser.add_argument('--reemplazar', action='store_true', help='Borra las cuentas existentes antes de importar.')
+
+    def handle(self, *args, **options):
+        if pd is None:
+            raise CommandError('Necesitas instalar las dependencias: pip install pandas openpyxl')
+
+        archivo = options['archivo']
+        if not os.path.exists(archivo):
+            raise CommandError(f'No se encuentra el archivo: {archivo}')
+
+        hoja = options['hoja']
+        hoja = int(hoja) if str(hoja).isdigit() else hoja
+        if archivo.lower().endswith('.csv'):
+            df = pd.read_csv(archivo, dtype=str)
+        else:
+            df = pd.read_excel(archivo, sheet_name=hoja, dtype=str)
+
+        if df.empty:
+            raise CommandError(f'El archivo no tiene filas: {archivo}')
+
+        col_codigo = _columna(df, COLUMNAS_CODIGO)
+        col_nombre = _columna(df, COLUMNAS_NOMBRE)
+        col_padre = _columna(df, COLUMNAS_PADRE)
+        if not col_codigo or not col_nombre:
+            raise CommandError(f'No se encontraron las columnas de código y nombre. Columnas disponibles: {list(df.columns)}')
+        self.stdout.write(
+            f'Columnas: código={col_codigo}, nombre={col_nombre}, '
+            f'padre={col_padre or "(se calcula por prefijo)"}; {len(df)} filas.'
+        )
+
+        puc = pd.DataFrame({
+            'codigo': _limpiar_codigos(df[col_codigo]),
+            'nombre': df[col_nombre].astype('string').str.strip().fillna(''),
+        })
+        if col_padre:
+            puc['padre'] = _limpiar_codigos(df[col_padre])
+        puc = puc.dropna(subset=['codigo']).drop_duplicates('codigo', keep='last')
+        if puc.empty:
+            raise CommandError('El archivo no tiene códigos de cuenta para importar.')
+
+        self.importar(puc, options['reemplazar'])
+
+    @transaction.atomic
+    def importar(self, puc, reemplazar):
+        if reemplazar:
+            try:
+                Cuenta.objects.all().delete()
+            except ProtectedError:
+                raise CommandError('Hay cuentas con movimientos: no se pueden borrar. Importe sin --reemplazar.')
+            self.stdout.write(self.style.WARNING('Se han eliminado todas las cuentas existentes.'))
+        existentes = {c: (n, p) for c, n, p in Cuenta.objects.values_list('codigo', 'nombre', 'padre_id')}
+
+        conocidos = set(puc['codigo']) | existentes.keys()
+        if 'padre' in puc:
+            puc['padre'] = puc['padre'].where(puc['padre'].isin(conocidos))
+        else:
+            puc['padre'] = resolver_padres(puc['codigo'], conocidos)
+        puc['padre'] = puc['padre'].astype(object).where(puc['padre'].notna(), None)
+
+        # Sin nombre en el archivo se conserva el actual
+        actuales = puc['codigo'].map(lambda c: existentes.get(c, ('', None))[0])
+        puc['nombre'] = puc['nombre'].mask(puc['nombre'] == '', actuales)
+
+        previo = puc['codigo'].map(existentes.get)
+        nueva = previo.isna()
+        igual = pd.Series(
+            [p == (n, pa) for p, n, pa in zip(previo, puc['nombre'], puc['padre'])], index=puc.index, dtype=bool,
+        )
+        escribir = puc.assign(largo=puc['codigo'].str.len())[~igual]
+
+        for _, nivel in escribir.groupby('largo', sort=True):
+            Cuenta.objects.bulk_create(
+                [Cuenta(codigo=c, nombre=n, padre_id=p) for c, n, p in zip(nivel['codigo'], nivel['nombre'], nivel['padre'])],
+                batch_size=LOTE, update_conflicts=True, unique_fields=['codigo'], update_fields=['nombre', 'padre'],
+            )
+
+        if len(escribir):
+            catalogo.reconstruir_ancestros()
+        creadas = int(nueva.sum())
+        self.stdout.write(self.style.SUCCESS(
+            f'¡Importación completada! Creadas: {creadas}, actualizadas: {len(escribir) - creadas}, '
+            f'sin cambios: {int(igual.sum())}. Total en el sistema: {Cuenta.objects.count()}.'
+        ))
+
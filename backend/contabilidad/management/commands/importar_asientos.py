@@ -0,0 +1,41 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from contabilidad import importacion
+
+class Command(BaseCommand):
+    help = 'Importa asientos contables en lote desde un archivo NDJSON o CSV (ver contabilidad/importacion.py).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', type=str, help='Ruta del archivo a importar.')
+        parser.add_argument('--formato', choices=importacion.FORMATOS, help='Por defecto se deduce de la extensión.')
+        parser.add_argument('--lote', type=int, default=importacion.LOTE_ASIENTOS, help='Asientos por transacción.')
+        parser.add_argument('--errores', type=str, help='Escribe el informe de errores (NDJSON) en esta ruta.')
+
+    def handle(self, *args, **options):
+        ruta = options['archivo']
+        formato = options['formato'] or ('csv' if ruta.lower().endswith('.csv') else 'ndjson')
+        self.stdout.write(self.style.SUCCESS(f'Importando asientos desde "{ruta}" ({formato})...'))
+
+        try:
+            with open(ruta, 'rb') as archivo:
+                informe = importacion.Importador(lote=options['lote']).importar(importacion.leer(archivo, formato))
+        except FileNotFoundError:
+            raise CommandError(f'No se encontró el archivo "{ruta}".')
+        except importacion.ErrorFormato as e:
+            raise CommandError(str(e))
+
+        errores = informe['errores']
+        if options['errores']:
+            with open(options['errores'], 'w', encoding='utf-8') as salida:
+                for e in errores:
+                    salida.write(json.dumps(e, ensure_ascii=False) + '\n')
+        else:
+            for e in errores[:50]:
+                self.stdout.write(self.style.WARNING(f"Fila {e['fila']} ({e['referencia'] or '-'}): {'; '.join(e['errores'])}"))
+            if len(errores) > 50:
+                self.stdout.write(self.style.WARNING(f'... y {len(errores) - 50} asientos más con errores (use --errores).'))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"¡Listo! {informe['creados']} asientos y {informe['movimientos']} movimientos creados; "
+            f"{len(errores)} asientos rechazados."
+        ))
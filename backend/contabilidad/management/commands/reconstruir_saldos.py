@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from contabilidad import cache_reportes, saldos
+
+class Command(BaseCommand):
+    help = 'Reconstruye la tabla resumen de saldos por cuenta y período fiscal desde los movimientos.'
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS('Reconstruyendo saldos por período...'))
+        total = saldos.reconstruir()
+        cache_reportes.incrementar_version(cache_reportes.LIBRO)
+        self.stdout.write(self.style.SUCCESS(f'¡Listo! Se generaron {total} filas de saldos.'))
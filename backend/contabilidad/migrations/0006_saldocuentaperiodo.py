@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+
+def poblar_saldos(apps, schema_editor):
+    Asiento = apps.get_model('contabilidad', 'AsientoContable')
+    Movimiento = apps.get_model('contabilidad', 'MovimientoContable')
+    Saldo = apps.get_model('contabilidad', 'SaldoCuentaPeriodo')
+    # Asientos anteriores a la atribución fiscal: año/período desde la fecha (como AsientoContable.save)
+    Asiento.objects.filter(fiscal_year=0).update(fiscal_year=ExtractYear('fecha'))
+    Asiento.objects.filter(fiscal_period=0).update(fiscal_period=ExtractMonth('fecha'))
+    agregados = (
+        Movimiento.objects
+        .values('cuenta_id', 'asiento__fiscal_year', 'asiento__fiscal_period')
+        .annotate(deb=Sum('debito'), cre=Sum('credito'))
+        .order_by()
+    )
+    Saldo.objects.bulk_create([
+        Saldo(
+            cuenta_id=x['cuenta_id'],
+            fiscal_year=x['asiento__fiscal_year'],
+            fiscal_period=x['asiento__fiscal_period'],
+            debito=x['deb'] or 0,
+            credito=x['cre'] or 0,
+        ) for x in agregados
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contabilidad', '0005_alter_periodocontable_options_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SaldoCuentaPeriodo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fiscal_year', models.PositiveIntegerField()),
+                ('fiscal_period', models.PositiveSmallIntegerField()),
+                ('debito', models.DecimalField(decimal_places=2, default=0, max_digits=17)),
+                ('credito', models.DecimalField(decimal_places=2, default=0, max_digits=17)),
+                ('cuenta', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saldos_periodo', to='contabilidad.cuenta')),
+            ],
+            options={
+                'verbose_name': 'Saldo de Cuenta por Período',
+                'verbose_name_plural': 'Saldos de Cuentas por Período',
+                'ordering': ['fiscal_year', 'fiscal_period', 'cuenta'],
+                'constraints': [models.UniqueConstraint(fields=('fiscal_year', 'fiscal_period', 'cuenta'), name='saldo_unico_por_periodo')],
+            },
+        ),
+        migrations.RunPython(poblar_saldos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from contabilidad.catalogo import ancestros_por_cuenta
+
+
+def poblar_ancestros(apps, schema_editor):
+    Cuenta = apps.get_model('contabilidad', 'Cuenta')
+    CuentaAncestro = apps.get_model('contabilidad', 'CuentaAncestro')
+    padres = dict(Cuenta.objects.values_list('codigo', 'padre_id'))
+    CuentaAncestro.objects.bulk_create([
+        CuentaAncestro(cuenta_id=codigo, ancestro_id=anc, distancia=dist, nivel_ancestro=len(anc))
+        for codigo, cadena in ancestros_por_cuenta(padres).items()
+        for dist, anc in enumerate(cadena)
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contabilidad', '0006_saldocuentaperiodo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CuentaAncestro',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('distancia', models.PositiveSmallIntegerField()),
+                ('nivel_ancestro', models.PositiveSmallIntegerField(db_index=True)),
+                ('ancestro', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendientes', to='contabilidad.cuenta')),
+                ('cuenta', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestros', to='contabilidad.cuenta')),
+            ],
+            options={
+                'verbose_name': 'Ancestro de Cuenta',
+                'verbose_name_plural': 'Ancestros de Cuentas',
+                'constraints': [models.UniqueConstraint(fields=('cuenta', 'ancestro'), name='ancestro_unico_por_cuenta')],
+            },
+        ),
+        migrations.RunPython(poblar_ancestros, migrations.RunPython.noop),
+    ]
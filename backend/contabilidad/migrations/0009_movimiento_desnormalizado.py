@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:15
+
+from django.db import migrations, models
+from django.db.models import Case, F, IntegerField, OuterRef, Subquery, When
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+
+def copiar_desde_asiento(apps, schema_editor):
+    Asiento = apps.get_model('contabilidad', 'AsientoContable')
+    Movimiento = apps.get_model('contabilidad', 'MovimientoContable')
+    # Asientos heredados con año/período 0: se toman de la fecha
+    asiento = Asiento.objects.filter(pk=OuterRef('asiento_id')).annotate(
+        anio=Case(When(fiscal_year=0, then=ExtractYear('fecha')), default=F('fiscal_year'), output_field=IntegerField()),
+        periodo=Case(When(fiscal_period=0, then=ExtractMonth('fecha')), default=F('fiscal_period'), output_field=IntegerField()),
+    )
+    Movimiento.objects.update(**{
+        campo: Subquery(asiento.values(origen)[:1])
+        for campo, origen in (
+            ('fecha', 'fecha'), ('fiscal_year', 'anio'), ('fiscal_period', 'periodo'), ('estado', 'estado'),
+        )
+    })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contabilidad', '0008_versiondatos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movimientocontable',
+            name='estado',
+            field=models.CharField(default='vigente', editable=False, max_length=10),
+        ),
+        migrations.AddField(
+            model_name='movimientocontable',
+            name='fecha',
+            field=models.DateField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='movimientocontable',
+            name='fiscal_period',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='movimientocontable',
+            name='fiscal_year',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(copiar_desde_asiento, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='movimientocontable',
+            index=models.Index(fields=['cuenta', 'fecha'], name='mov_cuenta_fecha'),
+        ),
+        migrations.AddIndex(
+            model_name='movimientocontable',
+            index=models.Index(fields=['fecha', 'asiento', 'id'], name='mov_fecha_asiento'),
+        ),
+        migrations.AddIndex(
+            model_name='movimientocontable',
+            index=models.Index(fields=['fiscal_year', 'fiscal_period', 'cuenta'], name='mov_periodo_cuenta'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:17
+
+import django.db.models.deletion
+from datetime import date
+
+from django.db import migrations, models
+from django.db.models import F, Sum
+
+
+def cierres_existentes(apps, schema_editor):
+    Periodo = apps.get_model('contabilidad', 'PeriodoContable')
+    Movimiento = apps.get_model('contabilidad', 'MovimientoContable')
+    SaldoCierre = apps.get_model('contabilidad', 'SaldoCierre')
+    for anio in Periodo.objects.filter(estado='cerrado').values_list('anio', flat=True):
+        netos = (
+            Movimiento.objects.filter(fecha__lte=date(anio, 12, 31))
+            .values('cuenta_id').annotate(s=Sum(F('debito') - F('credito'))).order_by()
+        )
+        SaldoCierre.objects.bulk_create([
+            SaldoCierre(anio=anio, cuenta_id=x['cuenta_id'], saldo=x['s'])
+            for x in netos if x['s']
+        ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contabilidad', '0009_movimiento_desnormalizado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SaldoCierre',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('anio', models.PositiveIntegerField(db_index=True)),
+                ('saldo', models.DecimalField(decimal_places=2, max_digits=17)),
+                ('cuenta', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saldos_cierre', to='contabilidad.cuenta')),
+            ],
+            options={
+                'verbose_name': 'Saldo de Cierre',
+                'verbose_name_plural': 'Saldos de Cierre',
+                'ordering': ['anio', 'cuenta'],
+                'constraints': [models.UniqueConstraint(fields=('anio', 'cuenta'), name='saldo_cierre_unico')],
+            },
+        ),
+        migrations.RunPython(cierres_existentes, migrations.RunPython.noop),
+    ]
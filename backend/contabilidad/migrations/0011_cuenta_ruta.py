@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:21
+
+from django.db import migrations, models
+
+from contabilidad.catalogo import ancestros_por_cuenta, ruta_de
+
+
+def poblar_rutas(apps, schema_editor):
+    Cuenta = apps.get_model('contabilidad', 'Cuenta')
+    padres = dict(Cuenta.objects.values_list('codigo', 'padre_id'))
+    cuentas = []
+    for codigo, cadena in ancestros_por_cuenta(padres).items():
+        ruta, profundidad = ruta_de(cadena)
+        cuentas.append(Cuenta(codigo=codigo, ruta=ruta, profundidad=profundidad))
+    Cuenta.objects.bulk_update(cuentas, ['ruta', 'profundidad'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contabilidad', '0010_saldocierre'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cuenta',
+            name='profundidad',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='cuenta',
+            name='ruta',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(poblar_rutas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:26
+
+from django.db import migrations, models
+
+# (formato, concepto, prefijo_cuenta, columna, calculo): punto de partida, editable en el admin
+CONCEPTOS_INICIALES = [
+    ('1001', '5016', '5', 'pago_deducible', 'debito'),
+    ('1001', '5016', '6', 'pago_deducible', 'debito'),
+    ('1001', '5001', '5105', 'pago_deducible', 'debito'),
+    ('1001', '5002', '5110', 'pago_deducible', 'debito'),
+    ('1001', '5002', '5210', 'pago_deducible', 'debito'),
+    ('1001', '5004', '5235', 'pago_deducible', 'debito'),
+    ('1001', '5005', '5120', 'pago_deducible', 'debito'),
+    ('1001', '5005', '5220', 'pago_deducible', 'debito'),
+    ('1001', '5006', '5305', 'pago_deducible', 'debito'),
+    ('1003', '1308', '135515', 'retencion', 'debito'),
+    ('1003', '1309', '135517', 'retencion', 'debito'),
+    ('1005', '', '2408', 'impuesto_descontable', 'debito'),
+    ('1006', '', '2408', 'impuesto_generado', 'credito'),
+    ('1007', '4001', '41', 'ingresos_brutos', 'credito'),
+    ('1007', '4001', '4175', 'devoluciones', 'debito'),
+    ('1007', '4002', '42', 'ingresos_brutos', 'credito'),
+    ('1008', '1315', '1305', 'saldo', 'saldo_debito'),
+    ('1008', '1317', '13', 'saldo', 'saldo_debito'),
+    ('1009', '2201', '22', 'saldo', 'saldo_credito'),
+    ('1009', '2203', '23', 'saldo', 'saldo_credito'),
+]
+
+
+def cargar_conceptos(apps, schema_editor):
+    ConceptoExogena = apps.get_model('contabilidad', 'ConceptoExogena')
+    ConceptoExogena.objects.bulk_create([
+        ConceptoExogena(formato=f, concepto=c, prefijo_cuenta=p, columna=col, calculo=calc)
+        for f, c, p, col, calc in CONCEPTOS_INICIALES
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contabilidad', '0011_cuenta_ruta'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConceptoExogena',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('formato', models.CharField(choices=[('1001', '1001'), ('1003', '1003'), ('1005', '1005'), ('1006', '1006'), ('1007', '1007'), ('1008', '1008'), ('1009', '1009')], max_length=4)),
+                ('concepto', models.CharField(blank=True, default='', help_text='Vacío en formatos sin concepto (1005, 1006).', max_length=4)),
+                ('prefijo_cuenta', models.CharField(max_length=20)),
+                ('columna', models.CharField(help_text='Columna del formato que suma este valor.', max_length=40)),
+                ('calculo', models.CharField(choices=[('debito', 'Débitos del año'), ('credito', 'Créditos del año'), ('saldo_debito', 'Saldo débito al cierre'), ('saldo_credito', 'Saldo crédito al cierre')], default='debito', max_length=15)),
+                ('activo', models.BooleanField(default=True)),
+            ],
+            options={
+                'verbose_name': 'Concepto Exógena',
+                'verbose_name_plural': 'Conceptos Exógena',
+                'ordering': ['formato', 'prefijo_cuenta', 'columna'],
+                'constraints': [models.UniqueConstraint(fields=('formato', 'prefijo_cuenta', 'columna'), name='concepto_exogena_unico')],
+            },
+        ),
+        migrations.RunPython(cargar_conceptos, migrations.RunPython.noop),
+    ]
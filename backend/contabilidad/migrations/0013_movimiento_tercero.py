@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copiar_tercero(apps, schema_editor):
+    Asiento = apps.get_model('contabilidad', 'AsientoContable')
+    Movimiento = apps.get_model('contabilidad', 'MovimientoContable')
+    asiento = Asiento.objects.filter(pk=OuterRef('asiento_id'))
+    Movimiento.objects.update(tercero_id=Subquery(asiento.values('tercero_id')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contabilidad', '0012_conceptoexogena'),
+        ('terceros', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movimientocontable',
+            name='tercero',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='movimientos_contables', to='terceros.tercero'),
+        ),
+        migrations.RunPython(copiar_tercero, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='movimientocontable',
+            index=models.Index(fields=['cuenta', 'tercero', 'fecha'], name='mov_cuenta_tercero_fecha'),
+        ),
+    ]
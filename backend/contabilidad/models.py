@@ -1,6 +1,13 @@
  #contabilidad/models.py
 
-from django.db import models
+import threading
+import time
+from contextlib import contextmanager
+from functools import partial
+
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
 from django.core.exceptions import ValidationError
 from terceros.models import Tercero
 from django.utils import timezone
@@ -12,12 +19,58 @@ class Cuenta(models.Model):
     codigo = models.CharField(max_length=20, unique=True, primary_key=True, verbose_name="Código")
     nombre = models.CharField(max_length=255, verbose_name="Nombre de la Cuenta")
     padre = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='hijos')
+    # Camino materializado "1/11/1105/" y profundidad (0 = raíz); los mantiene
+    # catalogo.reconstruir_ancestros. Un subárbol es un rango: ruta__startswith.
+    ruta = models.CharField(max_length=255, blank=True, default="", db_index=True, editable=False)
+    profundidad = models.PositiveSmallIntegerField(default=0, editable=False)
     def __str__(self): return f"{self.codigo} - {self.nombre}"
     class Meta:
         verbose_name = "Cuenta Contable"
         verbose_name_plural = "Plan de Cuentas"
         ordering = ['codigo']
 
+class CuentaAncestro(models.Model):
+    """
+    Tabla de clausura del PUC: una fila por cada par (cuenta, ancestro), incluida
+    la propia cuenta con distancia 0. Se regenera al importar el plan de cuentas
+    (ver contabilidad/catalogo.py).
+    """
+    cuenta = models.ForeignKey(Cuenta, on_delete=models.CASCADE, related_name='ancestros')
+    ancestro = models.ForeignKey(Cuenta, on_delete=models.CASCADE, related_name='descendientes')
+    distancia = models.PositiveSmallIntegerField()
+    nivel_ancestro = models.PositiveSmallIntegerField(db_index=True)  # dígitos del código: 1, 2, 4, 6...
+
+    class Meta:
+        verbose_name = "Ancestro de Cuenta"
+        verbose_name_plural = "Ancestros de Cuentas"
+        constraints = [
+            models.UniqueConstraint(fields=['cuenta', 'ancestro'], name='ancestro_unico_por_cuenta'),
+        ]
+
+
+def _borrar_descontando(borrar, movimientos):
+    """
+    Ejecuta `borrar()` descontando antes del resumen las sumas de `movimientos`
+    con una consulta agrupada; las señales por fila quedan suspendidas.
+    """
+    if not resumen_activo():
+        return borrar()
+    from . import saldos
+    with transaction.atomic(), resumen_diferido():
+        saldos.descontar_movimientos(movimientos)
+        return borrar()
+
+
+class AsientoQuerySet(models.QuerySet):
+    def delete(self):
+        return _borrar_descontando(super().delete, MovimientoContable.objects.filter(asiento__in=self))
+
+
+class MovimientoQuerySet(models.QuerySet):
+    def delete(self):
+        return _borrar_descontando(super().delete, self)
+
+
 class AsientoContable(models.Model):
     fecha = models.DateField(verbose_name="Fecha del Asiento")
 
@@ -37,6 +90,8 @@ class AsientoContable(models.Model):
     anulacion_motivo = models.TextField(blank=True, null=True)
     ajusta_a = models.ForeignKey("self", null=True, blank=True, on_delete=models.SET_NULL, related_name="ajustes")
 
+    objects = AsientoQuerySet.as_manager()
+
     def save(self, *args, **kwargs):
         # Si no los envían, los derivamos de la fecha
         if not self.fiscal_year and self.fecha:
@@ -44,7 +99,26 @@ class AsientoContable(models.Model):
         if not self.fiscal_period and self.fecha:
             # por defecto, el mes real (1..12). El 13 sólo lo pondrás manualmente cuando corresponda.
             self.fiscal_period = self.fecha.month
+        nuevo = self._state.adding
         super().save(*args, **kwargs)
+        if not nuevo:
+            # Mantener la copia desnormalizada de los movimientos (anular, cambio de fecha...)
+            desactualizados = self.movimientos.exclude(**self.campos_movimiento())
+            if resumen_activo():
+                from . import saldos
+                saldos.reubicar_movimientos(self, desactualizados)
+            else:
+                desactualizados.update(**self.campos_movimiento())
+
+    def campos_movimiento(self):
+        """Campos del asiento que se copian en cada MovimientoContable."""
+        return {
+            'fecha': self.fecha,
+            'fiscal_year': self.fiscal_year,
+            'fiscal_period': self.fiscal_period,
+            'estado': self.estado,
+            'tercero_id': self.tercero_id,
+        }
 
 
     def __str__(self):
@@ -55,11 +129,33 @@ class AsientoContable(models.Model):
         verbose_name_plural = "Asientos Contables"
         ordering = ['-fecha', '-id']
 
+    def delete(self, *args, **kwargs):
+        # En cascada: un descuento agrupado en vez de una consulta por movimiento
+        return _borrar_descontando(partial(super().delete, *args, **kwargs), self.movimientos.all())
+
 class MovimientoContable(models.Model):
     asiento = models.ForeignKey(AsientoContable, on_delete=models.CASCADE, related_name='movimientos')
     cuenta = models.ForeignKey(Cuenta, on_delete=models.PROTECT)
     debito = models.DecimalField(max_digits=15, decimal_places=2, default=0, verbose_name="Débito")
     credito = models.DecimalField(max_digits=15, decimal_places=2, default=0, verbose_name="Crédito")
+
+    # Copia del asiento para filtrar sin JOIN (la mantiene AsientoContable.save)
+    fecha = models.DateField(null=True, editable=False)
+    fiscal_year = models.PositiveIntegerField(default=0, editable=False)
+    fiscal_period = models.PositiveSmallIntegerField(default=0, editable=False)
+    estado = models.CharField(max_length=10, default="vigente", editable=False)
+    tercero = models.ForeignKey(
+        Tercero, on_delete=models.PROTECT, null=True, editable=False, related_name='movimientos_contables',
+    )
+
+    objects = MovimientoQuerySet.as_manager()
+
+    def save(self, *args, **kwargs):
+        if self.asiento_id:
+            for campo, valor in self.asiento.campos_movimiento().items():
+                setattr(self, campo, valor)
+        super().save(*args, **kwargs)
+
     def clean(self):
         if self.debito > 0 and self.credito > 0:
             raise ValidationError("Un movimiento no puede tener valor en Débito y Crédito simultáneamente.")
@@ -72,6 +168,113 @@ class MovimientoContable(models.Model):
         verbose_name = "Movimiento Contable"
         verbose_name_plural = "Movimientos Contables"
         ordering = ['asiento', 'id']
+        indexes = [
+            models.Index(fields=['cuenta', 'fecha'], name='mov_cuenta_fecha'),
+            models.Index(fields=['fecha', 'asiento', 'id'], name='mov_fecha_asiento'),
+            models.Index(fields=['fiscal_year', 'fiscal_period', 'cuenta'], name='mov_periodo_cuenta'),
+            models.Index(fields=['cuenta', 'tercero', 'fecha'], name='mov_cuenta_tercero_fecha'),
+        ]
+
+class SaldoCuentaPeriodo(models.Model):
+    """
+    Acumulado de débitos y créditos por cuenta y período fiscal.
+    Se mantiene al registrar/anular asientos (ver contabilidad/saldos.py) y se
+    reconstruye con: python manage.py reconstruir_saldos
+    """
+    cuenta = models.ForeignKey(Cuenta, on_delete=models.CASCADE, related_name='saldos_periodo')
+    fiscal_year   = models.PositiveIntegerField()
+    fiscal_period = models.PositiveSmallIntegerField()
+    debito = models.DecimalField(max_digits=17, decimal_places=2, default=0)
+    credito = models.DecimalField(max_digits=17, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.cuenta_id} {self.fiscal_year}/{self.fiscal_period:02d}"
+
+    class Meta:
+        verbose_name = "Saldo de Cuenta por Período"
+        verbose_name_plural = "Saldos de Cuentas por Período"
+        ordering = ['fiscal_year', 'fiscal_period', 'cuenta']
+        constraints = [
+            models.UniqueConstraint(fields=['fiscal_year', 'fiscal_period', 'cuenta'], name='saldo_unico_por_periodo'),
+        ]
+
+class SaldoCierre(models.Model):
+    """
+    Saldo neto (débito - crédito) de cada cuenta al 31/12 de un año cerrado,
+    contando los movimientos por su fecha. Se genera al pasar el PeriodoContable
+    a 'cerrado' y se descarta si el período se reabre. Los saldos iniciales
+    posteriores parten de esta foto y solo suman los movimientos siguientes.
+    """
+    anio = models.PositiveIntegerField(db_index=True)
+    cuenta = models.ForeignKey(Cuenta, on_delete=models.CASCADE, related_name='saldos_cierre')
+    saldo = models.DecimalField(max_digits=17, decimal_places=2)
+
+    def __str__(self):
+        return f"{self.cuenta_id} cierre {self.anio}: {self.saldo}"
+
+    class Meta:
+        verbose_name = "Saldo de Cierre"
+        verbose_name_plural = "Saldos de Cierre"
+        ordering = ['anio', 'cuenta']
+        constraints = [
+            models.UniqueConstraint(fields=['anio', 'cuenta'], name='saldo_cierre_unico'),
+        ]
+
+class ConceptoExogena(models.Model):
+    """
+    Mapeo cuenta → concepto DIAN para Medios Magnéticos (exógena).
+    Dentro de un formato manda el prefijo de cuenta más largo; un mismo prefijo
+    puede alimentar varias columnas del formato (una fila por columna).
+    """
+    FORMATOS = [(f, f) for f in ('1001', '1003', '1005', '1006', '1007', '1008', '1009')]
+    CALCULOS = [
+        ('debito', 'Débitos del año'),
+        ('credito', 'Créditos del año'),
+        ('saldo_debito', 'Saldo débito al cierre'),
+        ('saldo_credito', 'Saldo crédito al cierre'),
+    ]
+    formato = models.CharField(max_length=4, choices=FORMATOS)
+    concepto = models.CharField(max_length=4, blank=True, default="", help_text="Vacío en formatos sin concepto (1005, 1006).")
+    prefijo_cuenta = models.CharField(max_length=20)
+    columna = models.CharField(max_length=40, help_text="Columna del formato que suma este valor.")
+    calculo = models.CharField(max_length=15, choices=CALCULOS, default='debito')
+    activo = models.BooleanField(default=True)
+
+    def __str__(self):
+        return f"{self.formato}/{self.concepto or '-'} ← {self.prefijo_cuenta} ({self.columna})"
+
+    def clean(self):
+        from .exogena import FORMATOS
+        if self.formato in FORMATOS and self.columna not in FORMATOS[self.formato].columnas:
+            raise ValidationError({"columna": f"Columnas del formato {self.formato}: {', '.join(FORMATOS[self.formato].columnas)}."})
+
+    class Meta:
+        verbose_name = "Concepto Exógena"
+        verbose_name_plural = "Conceptos Exógena"
+        ordering = ['formato', 'prefijo_cuenta', 'columna']
+        constraints = [
+            models.UniqueConstraint(fields=['formato', 'prefijo_cuenta', 'columna'], name='concepto_exogena_unico'),
+        ]
+
+class VersionDatos(models.Model):
+    """
+    Contador que se incrementa cada vez que cambian los datos de un ámbito
+    ('libro' por año fiscal). Las cachés de reportes lo usan en la clave.
+    El año 0 se usa para invalidaciones globales.
+    """
+    ambito = models.CharField(max_length=20)
+    anio = models.PositiveIntegerField(default=0)
+    version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.ambito}:{self.anio} v{self.version}"
+
+    class Meta:
+        verbose_name = "Versión de Datos"
+        verbose_name_plural = "Versiones de Datos"
+        constraints = [
+            models.UniqueConstraint(fields=['ambito', 'anio'], name='version_unica_por_ambito'),
+        ]
 
 # --- Periodo contable ---
 class PeriodoContable(models.Model):
@@ -83,28 +286,142 @@ class PeriodoContable(models.Model):
     habilitar_mes13 = models.BooleanField(default=True)
     requiere_pins_en_ajustes = models.BooleanField(default=True)
 
+    def save(self, *args, **kwargs):
+        anterior = None
+        if self.pk:
+            anterior = PeriodoContable.objects.filter(pk=self.pk).values_list('estado', flat=True).first()
+        super().save(*args, **kwargs)
+        if anterior != self.estado and 'cerrado' in (anterior, self.estado):
+            from . import saldos
+            if self.estado == 'cerrado':
+                saldos.generar_cierre(self.anio)
+            else:
+                # Reabierto: la foto de este año (y las siguientes) ya no es confiable
+                saldos.descartar_cierres(self.anio)
+
     def in_ajustes(self, d: date) -> bool:
         return self.ajustes_inicio <= d <= self.ajustes_fin
 
     @classmethod
-    def ensure(cls, anio:int):
-        obj, _ = cls.objects.get_or_create(
-            anio=anio,
-            defaults=dict(
-                estado='abierto',
-                ajustes_inicio=date(anio+1, 1, 1),
-                ajustes_fin=date(anio+1, 3, 31),
-                habilitar_mes13=True,
-                requiere_pins_en_ajustes=True,
-            )
+    def _por_defecto(cls, anio:int):
+        return dict(
+            estado='abierto',
+            ajustes_inicio=date(anio+1, 1, 1),
+            ajustes_fin=date(anio+1, 3, 31),
+            habilitar_mes13=True,
+            requiere_pins_en_ajustes=True,
         )
+
+    @classmethod
+    def ensure(cls, anio:int):
+        obj, _ = cls.objects.get_or_create(anio=anio, defaults=cls._por_defecto(anio))
+        return obj
+
+    @classmethod
+    def leer(cls, anio:int):
+        """
+        Como ensure() pero sin escribir: si el año no existe devuelve una instancia
+        sin guardar con los valores por defecto. Es la lectura de las validaciones
+        que impiden contabilizar en un período cerrado (siempre fresca).
+        """
+        return cls.objects.filter(anio=anio).first() or cls(anio=anio, **cls._por_defecto(anio))
+
+    @classmethod
+    def obtener(cls, anio: int):
+        """
+        leer() con caché en memoria del proceso, solo para reportes y consultas: se
+        invalida con las señales de guardado/borrado (al confirmar la transacción)
+        y expira a los PERIODOS_TTL segundos (cambios hechos por otros procesos o
+        con queryset.update). Dentro de una transacción no se guarda en caché, para
+        que un rollback no deje valores que nunca se confirmaron. El objeto es
+        compartido: solo lectura.
+        """
+        ahora = time.monotonic()
+        item = _PERIODOS.get(anio)
+        if item is not None and item[0] > ahora:
+            return item[1]
+        obj = cls.leer(anio)
+        if not transaction.get_connection().in_atomic_block:
+            _PERIODOS[anio] = (ahora + PERIODOS_TTL, obj)
         return obj
 
     @classmethod
     def periodo_para_fecha(cls, d: date):
-        return cls.ensure(d.year)
+        return cls.obtener(d.year)
 
     @classmethod
     def activo_para_hoy(cls):
         hoy = timezone.localdate()
-        return cls.ensure(hoy.year)
\ No newline at end of file
+        return cls.obtener(hoy.year)
+
+
+# --- Resumen de saldos y versión del libro ---
+# Cada alta, cambio o baja de un MovimientoContable (admin, shell, scripts)
+# actualiza SaldoCuentaPeriodo e invalida los reportes del año por señal. Los
+# caminos por lote (serializer, importación, anulación) aplican sus deltas en
+# bloque dentro de resumen_diferido(); los borrados de asientos (y en cascada
+# sus movimientos) y de querysets descuentan con una consulta agrupada.
+
+_resumen = threading.local()
+
+
+@contextmanager
+def resumen_diferido():
+    """Suspende en este hilo el mantenimiento por señal del resumen y de la versión del libro."""
+    anterior = getattr(_resumen, 'diferir', False)
+    _resumen.diferir = True
+    try:
+        yield
+    finally:
+        _resumen.diferir = anterior
+
+
+def resumen_activo():
+    return not getattr(_resumen, 'diferir', False)
+
+
+CAMPOS_RESUMEN = ('cuenta_id', 'fiscal_year', 'fiscal_period', 'fecha', 'debito', 'credito')
+
+
+@receiver(pre_save, sender=MovimientoContable)
+@receiver(pre_delete, sender=MovimientoContable)
+def recordar_movimiento(sender, instance, raw=False, **kwargs):
+    # Lo guardado en la base: la copia en memoria puede estar vieja (p.ej. tras reubicar)
+    instance._resumen_anterior = None
+    if instance.pk and not raw and resumen_activo():
+        instance._resumen_anterior = (
+            MovimientoContable.objects.filter(pk=instance.pk).values(*CAMPOS_RESUMEN).first()
+        )
+
+
+@receiver(post_save, sender=MovimientoContable)
+def resumir_movimiento(sender, instance, raw=False, **kwargs):
+    if raw or not resumen_activo():
+        return
+    from . import saldos
+    nuevo = {campo: getattr(instance, campo) for campo in CAMPOS_RESUMEN}
+    saldos.resumir_cambio(getattr(instance, '_resumen_anterior', None), nuevo)
+
+
+@receiver(post_delete, sender=MovimientoContable)
+def descontar_movimiento(sender, instance, **kwargs):
+    if not resumen_activo():
+        return
+    from . import saldos
+    saldos.resumir_cambio(getattr(instance, '_resumen_anterior', None), None)
+
+
+# Caché de PeriodoContable por año: {anio: (expira, periodo)}
+PERIODOS_TTL = 10
+_PERIODOS = {}
+
+
+@receiver(post_save, sender=PeriodoContable)
+@receiver(post_delete, sender=PeriodoContable)
+def invalidar_periodo(sender, instance, **kwargs):
+    _PERIODOS.pop(instance.anio, None)
+    # Otra lectura antes del commit vería el valor anterior: se descarta de nuevo al confirmar
+    transaction.on_commit(lambda: _PERIODOS.pop(instance.anio, None))
+    # Mes 13, estado... cambian las columnas de los reportes cacheados
+    from . import cache_reportes
+    cache_reportes.incrementar_version(cache_reportes.PERIODOS)
@@ -0,0 +1,133 @@
+# contabilidad/paginacion.py
+"""
+Paginación por cursor (keyset) para listados y reportes del libro.
+
+En lugar de COUNT(*) + OFFSET, cada página filtra "después de la última fila
+vista" sobre un orden estable, así la página N cuesta lo mismo que la página 1.
+El cursor va firmado y puede llevar estado extra (p.ej. el saldo acumulado del
+Libro Mayor).
+"""
+from django.core import signing
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+SALT = "contabilidad.cursor"
+LIMITE_DEFECTO = 500
+LIMITE_MAXIMO = 5000
+
+
+def codificar_cursor(datos):
+    return signing.dumps(datos, salt=SALT, compress=True)
+
+
+def decodificar_cursor(valor):
+    try:
+        return signing.loads(valor, salt=SALT)
+    except signing.BadSignature:
+        raise ValidationError({"cursor": "Cursor inválido."})
+
+
+def filtro_despues(orden, valores):
+    """
+    Condición "fila > valores" para un orden compuesto, p.ej.
+    orden=('fecha', 'asiento_id', 'id') o ('-fecha', '-id').
+    """
+    condicion = Q()
+    iguales = Q()
+    for campo, valor in zip(orden, valores):
+        desc = campo.startswith('-')
+        nombre = campo.lstrip('-')
+        paso = Q(**{f"{nombre}__{'lt' if desc else 'gt'}": valor})
+        condicion |= iguales & paso
+        iguales &= Q(**{nombre: valor})
+    return condicion
+
+
+def leer_limite(request, defecto=LIMITE_DEFECTO):
+    valor = request.query_params.get('limite')
+    if not valor:
+        return defecto
+    if not valor.isdigit() or int(valor) < 1:
+        raise ValidationError({"limite": "Debe ser un entero positivo."})
+    return min(int(valor), LIMITE_MAXIMO)
+
+
+def solicita_pagina(request):
+    return 'cursor' in request.query_params or 'limite' in request.query_params
+
+
+def paginar(request, queryset, orden, clave, limite=None):
+    """
+    Aplica el cursor de la petición a `queryset` (ordenado por `orden`).
+    `clave(fila)` devuelve los valores del orden para una fila.
+
+    Devuelve (filas, estado, siguiente): `estado` es el dict del cursor recibido
+    (vacío en la primera página) y `siguiente(extra)` construye la URL de la
+    próxima página o None si no hay más.
+    """
+    limite = limite or leer_limite(request)
+    estado = {}
+    cursor = request.query_params.get('cursor')
+    if cursor:
+        estado = decodificar_cursor(cursor)
+        queryset = queryset.filter(filtro_despues(orden, estado.get('k', [])))
+
+    filas = list(queryset.order_by(*orden)[:limite + 1])
+    hay_mas = len(filas) > limite
+    filas = filas[:limite]
+
+    def siguiente(extra=None):
+        if not hay_mas:
+            return None
+        datos = {'k': [_serializable(v) for v in clave(filas[-1])]}
+        datos.update(extra or {})
+        return replace_query_param(request.build_absolute_uri(), 'cursor', codificar_cursor(datos))
+
+    return filas, estado, siguiente
+
+
+def _serializable(valor):
+    if hasattr(valor, 'isoformat'):
+        return valor.isoformat()
+    if isinstance(valor, (int, str)) or valor is None:
+        return valor
+    return str(valor)
+
+
+class AsientoCursorPagination(BasePagination):
+    """
+    Keyset sobre (-fecha, -id) para el listado de asientos.
+    Si la petición trae ?page= se mantiene la paginación numerada de siempre
+    (la usa el frontend para mostrar "Página X de Y").
+    """
+    orden = ('-fecha', '-id')
+    page_size = 15
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if 'page' in request.query_params:
+            self._numerada = PageNumberPagination()
+            return self._numerada.paginate_queryset(queryset, request, view)
+        self._numerada = None
+        filas, _, self._siguiente = paginar(
+            request, queryset, self.orden,
+            clave=lambda a: (a.fecha, a.id),
+            limite=leer_limite(request, defecto=self.page_size),
+        )
+        return filas
+
+    def get_paginated_response(self, data):
+        if self._numerada is not None:
+            return self._numerada.get_paginated_response(data)
+        return Response({'next': self._siguiente(), 'results': data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
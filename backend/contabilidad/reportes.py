@@ -0,0 +1,180 @@
+# contabilidad/reportes.py
+"""
+Motor de los estados financieros.
+
+Todas las cifras de un estado salen de una sola consulta agrupada por grupo
+PUC (los dos primeros dígitos del código); las clases y subtotales se suman
+en memoria a partir de esos pocos grupos.
+"""
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from django.db.models.functions import Substr
+
+from .models import MovimientoContable, SaldoCuentaPeriodo
+from .saldos import CERO, contable_desde, contable_hasta, rango_alineado, resumen_antes, resumen_hasta
+
+# Naturaleza de cada clase PUC: débito (saldo = D - C) o crédito (saldo = C - D)
+NATURALEZA_CREDITO = ('2', '3', '4')
+
+ETIQUETAS_PERIODO = {
+    1: 'Enero', 2: 'Febrero', 3: 'Marzo', 4: 'Abril', 5: 'Mayo', 6: 'Junio',
+    7: 'Julio', 8: 'Agosto', 9: 'Septiembre', 10: 'Octubre', 11: 'Noviembre', 12: 'Diciembre',
+    13: 'Mes 13 (Ajustes de cierre)',
+}
+
+
+class TotalesPUC:
+    """Débitos/créditos por grupo PUC con sumas por prefijo."""
+
+    def __init__(self, grupos):
+        self.grupos = grupos  # {'41': (debitos, creditos)}
+
+    def movimiento(self, prefijo):
+        deb = cre = CERO
+        for grupo, (d, c) in self.grupos.items():
+            if grupo.startswith(prefijo):
+                deb += d
+                cre += c
+        return deb, cre
+
+    def __add__(self, otro):
+        grupos = dict(self.grupos)
+        for grupo, (d, c) in otro.grupos.items():
+            deb, cre = grupos.get(grupo, (CERO, CERO))
+            grupos[grupo] = (deb + d, cre + c)
+        return TotalesPUC(grupos)
+
+    def saldo(self, prefijo):
+        """Saldo según la naturaleza de la clase (positivo = saldo normal)."""
+        deb, cre = self.movimiento(prefijo)
+        if prefijo[0] in NATURALEZA_CREDITO:
+            return cre - deb
+        return deb - cre
+
+
+def totales(fecha_fin, fecha_inicio=None):
+    """
+    TotalesPUC acumulados hasta `fecha_fin` (y desde `fecha_inicio` si se da).
+    Si el rango son meses completos lee la tabla resumen; si no, los movimientos
+    por su fecha contable (saldos.contable_hasta).
+    """
+    if rango_alineado(fecha_inicio, fecha_fin):
+        qs = SaldoCuentaPeriodo.objects.filter(resumen_hasta(fecha_fin))
+        if fecha_inicio:
+            qs = qs.exclude(resumen_antes(fecha_inicio))
+    else:
+        qs = MovimientoContable.objects.filter(contable_hasta(fecha_fin))
+        if fecha_inicio:
+            qs = qs.filter(contable_desde(fecha_inicio))
+
+    filas = (
+        qs.annotate(grupo=Substr('cuenta_id', 1, 2))
+        .values('grupo')
+        .annotate(deb=Sum('debito'), cre=Sum('credito'))
+        .order_by()
+    )
+    return TotalesPUC({x['grupo']: (x['deb'] or CERO, x['cre'] or CERO) for x in filas})
+
+
+def serie_mensual(anio, periodos):
+    """
+    Totales del año fiscal `anio` por período en una consulta sobre la tabla
+    resumen: los años anteriores caen en el período 0.
+    Devuelve (anteriores, {periodo: TotalesPUC}) con un TotalesPUC por cada
+    período pedido (vacío si no tuvo movimientos).
+    """
+    filas = (
+        SaldoCuentaPeriodo.objects
+        .filter(fiscal_year__lte=anio)
+        .annotate(
+            periodo=Case(
+                When(fiscal_year__lt=anio, then=Value(0)),
+                default=F('fiscal_period'),
+                output_field=IntegerField(),
+            ),
+            grupo=Substr('cuenta_id', 1, 2),
+        )
+        .values('periodo', 'grupo')
+        .annotate(deb=Sum('debito'), cre=Sum('credito'))
+        .order_by()
+    )
+    por_periodo = {p: {} for p in (0, *periodos)}
+    for x in filas:
+        if x['periodo'] in por_periodo:
+            por_periodo[x['periodo']][x['grupo']] = (x['deb'] or CERO, x['cre'] or CERO)
+    anteriores = TotalesPUC(por_periodo.pop(0))
+    return anteriores, {p: TotalesPUC(g) for p, g in por_periodo.items()}
+
+
+def columnas_mensuales(anio, periodos):
+    """
+    [(periodo, etiqueta, TotalesPUC del mes, TotalesPUC acumulado del año,
+    TotalesPUC acumulado histórico)] armados con una suma de prefijos.
+    """
+    anteriores, meses = serie_mensual(anio, periodos)
+    columnas = []
+    acumulado_anio = TotalesPUC({})
+    for p in periodos:
+        acumulado_anio = acumulado_anio + meses[p]
+        columnas.append((p, ETIQUETAS_PERIODO[p], meses[p], acumulado_anio, anteriores + acumulado_anio))
+    return columnas
+
+
+def estado_resultados(t):
+    """
+    Estado de resultados. Las claves principales son las de siempre, por clase
+    PUC: 4 ingresos, 6 costos, 5 gastos; `utilidad_neta` es la misma utilidad
+    del ejercicio del balance general (4 - 5 - 6).
+    `por_grupo` abre los subtotales por grupo: 41/42 ingresos operacionales y
+    no operacionales, 51/52 administración y ventas, 53 no operacionales,
+    54 impuesto de renta; lo demás de cada clase (43-49, 59...) va en `otros_*`.
+    """
+    ingresos = t.saldo('4')
+    costos = t.saldo('6')
+    utilidad_bruta = ingresos - costos
+    gastos = t.saldo('5')
+    utilidad_operacional = utilidad_bruta - gastos
+
+    por_grupo = {
+        'ingresos_operacionales': t.saldo('41'),
+        'ingresos_no_operacionales': t.saldo('42'),
+        'gastos_administracion': t.saldo('51'),
+        'gastos_ventas': t.saldo('52'),
+        'gastos_no_operacionales': t.saldo('53'),
+        'impuesto_de_renta': t.saldo('54'),
+    }
+    por_grupo['otros_ingresos'] = (
+        ingresos - por_grupo['ingresos_operacionales'] - por_grupo['ingresos_no_operacionales']
+    )
+    por_grupo['otros_gastos'] = gastos - sum(
+        por_grupo[k] for k in ('gastos_administracion', 'gastos_ventas', 'gastos_no_operacionales', 'impuesto_de_renta')
+    )
+    return {
+        'ingresos_operacionales': ingresos,
+        'costo_de_ventas': costos,
+        'utilidad_bruta': utilidad_bruta,
+        'gastos_operacionales': gastos,
+        'utilidad_operacional': utilidad_operacional,
+        'utilidad_neta_antes_de_impuestos': utilidad_operacional,
+        'utilidad_neta': utilidad_del_ejercicio(t),
+        'por_grupo': por_grupo,
+    }
+
+
+def utilidad_del_ejercicio(t):
+    return t.saldo('4') - t.saldo('5') - t.saldo('6')
+
+
+def balance_general(t):
+    activos = t.saldo('1')
+    pasivos = t.saldo('2')
+    patrimonio_inicial = t.saldo('3')
+    utilidad = utilidad_del_ejercicio(t)
+    patrimonio = patrimonio_inicial + utilidad
+    return {
+        'activos': activos,
+        'pasivos': pasivos,
+        'patrimonio_inicial': patrimonio_inicial,
+        'utilidad_del_ejercicio': utilidad,
+        'patrimonio': patrimonio,
+        'ecuacion_ok': activos == (pasivos + patrimonio),
+    }
@@ -0,0 +1,485 @@
+# contabilidad/saldos.py
+"""
+Mantenimiento y lectura de la tabla resumen SaldoCuentaPeriodo.
+
+Cada asiento suma sus débitos/créditos en la fila (cuenta, año fiscal, período
+fiscal) correspondiente, de modo que los reportes leen unos pocos miles de
+filas resumen en lugar de recorrer todos los movimientos.
+"""
+import calendar
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, ExpressionWrapper, F, IntegerField, Max, Q, Subquery, Sum, Value, When, Window
+from django.db.models.expressions import RowRange
+from django.db.models.functions import Coalesce, ExtractMonth, ExtractYear
+
+from . import cache_reportes
+from .models import MovimientoContable, SaldoCierre, SaldoCuentaPeriodo
+
+CERO = Decimal('0')
+LOTE = 1000
+
+MONTO = DecimalField(max_digits=17, decimal_places=2)
+NETO = ExpressionWrapper(F('debito') - F('credito'), output_field=MONTO)
+
+# Año/período fiscal del movimiento; los registros heredados con 0 se ubican por su fecha
+ANIO_FISCAL = Case(
+    When(fiscal_year=0, then=ExtractYear('fecha')), default=F('fiscal_year'), output_field=IntegerField(),
+)
+PERIODO_FISCAL = Case(
+    When(fiscal_period=0, then=ExtractMonth('fecha')), default=F('fiscal_period'), output_field=IntegerField(),
+)
+
+
+def registrar_movimientos(asiento, movimientos, signo=1):
+    """
+    Acumula los movimientos de `asiento` en el resumen.
+    Use signo=-1 para descontarlos (p.ej. antes de borrarlos).
+    """
+    deltas = defaultdict(lambda: [CERO, CERO])
+    for m in movimientos:
+        d = deltas[(m.cuenta_id, asiento.fiscal_year, asiento.fiscal_period)]
+        d[0] += m.debito * signo
+        d[1] += m.credito * signo
+    aplicar_deltas(deltas)
+
+
+def aplicar_deltas(deltas):
+    """
+    deltas: {(cuenta_id, fiscal_year, fiscal_period): (debito, credito)}
+    Cuesta tres consultas sin importar cuántas cuentas toque.
+    """
+    if not deltas:
+        return
+    cuentas = {k[0] for k in deltas}
+    anios = {k[1] for k in deltas}
+    periodos = {k[2] for k in deltas}
+
+    with transaction.atomic():
+        existentes = {
+            (s.cuenta_id, s.fiscal_year, s.fiscal_period): s
+            for s in SaldoCuentaPeriodo.objects.select_for_update().filter(
+                cuenta_id__in=cuentas, fiscal_year__in=anios, fiscal_period__in=periodos,
+            )
+        }
+        actualizar, nuevos = [], []
+        for (cuenta_id, fy, fp), (deb, cre) in deltas.items():
+            s = existentes.get((cuenta_id, fy, fp))
+            if s is not None:
+                s.debito += deb
+                s.credito += cre
+                actualizar.append(s)
+            else:
+                nuevos.append(SaldoCuentaPeriodo(
+                    cuenta_id=cuenta_id, fiscal_year=fy, fiscal_period=fp, debito=deb, credito=cre,
+                ))
+        if actualizar:
+            SaldoCuentaPeriodo.objects.bulk_update(actualizar, ['debito', 'credito'], batch_size=LOTE)
+        if nuevos:
+            SaldoCuentaPeriodo.objects.bulk_create(nuevos, batch_size=LOTE)
+
+
+def resumir_cambio(anterior, nuevo):
+    """
+    Lleva al resumen el cambio de un movimiento e invalida los años que toca.
+    `anterior` y `nuevo` son dicts con models.CAMPOS_RESUMEN (None en altas/bajas).
+    """
+    deltas = defaultdict(lambda: [CERO, CERO])
+    anios = set()
+    for m, signo in ((anterior, -1), (nuevo, 1)):
+        if not m:
+            continue
+        d = deltas[(m['cuenta_id'], m['fiscal_year'], m['fiscal_period'])]
+        d[0] += Decimal(m['debito'] or 0) * signo
+        d[1] += Decimal(m['credito'] or 0) * signo
+        anios.add(m['fiscal_year'])
+        if m['fecha']:
+            anios.add(m['fecha'].year)
+    aplicar_deltas({k: d for k, d in deltas.items() if any(d)})
+    cache_reportes.incrementar_version(cache_reportes.LIBRO, *anios)
+
+
+def descontar_movimientos(movimientos):
+    """
+    Quita del resumen las sumas de `movimientos` (antes de borrarlos) con una
+    consulta agrupada e invalida los años que tocan.
+    """
+    filas = (
+        movimientos.annotate(anio=ANIO_FISCAL, periodo=PERIODO_FISCAL, anio_fecha=ExtractYear('fecha'))
+        .values('cuenta_id', 'anio', 'periodo', 'anio_fecha')
+        .annotate(deb=Sum('debito'), cre=Sum('credito'))
+        .order_by()
+    )
+    deltas = defaultdict(lambda: [CERO, CERO])
+    anios = set()
+    for x in filas:
+        d = deltas[(x['cuenta_id'], x['anio'], x['periodo'])]
+        d[0] -= x['deb'] or CERO
+        d[1] -= x['cre'] or CERO
+        anios.add(x['anio'])
+        if x['anio_fecha']:
+            anios.add(x['anio_fecha'])
+    if not anios:
+        return
+    aplicar_deltas({k: d for k, d in deltas.items() if any(d)})
+    cache_reportes.incrementar_version(cache_reportes.LIBRO, *anios)
+
+
+def reubicar_movimientos(asiento, movimientos):
+    """
+    Copia los campos de `asiento` en `movimientos` (los desactualizados) y, si
+    cambian el año/período o la fecha, mueve sus sumas en el resumen.
+    """
+    campos = asiento.campos_movimiento()
+    anteriores = list(
+        movimientos.exclude(fiscal_year=asiento.fiscal_year, fiscal_period=asiento.fiscal_period, fecha=asiento.fecha)
+        .values('cuenta_id', 'fiscal_year', 'fiscal_period', 'fecha')
+        .annotate(deb=Sum('debito'), cre=Sum('credito'))
+        .order_by()
+    )
+    if not movimientos.update(**campos):
+        return
+    deltas = defaultdict(lambda: [CERO, CERO])
+    anios = {asiento.fiscal_year, asiento.fecha.year}
+    for x in anteriores:
+        viejo = deltas[(x['cuenta_id'], x['fiscal_year'], x['fiscal_period'])]
+        nuevo = deltas[(x['cuenta_id'], asiento.fiscal_year, asiento.fiscal_period)]
+        viejo[0] -= x['deb']
+        viejo[1] -= x['cre']
+        nuevo[0] += x['deb']
+        nuevo[1] += x['cre']
+        anios.add(x['fiscal_year'])
+        if x['fecha']:
+            anios.add(x['fecha'].year)
+    aplicar_deltas({k: d for k, d in deltas.items() if any(d)})
+    cache_reportes.incrementar_version(cache_reportes.LIBRO, *anios)
+
+
+@transaction.atomic
+def reconstruir():
+    """Borra el resumen y lo recalcula desde MovimientoContable. Devuelve las filas creadas."""
+    SaldoCuentaPeriodo.objects.all().delete()
+    agregados = (
+        MovimientoContable.objects
+        .annotate(anio=ANIO_FISCAL, periodo=PERIODO_FISCAL)
+        .values('cuenta_id', 'anio', 'periodo')
+        .annotate(deb=Sum('debito'), cre=Sum('credito'))
+        .order_by()
+    )
+    lote, total = [], 0
+    for x in agregados.iterator():
+        lote.append(SaldoCuentaPeriodo(
+            cuenta_id=x['cuenta_id'],
+            fiscal_year=x['anio'],
+            fiscal_period=x['periodo'],
+            debito=x['deb'] or CERO,
+            credito=x['cre'] or CERO,
+        ))
+        if len(lote) >= LOTE:
+            SaldoCuentaPeriodo.objects.bulk_create(lote)
+            total += len(lote)
+            lote = []
+    if lote:
+        SaldoCuentaPeriodo.objects.bulk_create(lote)
+        total += len(lote)
+    return total
+
+
+# --- Saldos de cierre ---
+
+def fin_de_anio(anio):
+    return date(anio, 12, 31)
+
+
+# --- Fecha contable ---
+# Regla única de todos los saldos (resumen, fotos de cierre y rangos por día):
+# un movimiento cuenta en su fecha, salvo el Mes 13 (ajustes de cierre), que
+# cuenta el 31/12 de su año fiscal aunque se registre en la ventana de ajustes.
+
+MES_13 = 13
+
+
+def fecha_contable(fecha, fiscal_year, fiscal_period):
+    return fin_de_anio(fiscal_year) if fiscal_period == MES_13 else fecha
+
+
+def contable_antes(fi):
+    """Movimientos con fecha contable anterior a `fi`."""
+    return (Q(fecha__lt=fi) & ~Q(fiscal_period=MES_13)) | Q(fiscal_period=MES_13, fiscal_year__lt=fi.year)
+
+
+def contable_desde(fi):
+    """Movimientos con fecha contable desde `fi` (inclusive)."""
+    return (Q(fecha__gte=fi) & ~Q(fiscal_period=MES_13)) | Q(fiscal_period=MES_13, fiscal_year__gte=fi.year)
+
+
+def contable_hasta(ff):
+    """Movimientos con fecha contable hasta `ff` (inclusive)."""
+    anio = ff.year if (ff.month, ff.day) == (12, 31) else ff.year - 1
+    return (Q(fecha__lte=ff) & ~Q(fiscal_period=MES_13)) | Q(fiscal_period=MES_13, fiscal_year__lte=anio)
+
+
+def ultimo_cierre(fecha):
+    """Año de la última foto de cierre que termina antes de `fecha` (None si no hay)."""
+    if not fecha:
+        return None
+    return SaldoCierre.objects.filter(anio__lt=fecha.year).aggregate(a=Max('anio'))['a']
+
+
+def ultimo_anio_cerrado():
+    """Año más reciente con foto de cierre (None si no hay)."""
+    return SaldoCierre.objects.aggregate(a=Max('anio'))['a']
+
+
+def fecha_con_cierre(fecha):
+    """
+    True si la fecha contable `fecha` cae en o antes del último año con foto
+    de cierre: un movimiento con esa fecha cambiaría saldos ya fotografiados.
+    """
+    cerrado = ultimo_anio_cerrado()
+    return cerrado is not None and fecha <= fin_de_anio(cerrado)
+
+
+@transaction.atomic
+def generar_cierre(anio):
+    """
+    Escribe la foto de saldos netos al 31/12 de `anio` (parte de la foto
+    anterior, así que solo recorre un año de movimientos). Devuelve las filas.
+    """
+    SaldoCierre.objects.filter(anio=anio).delete()
+    netos = saldos_iniciales(date(anio + 1, 1, 1))
+    filas = [SaldoCierre(anio=anio, cuenta_id=c, saldo=s) for c, s in netos.items() if s]
+    SaldoCierre.objects.bulk_create(filas, batch_size=LOTE)
+    return len(filas)
+
+
+def descartar_cierres(desde_anio):
+    SaldoCierre.objects.filter(anio__gte=desde_anio).delete()
+
+
+def _desde_cierre(qs, fecha):
+    """
+    Acota `qs` (movimientos) a lo posterior a la última foto antes de `fecha`.
+    Devuelve (qs, fotos) con fotos=None si no hay cierre aplicable.
+    """
+    anio = ultimo_cierre(fecha)
+    if anio is None:
+        return qs, None
+    return qs.filter(contable_desde(date(anio + 1, 1, 1))), SaldoCierre.objects.filter(anio=anio)
+
+
+# --- Lectura ---
+
+def rango_alineado(fi, ff):
+    """True si el rango empieza el día 1 y termina el último día de un mes (o es abierto)."""
+    if fi and fi.day != 1:
+        return False
+    if ff and ff.day != calendar.monthrange(ff.year, ff.month)[1]:
+        return False
+    return True
+
+
+def _periodo_hasta(ff):
+    # El Mes 13 (ajustes de cierre) va después de diciembre del mismo año fiscal.
+    return 13 if ff.month == 12 else ff.month
+
+
+def _agrupar(qs, nivel):
+    """
+    Devuelve (qs, campo) para agrupar por la cuenta o, si se pide `nivel`, por su
+    ancestro de ese nivel (tabla de clausura CuentaAncestro). Las cuentas más
+    cortas que el nivel pedido se reportan a su propio nivel.
+    """
+    if not nivel:
+        return qs, 'cuenta_id'
+    qs = qs.filter(
+        Q(cuenta__ancestros__nivel_ancestro=nivel)
+        | Q(cuenta__ancestros__distancia=0, cuenta__ancestros__nivel_ancestro__lt=nivel)
+    )
+    return qs, 'cuenta__ancestros__ancestro_id'
+
+
+def resumen_antes(fi):
+    return Q(fiscal_year__lt=fi.year) | Q(fiscal_year=fi.year, fiscal_period__lt=fi.month)
+
+
+def resumen_hasta(ff):
+    return Q(fiscal_year__lt=ff.year) | Q(fiscal_year=ff.year, fiscal_period__lte=_periodo_hasta(ff))
+
+
+def saldos_por_rango(fi, ff, nivel=None):
+    """
+    Devuelve {codigo: (saldo_inicial, débitos, créditos)} en una sola consulta
+    agrupada, por cuenta o por ancestro del `nivel` PUC indicado (1, 2, 4, 6).
+
+    Si el rango cubre meses completos se lee la tabla resumen y los meses se
+    interpretan como períodos fiscales (el Mes 13 queda dentro de diciembre).
+    En otro caso se agregan los movimientos por su fecha contable (el Mes 13
+    también al 31/12), partiendo de la última foto de cierre anterior a `fi`.
+    """
+    fotos = None
+    if rango_alineado(fi, ff):
+        qs = SaldoCuentaPeriodo.objects.all()
+        antes = resumen_antes(fi) if fi else None
+        if ff:
+            qs = qs.filter(resumen_hasta(ff))
+    else:
+        qs = MovimientoContable.objects.all()
+        antes = contable_antes(fi) if fi else None
+        if ff:
+            qs = qs.filter(contable_hasta(ff))
+        if fi:
+            qs, fotos = _desde_cierre(qs, fi)
+
+    qs, campo = _agrupar(qs, nivel)
+    if antes is None:
+        filas = qs.values(campo).annotate(
+            deb=Sum('debito'), cre=Sum('credito'),
+        ).order_by()
+    else:
+        filas = qs.values(campo).annotate(
+            deb_ini=Sum('debito', filter=antes), cre_ini=Sum('credito', filter=antes),
+            deb=Sum('debito', filter=~antes), cre=Sum('credito', filter=~antes),
+        ).order_by()
+
+    resultado = {
+        x[campo]: (
+            (x.get('deb_ini') or CERO) - (x.get('cre_ini') or CERO),
+            x['deb'] or CERO,
+            x['cre'] or CERO,
+        )
+        for x in filas
+    }
+    if fotos is not None:
+        fotos, campo = _agrupar(fotos, nivel)
+        for x in fotos.values(campo).annotate(s=Sum('saldo')).order_by():
+            ini, deb, cre = resultado.get(x[campo], (CERO, CERO, CERO))
+            resultado[x[campo]] = (ini + x['s'], deb, cre)
+    return resultado
+
+
+# --- Auxiliar por tercero ---
+
+TERCERO_CAMPOS = (
+    'cuenta_id', 'cuenta__nombre', 'tercero__tipo_documento', 'tercero__numero_documento',
+    'tercero__nombre_razon_social',
+)
+TERCERO_SALDOS = ('saldo_inicial', 'debitos', 'creditos', 'saldo_final')
+
+
+def _por_tercero(prefijo, fi, ff):
+    """Movimientos del prefijo hasta `ff` y las sumas (inicial, débitos, créditos, final)."""
+    qs = MovimientoContable.objects.all()
+    if prefijo:
+        qs = qs.filter(cuenta__codigo__startswith=prefijo)
+    if ff:
+        qs = qs.filter(contable_hasta(ff))
+    cero = Value(CERO, output_field=MONTO)
+    if fi:
+        antes = contable_antes(fi)
+        sumas = {
+            'saldo_inicial': Coalesce(Sum(NETO, filter=antes), cero),
+            'debitos': Coalesce(Sum('debito', filter=~antes), cero),
+            'creditos': Coalesce(Sum('credito', filter=~antes), cero),
+        }
+    else:
+        sumas = {
+            'saldo_inicial': cero,
+            'debitos': Coalesce(Sum('debito'), cero),
+            'creditos': Coalesce(Sum('credito'), cero),
+        }
+    return qs, sumas
+
+
+def saldos_por_tercero(prefijo=None, fi=None, ff=None):
+    """
+    Balance por cuenta × tercero de las cuentas que empiezan por `prefijo`:
+    tuplas TERCERO_CAMPOS + TERCERO_SALDOS ordenadas por cuenta y documento.
+
+    Es un queryset perezoso (se puede recorrer con .iterator()). Las fotos de
+    cierre no guardan el tercero, así que el saldo inicial suma los movimientos
+    anteriores a `fi`; el índice (cuenta, tercero, fecha) acota la lectura.
+    """
+    qs, sumas = _por_tercero(prefijo, fi, ff)
+    return (
+        qs.values(*TERCERO_CAMPOS)
+        .annotate(**sumas)
+        .annotate(saldo_final=ExpressionWrapper(
+            F('saldo_inicial') + F('debitos') - F('creditos'), output_field=MONTO,
+        ))
+        .exclude(saldo_inicial=0, debitos=0, creditos=0)
+        .order_by('cuenta_id', 'tercero__numero_documento')
+        .values_list(*TERCERO_CAMPOS, *TERCERO_SALDOS)
+    )
+
+
+def totales_por_tercero(prefijo=None, fi=None, ff=None):
+    """Totales del balance por tercero en una sola consulta sin agrupar."""
+    qs, sumas = _por_tercero(prefijo, fi, ff)
+    t = dict.fromkeys(sumas, CERO)
+    t.update(qs.aggregate(**{k: v for k, v in sumas.items() if v.contains_aggregate}))
+    t['saldo_final'] = t['saldo_inicial'] + t['debitos'] - t['creditos']
+    return t
+
+
+# --- Saldos acumulados en SQL (Libro Mayor) ---
+
+def saldos_iniciales(fecha, cuentas=None):
+    """
+    {cuenta_id: saldo neto antes de `fecha`}: la última foto de cierre más una
+    consulta agrupada de los movimientos posteriores.
+    `cuentas` es un Q opcional sobre la cuenta (vale para movimientos y fotos).
+    """
+    if not fecha:
+        return {}
+    qs, fotos = _desde_cierre(MovimientoContable.objects.filter(contable_antes(fecha)), fecha)
+    resultado = {}
+    if fotos is not None:
+        if cuentas is not None:
+            fotos = fotos.filter(cuentas)
+        resultado = dict(fotos.values_list('cuenta_id', 'saldo'))
+    if cuentas is not None:
+        qs = qs.filter(cuentas)
+    for x in qs.values('cuenta_id').annotate(s=Sum(NETO)).order_by():
+        resultado[x['cuenta_id']] = resultado.get(x['cuenta_id'], CERO) + (x['s'] or CERO)
+    return resultado
+
+
+def saldo_anterior(cuenta, fecha):
+    """
+    Subconsulta escalar con el saldo neto de `cuenta` antes de `fecha`: foto de
+    cierre + movimientos posteriores. No depende de la fila externa, así que la
+    base de datos la evalúa una vez.
+    """
+    if not fecha:
+        return Value(CERO, output_field=MONTO)
+    qs, fotos = _desde_cierre(MovimientoContable.objects.filter(contable_antes(fecha), cuenta=cuenta), fecha)
+    previo = qs.order_by().values('cuenta').annotate(s=Sum(NETO)).values('s')
+    saldo = Coalesce(Subquery(previo, output_field=MONTO), Value(CERO), output_field=MONTO)
+    if fotos is None:
+        return saldo
+    foto = fotos.filter(cuenta=cuenta).values('saldo')
+    return ExpressionWrapper(
+        Coalesce(Subquery(foto, output_field=MONTO), Value(CERO), output_field=MONTO) + saldo,
+        output_field=MONTO,
+    )
+
+
+def con_saldo_acumulado(qs, saldo_inicial, orden, particion=None):
+    """
+    Anota `saldo_inicial` y `saldo` (saldo_inicial + suma acumulada de débito-crédito
+    en `orden`) con una función de ventana. Python solo recorre las filas.
+    """
+    return qs.annotate(
+        saldo_inicial=saldo_inicial,
+        saldo=ExpressionWrapper(
+            F('saldo_inicial') + Window(
+                Sum(NETO), partition_by=particion, order_by=list(orden),
+                frame=RowRange(start=None, end=0),
+            ),
+            output_field=MONTO,
+        ),
+    )
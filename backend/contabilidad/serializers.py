@@ -3,9 +3,10 @@ from decimal import Decimal, ROUND_HALF_UP
 from django.db import transaction
 from django.utils import timezone
 from rest_framework import serializers
-from .models import Cuenta, AsientoContable, MovimientoContable, PeriodoContable
+from .models import Cuenta, AsientoContable, MovimientoContable, PeriodoContable, resumen_diferido
 from terceros.models import Tercero 
 from datetime import date
+from . import cache_reportes, saldos
 
 
 TWOPLACES = Decimal("0.01")
@@ -23,6 +24,9 @@ class CuentaSerializer(serializers.ModelSerializer):
 
 # --- Movimientos ---
 class MovimientoContableSerializer(serializers.ModelSerializer):
+    # La PK de Cuenta es el código: se lee tal cual y su existencia se valida
+    # en lote en AsientoContableSerializer (una consulta por asiento, no por línea)
+    cuenta = serializers.CharField(source="cuenta_id", required=False)
     # Permite mandar código en lugar de FK de cuenta
     cuenta_codigo = serializers.CharField(write_only=True, required=False)
 
@@ -30,13 +34,10 @@ class MovimientoContableSerializer(serializers.ModelSerializer):
         model = MovimientoContable
         fields = ["id", "cuenta", "cuenta_codigo", "debito", "credito"]
         read_only_fields = ["id"]
-        extra_kwargs = {
-            "cuenta": {"required": False},  # porque podemos usar cuenta_codigo
-        }
 
     def validate(self, attrs):
         # cuenta por id o por código
-        if not attrs.get("cuenta") and not attrs.get("cuenta_codigo"):
+        if not attrs.get("cuenta_id") and not attrs.get("cuenta_codigo"):
             raise serializers.ValidationError("Debe enviar 'cuenta' (id) o 'cuenta_codigo' (código).")
 
         # normalizar a 2 decimales y validar exclusión
@@ -51,12 +52,11 @@ class MovimientoContableSerializer(serializers.ModelSerializer):
         return attrs
 
     def _resolve_cuenta(self, attrs):
+        # Uso suelto (fuera de un asiento): valida la cuenta de esta línea
         code = attrs.pop("cuenta_codigo", None)
-        if code and not attrs.get("cuenta"):
-            try:
-                attrs["cuenta"] = Cuenta.objects.get(codigo=code)
-            except Cuenta.DoesNotExist:
-                raise serializers.ValidationError({"cuenta_codigo": f"No existe la cuenta con código '{code}'."})
+        attrs["cuenta_id"] = attrs.get("cuenta_id") or code
+        if not Cuenta.objects.filter(codigo=attrs["cuenta_id"]).exists():
+            raise serializers.ValidationError({"cuenta_codigo": f"No existe la cuenta con código '{attrs['cuenta_id']}'."})
         return attrs
 
     def create(self, validated_data):
@@ -107,7 +107,7 @@ class AsientoContableSerializer(serializers.ModelSerializer):
             for i, m in enumerate(movs_in, start=1):
                 get = m.get if isinstance(m, dict) else lambda k, d=None: getattr(m, k, d)
                 code = get("cuenta_codigo")
-                cuenta = get("cuenta")
+                cuenta = get("cuenta_id") or get("cuenta")
                 if not cuenta and not code:
                     fila_errores.append(f"Fila {i}: falta 'cuenta' o 'cuenta_codigo'.")
                 # (si quieres validar existencia de code aquí, mantén tu lógica)
@@ -116,6 +116,7 @@ class AsientoContableSerializer(serializers.ModelSerializer):
                 if deb <= 0 and cre <= 0: fila_errores.append(f"Fila {i}: debe tener valor en Débito o en Crédito.")
                 if deb > 0 and cre > 0:   fila_errores.append(f"Fila {i}: no puede tener Débito y Crédito a la vez.")
                 total_deb += deb; total_cre += cre
+            fila_errores += self._resolver_cuentas(attrs.get("movimientos"))
             if fila_errores: errors["movimientos"] = fila_errores
             if total_deb.quantize(TWOPLACES) != total_cre.quantize(TWOPLACES):
                 errors.setdefault("movimientos", []).append("El asiento no cuadra (∑débitos ≠ ∑créditos).")
@@ -126,7 +127,7 @@ class AsientoContableSerializer(serializers.ModelSerializer):
         # --- Validación de PERÍODO CONTABLE / Mes 13
         fy = attrs.get("fiscal_year")   or (fecha.year if fecha else None)
         fp = attrs.get("fiscal_period") or (fecha.month if fecha else None)
-        p = PeriodoContable.ensure(fy)
+        p = PeriodoContable.leer(fy)
 
         if fp == 13:
             if not p.habilitar_mes13:
@@ -137,29 +138,80 @@ class AsientoContableSerializer(serializers.ModelSerializer):
         else:
             if p.estado == 'cerrado':
                 raise serializers.ValidationError(f"Período {fy} cerrado. Use Mes 13 durante la ventana de ajustes.")
+            # Fuera del Mes 13 la posición fiscal es la de la fecha (saldos.fecha_contable)
+            if (fy, fp) != (fecha.year, fecha.month):
+                raise serializers.ValidationError("El año y período fiscal deben corresponder a la fecha (salvo Mes 13).")
+
+        # La foto de cierre (SaldoCierre) se calcula por fecha contable: ningún
+        # asiento puede entrar ni salir de un año ya fotografiado
+        contables = [saldos.fecha_contable(fecha, fy, fp)]
+        if self.instance is not None:
+            i = self.instance
+            contables.append(saldos.fecha_contable(i.fecha, i.fiscal_year, i.fiscal_period))
+        primera = min(contables)
+        if saldos.fecha_con_cierre(primera):
+            raise serializers.ValidationError(
+                f"La fecha contable {primera} cae en un año con saldos de cierre. Reabra el período."
+            )
 
         attrs["fiscal_year"]   = fy
         attrs["fiscal_period"] = fp
         return attrs
 
+    @staticmethod
+    def _resolver_cuentas(movimientos):
+        """
+        Deja en cada línea validada solo `cuenta_id` y comprueba que todos los
+        códigos existan con una sola consulta IN. Devuelve los errores por fila.
+        """
+        if not movimientos:
+            return []
+        for m in movimientos:
+            code = m.pop("cuenta_codigo", None)
+            m["cuenta_id"] = m.get("cuenta_id") or code
+        existentes = set(
+            Cuenta.objects.filter(codigo__in={m["cuenta_id"] for m in movimientos})
+            .values_list("codigo", flat=True)
+        )
+        return [
+            f"Fila {i}: no existe la cuenta con código '{m['cuenta_id']}'."
+            for i, m in enumerate(movimientos, start=1)
+            if m["cuenta_id"] not in existentes
+        ]
+
+    @staticmethod
+    def _crear_movimientos(asiento, movimientos_data):
+        """Inserta las líneas con un solo bulk_create (copiando los campos del asiento)."""
+        copia = asiento.campos_movimiento()
+        return MovimientoContable.objects.bulk_create(
+            [MovimientoContable(asiento=asiento, **m, **copia) for m in movimientos_data],
+            batch_size=saldos.LOTE,
+        )
+
     @transaction.atomic
     def create(self, validated_data):
         movimientos_data = validated_data.pop("movimientos", [])
         asiento = AsientoContable.objects.create(**validated_data)
-        for m in movimientos_data:
-            m["asiento"] = asiento
-            MovimientoContableSerializer().create(m)
+        movs = self._crear_movimientos(asiento, movimientos_data)
+        saldos.registrar_movimientos(asiento, movs)
+        cache_reportes.incrementar_version_libro(asiento)
         return asiento
 
     @transaction.atomic
     def update(self, instance, validated_data):
         movimientos_data = validated_data.pop("movimientos", None)
-        for k, v in validated_data.items():
-            setattr(instance, k, v)
-        instance.save()
-        if movimientos_data is not None:
-            instance.movimientos.all().delete()
-            for m in movimientos_data:
-                m["asiento"] = instance
-                MovimientoContableSerializer().create(m)
+        # Resumen y versión en bloque (sin las señales por movimiento)
+        with resumen_diferido():
+            # Se descuenta lo anterior del resumen: el año/período pueden cambiar
+            anteriores = list(instance.movimientos.all())
+            saldos.registrar_movimientos(instance, anteriores, signo=-1)
+            cache_reportes.incrementar_version_libro(instance)
+            for k, v in validated_data.items():
+                setattr(instance, k, v)
+            instance.save()
+            if movimientos_data is not None:
+                instance.movimientos.all().delete()
+                anteriores = self._crear_movimientos(instance, movimientos_data)
+            saldos.registrar_movimientos(instance, anteriores)
+            cache_reportes.incrementar_version_libro(instance)
         return instance
\ No newline at end of file
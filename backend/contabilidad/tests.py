@@ -1,3 +1,907 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import tempfile
+import unittest
+import zipfile
+from unittest import mock
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+from pathlib import Path
+from xml.etree import ElementTree
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from openpyxl import load_workbook
+from rest_framework.test import APITestCase
+
+from terceros.models import Tercero
+
+from . import busqueda, cache_reportes, catalogo, exogena, exportadores, importacion, saldos
+from .models import (
+    _PERIODOS, AsientoContable, ConceptoExogena, Cuenta, CuentaAncestro, MovimientoContable, PeriodoContable,
+    SaldoCierre, SaldoCuentaPeriodo,
+)
+
+
+class PublicarAsientoConsultasTest(APITestCase):
+    """Publicar un asiento cuesta las mismas consultas sin importar cuántas líneas tenga."""
+
+    def setUp(self):
+        Cuenta.objects.bulk_create([Cuenta(codigo=f"5105{i:02d}", nombre=f"Gasto {i}") for i in range(50)])
+        Cuenta.objects.create(codigo="110505", nombre="Caja general")
+        self.tercero = Tercero.objects.create(tipo_documento="NIT", numero_documento="900", nombre_razon_social="ACME")
+        self.client.force_authenticate(User.objects.create_user("contador"))
+
+    def publicar(self, lineas):
+        movimientos = [
+            {"cuenta_codigo": f"5105{i % 50:02d}", "debito": "10.00", "credito": "0"}
+            for i in range(lineas)
+        ]
+        movimientos.append({"cuenta": "110505", "debito": "0", "credito": str(10 * lineas)})
+        datos = {
+            "fecha": "2026-03-15", "tercero": self.tercero.id, "concepto": "Nómina",
+            "movimientos": movimientos,
+        }
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.post("/api/contabilidad/asientos/", datos, format="json")
+        self.assertEqual(resp.status_code, 201, resp.data)
+        return len(ctx.captured_queries)
+
+    def test_consultas_constantes(self):
+        self.publicar(1)  # crea el contador de versión del año
+        pocas = self.publicar(2)
+        muchas = self.publicar(100)
+        self.assertEqual(pocas, muchas)
+        self.assertEqual(MovimientoContable.objects.count(), 2 + 3 + 101)
+
+    def test_cuenta_inexistente(self):
+        datos = {
+            "fecha": "2026-03-15", "tercero": self.tercero.id, "concepto": "x",
+            "movimientos": [
+                {"cuenta_codigo": "999999", "debito": "5", "credito": "0"},
+                {"cuenta": "110505", "debito": "0", "credito": "5"},
+            ],
+        }
+        resp = self.client.post("/api/contabilidad/asientos/", datos, format="json")
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn("999999", str(resp.data["movimientos"]))
+        self.assertFalse(MovimientoContable.objects.exists())
+
+
+try:
+    import pandas
+except ImportError:  # dependencia opcional de import_puc_excel
+    pandas = None
+
+
+@unittest.skipIf(pandas is None, "import_puc_excel necesita pandas y openpyxl")
+class ImportPucExcelTest(TestCase):
+    """El comando del README carga el PUC.xlsx del repositorio."""
+
+    def test_carga_puc_del_repositorio(self):
+        archivo = Path(settings.BASE_DIR) / "PUC.xlsx"
+        call_command("import_puc_excel", str(archivo), stdout=io.StringIO())
+
+        codigos = pandas.read_excel(archivo, dtype=str)["Código"].dropna().str.strip()
+        self.assertEqual(Cuenta.objects.count(), codigos.nunique())
+        caja = Cuenta.objects.get(codigo="110505")
+        self.assertEqual(caja.nombre, "CAJA GENERAL")
+        self.assertEqual(caja.padre_id, "1105")
+        self.assertEqual(Cuenta.objects.get(codigo="1105").padre_id, "11")
+
+
+
+class SaldosCierreTest(APITestCase):
+    """Los saldos que parten de la foto de cierre coinciden con sumar todos los movimientos."""
+
+    def setUp(self):
+        Cuenta.objects.create(codigo="110505", nombre="Caja general")
+        Cuenta.objects.create(codigo="413595", nombre="Ventas")
+        self.tercero = Tercero.objects.create(tipo_documento="NIT", numero_documento="900", nombre_razon_social="ACME")
+        self.client.force_authenticate(User.objects.create_user("contador"))
+        for fecha, valor in [(date(2024, 6, 30), 100), (date(2025, 3, 15), 40), (date(2025, 12, 31), 7), (date(2026, 2, 1), 5)]:
+            self.asiento(fecha, valor)
+
+    def asiento(self, fecha, valor, **fiscal):
+        a = AsientoContable.objects.create(fecha=fecha, tercero=self.tercero, concepto="Venta", **fiscal)
+        MovimientoContable.objects.create(asiento=a, cuenta_id="110505", debito=valor)
+        MovimientoContable.objects.create(asiento=a, cuenta_id="413595", credito=valor)
+
+    def ingenuo(self, desde, hasta=None):
+        """(saldo antes de `desde`, débitos, créditos del rango) sumando movimiento a movimiento."""
+        r = defaultdict(lambda: [Decimal("0")] * 3)
+        for m in MovimientoContable.objects.all():
+            # Fecha contable: el Mes 13 cuenta al 31/12 de su año fiscal
+            fecha = date(m.fiscal_year, 12, 31) if m.fiscal_period == 13 else m.fecha
+            if fecha < desde:
+                r[m.cuenta_id][0] += m.debito - m.credito
+            elif hasta is None or fecha <= hasta:
+                r[m.cuenta_id][1] += m.debito
+                r[m.cuenta_id][2] += m.credito
+        return r
+
+    def comprobar(self):
+        rangos = [
+            (date(2025, 6, 10), date(2026, 2, 20)), (date(2026, 1, 10), date(2026, 3, 5)),
+            (date(2025, 1, 1), date(2025, 12, 31)), (date(2025, 1, 2), date(2025, 12, 31)),
+            (date(2026, 1, 1), date(2026, 3, 31)),
+        ]
+        for desde, hasta in rangos:
+            esperado = self.ingenuo(desde, hasta)
+            self.assertEqual(
+                {c: s for c, s in saldos.saldos_iniciales(desde).items() if s},
+                {c: v[0] for c, v in esperado.items() if v[0]},
+            )
+            self.assertEqual(
+                {c: list(v) for c, v in saldos.saldos_por_rango(desde, hasta).items() if any(v)},
+                {c: v for c, v in esperado.items() if any(v)},
+            )
+
+    def cerrar(self, anio, estado="cerrado"):
+        p = PeriodoContable.ensure(anio)
+        p.estado = estado
+        p.save()
+
+    def test_cierre_reapertura_y_mes13(self):
+        self.comprobar()
+        # Ajuste de cierre: año fiscal 2025, Mes 13, fecha en la ventana de ajustes
+        self.asiento(date(2026, 1, 20), 3, fiscal_year=2025, fiscal_period=13)
+        self.comprobar()
+
+        self.cerrar(2024)
+        self.cerrar(2025)
+        self.assertEqual(SaldoCierre.objects.get(anio=2025, cuenta_id="110505").saldo, Decimal("150"))
+        self.comprobar()
+
+        self.cerrar(2025, "abierto")
+        self.assertFalse(SaldoCierre.objects.filter(anio=2025).exists())
+        self.asiento(date(2025, 11, 30), 11)
+        self.comprobar()
+        self.cerrar(2025)
+        self.assertEqual(SaldoCierre.objects.get(anio=2025, cuenta_id="110505").saldo, Decimal("161"))
+        self.comprobar()
+
+    def test_mismo_total_con_rango_por_meses_o_por_dias(self):
+        self.asiento(date(2026, 1, 20), 3, fiscal_year=2025, fiscal_period=13)
+        por_meses = saldos.saldos_por_rango(date(2025, 1, 1), date(2025, 12, 31))
+        por_dias = saldos.saldos_por_rango(date(2025, 1, 2), date(2025, 12, 31))
+        self.assertEqual(por_meses, por_dias)
+        self.assertEqual(por_meses["110505"], (Decimal("100"), Decimal("50"), Decimal("0")))
+
+    def enviar(self, fecha, **fiscal):
+        datos = {
+            "fecha": fecha, "tercero": self.tercero.id, "concepto": "Tardío", **fiscal,
+            "movimientos": [
+                {"cuenta": "110505", "debito": "9", "credito": "0"},
+                {"cuenta": "413595", "debito": "0", "credito": "9"},
+            ],
+        }
+        return self.client.post("/api/contabilidad/asientos/", datos, format="json")
+
+    def test_fecha_en_anio_cerrado(self):
+        self.cerrar(2025)
+        # Período fiscal distinto al de la fecha
+        self.assertEqual(self.enviar("2025-12-15", fiscal_year=2026, fiscal_period=1).status_code, 400)
+        # Mes 13 de un año ya fotografiado
+        self.assertEqual(self.enviar("2026-01-15", fiscal_year=2025, fiscal_period=13).status_code, 400)
+        resp = self.enviar("2026-01-15")
+        self.assertEqual(resp.status_code, 201, resp.data)
+
+    def test_consultar_periodo_no_lo_crea(self):
+        resp = self.client.get("/api/contabilidad/periodo/?anio=2030")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.data["estado"], "abierto")
+        self.assertEqual(resp.data["ajustes"]["fin"], "2031-03-31")
+        self.assertFalse(PeriodoContable.objects.filter(anio=2030).exists())
+
+
+class PeriodoCacheTest(TransactionTestCase):
+    """La caché de períodos solo guarda valores confirmados."""
+
+    def setUp(self):
+        self.addCleanup(_PERIODOS.clear)
+
+    def cerrar(self, anio):
+        p = PeriodoContable.ensure(anio)
+        p.estado = "cerrado"
+        p.save()
+
+    def test_rollback_y_commit(self):
+        self.assertEqual(PeriodoContable.obtener(2030).estado, "abierto")
+        self.assertIn(2030, _PERIODOS)
+
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            self.cerrar(2030)
+            self.assertEqual(PeriodoContable.obtener(2030).estado, "cerrado")
+            raise RuntimeError
+        self.assertEqual(PeriodoContable.obtener(2030).estado, "abierto")
+
+        with transaction.atomic():
+            self.cerrar(2030)
+            PeriodoContable.obtener(2030)
+            self.assertNotIn(2030, _PERIODOS)
+        self.assertEqual(PeriodoContable.obtener(2030).estado, "cerrado")
+
+
+class LibroMayorPaginadoTest(APITestCase):
+    """Recorrer el Libro Mayor por cursor da los mismos saldos que pedirlo completo."""
+
+    def setUp(self):
+        Cuenta.objects.create(codigo="110505", nombre="Caja general")
+        Cuenta.objects.create(codigo="413595", nombre="Ventas")
+        tercero = Tercero.objects.create(tipo_documento="NIT", numero_documento="900", nombre_razon_social="ACME")
+        self.client.force_authenticate(User.objects.create_user("contador"))
+        for i in range(11):
+            # varios asientos el mismo día: el cursor desempata por asiento e id
+            a = AsientoContable.objects.create(fecha=date(2026, 1, 1 + i // 3), tercero=tercero, concepto=f"Venta {i}")
+            MovimientoContable.objects.create(asiento=a, cuenta_id="110505", debito=10 + i)
+            MovimientoContable.objects.create(asiento=a, cuenta_id="110505", credito=i)
+            MovimientoContable.objects.create(asiento=a, cuenta_id="413595", credito=10)
+
+    def test_paginas_igual_a_completo(self):
+        url = "/api/contabilidad/reportes/libro-mayor/110505/?fecha_inicio=2026-01-02"
+        completo = self.client.get(url).data
+        paginas, movimientos = 0, []
+        siguiente = url + "&limite=4"
+        while siguiente:
+            pagina = self.client.get(siguiente).data
+            self.assertEqual(pagina["saldo_final"], pagina["movimientos"][-1]["saldo"])
+            esperado = completo["movimientos"][len(movimientos) + len(pagina["movimientos"]) - 1]
+            self.assertEqual(pagina["saldo_final"], esperado["saldo"])
+            movimientos += pagina["movimientos"]
+            siguiente = pagina.get("next")
+            paginas += 1
+        self.assertEqual(paginas, 4)
+        self.assertEqual(movimientos, completo["movimientos"])
+        self.assertNotEqual(completo["saldo_inicial"], 0)
+
+
+
+class ImportadorTest(TestCase):
+    """Importación masiva: los asientos válidos se escriben y los inválidos quedan en el informe."""
+
+    def setUp(self):
+        Cuenta.objects.create(codigo="110505", nombre="Caja general")
+        Cuenta.objects.create(codigo="413595", nombre="Ventas")
+        Tercero.objects.create(tipo_documento="NIT", numero_documento="900", nombre_razon_social="ACME")
+
+    def importar(self, texto, formato, lote=2):
+        registros = importacion.leer(io.BytesIO(texto.encode()), formato)
+        return importacion.Importador(lote=lote).importar(registros)
+
+    def resumen(self):
+        return set(SaldoCuentaPeriodo.objects.values_list("cuenta_id", "fiscal_year", "fiscal_period", "debito", "credito"))
+
+    def test_ndjson(self):
+        venta = (
+            '{"referencia": "%s", "fecha": "%s", "tercero": "900", "concepto": "Venta", "movimientos": ['
+            '{"cuenta_codigo": "110505", "debito": 100}, {"cuenta_codigo": "413595", "credito": 100}]}'
+        )
+        texto = "\n".join([
+            venta % ("V-1", "2026-01-31"),
+            "no es json",
+            venta % ("V-2", "15/02/2026"),
+            '{"referencia": "V-3", "fecha": "2026-02-01", "tercero": "900", "concepto": "x", "movimientos": 5}',
+            venta.replace("413595", "999999") % ("V-4", "2026-02-01"),
+            "",
+            venta % ("V-5", "2026-03-01"),
+        ])
+        informe = self.importar(texto, "ndjson")
+        self.assertEqual((informe["creados"], informe["movimientos"]), (3, 6))
+        self.assertEqual([e["fila"] for e in informe["errores"]], [2, 4, 5])
+        self.assertEqual(informe["errores"][1]["errores"], ["'movimientos' debe ser una lista."])
+        self.assertIn("999999", informe["errores"][2]["errores"][0])
+
+        resumen = self.resumen()
+        saldos.reconstruir()
+        self.assertEqual(resumen, self.resumen())
+
+    def test_csv(self):
+        texto = (
+            "referencia,fecha,tercero,concepto,cuenta_codigo,debito,credito\n"
+            "A,2026-04-10,900,Venta,110505,50,\n"
+            "A,2026-04-10,900,Venta,413595,,50\n"
+            "B,2026-04-11,900,Descuadre,110505,50,\n"
+            "B,2026-04-11,900,Descuadre,413595,,40\n"
+        )
+        informe = self.importar(texto, "csv")
+        self.assertEqual(informe["creados"], 1)
+        self.assertEqual(informe["errores"][0]["fila"], 4)
+        self.assertEqual(AsientoContable.objects.get().movimientos.count(), 2)
+
+    def test_periodo_y_concepto_fuera_de_rango(self):
+        largo = "x" * 501
+        texto = (
+            "referencia,fecha,tercero,concepto,fiscal_period,cuenta_codigo,debito,credito\n"
+            "A,2026-04-10,900,Venta,-1,110505,50,\nA,2026-04-10,900,Venta,-1,413595,,50\n"
+            "B,2026-04-10,900,Venta,14,110505,50,\nB,2026-04-10,900,Venta,14,413595,,50\n"
+            f"C,2026-04-10,900,{largo},,110505,50,\nC,2026-04-10,900,{largo},,413595,,50\n"
+            "D,2026-04-10,900,Venta,4,110505,50,\nD,2026-04-10,900,Venta,4,413595,,50\n"
+        )
+        informe = self.importar(texto, "csv", lote=10)
+        self.assertEqual(informe["creados"], 1)
+        self.assertEqual([e["referencia"] for e in informe["errores"]], ["A", "B", "C"])
+        self.assertIn("500", informe["errores"][2]["errores"][0])
+
+    def test_formato_invalido(self):
+        with self.assertRaises(importacion.ErrorFormato):
+            self.importar("x;y\n1;2\n", "csv")
+
+
+
+class CuantiasMenoresTest(TestCase):
+    """Formato 1001: los pagos bajo el tope van al 222222222 y los netos no positivos no se reportan."""
+
+    def setUp(self):
+        for codigo in ("510506", "519595", "110505"):
+            Cuenta.objects.create(codigo=codigo, nombre=codigo)
+        # Reintegros de otros gastos: saldo débito, puede quedar negativo
+        ConceptoExogena.objects.create(
+            formato="1001", concepto="5055", prefijo_cuenta="5195", columna="pago_deducible", calculo="saldo_debito",
+        )
+        self.terceros = [
+            Tercero.objects.create(tipo_documento="CC", numero_documento=str(10 + i), nombre_razon_social=f"T{i}")
+            for i in range(4)
+        ]
+
+    def pago(self, tercero, cuenta, debito=0, credito=0):
+        a = AsientoContable.objects.create(fecha=date(2025, 5, 10), tercero=tercero, concepto="Pago")
+        MovimientoContable.objects.create(asiento=a, cuenta_id=cuenta, debito=debito, credito=credito)
+        MovimientoContable.objects.create(asiento=a, cuenta_id="110505", debito=credito, credito=debito)
+
+    def test_tope_y_negativos(self):
+        a, b, c, d = self.terceros
+        self.pago(a, "510506", debito=50000)
+        self.pago(b, "510506", debito=30000)
+        self.pago(c, "510506", debito=250000)
+        self.pago(d, "519595", credito=70000)  # reintegro neto: no es un pago
+        self.pago(a, "519595", debito=20000)
+
+        ex = exogena.Exogena(2025, ["1001"])
+        registros = [(r["concepto"], r["numero_documento"], r["pago_deducible"]) for r in ex.registros("1001")]
+        self.assertEqual(registros, [
+            ("5001", "222222222", Decimal("80000")),
+            ("5001", c.numero_documento, Decimal("250000")),
+            ("5055", "222222222", Decimal("20000")),
+        ])
+        self.assertEqual(ex.totales("1001"), (3, Decimal("350000")))
+
+
+class ExogenaXmlTest(APITestCase):
+    """?salida=xml entrega un zip con los XML de la DIAN, partidos por cantidad de registros."""
+
+    def setUp(self):
+        for codigo in ("510506", "110505"):
+            Cuenta.objects.create(codigo=codigo, nombre=codigo)
+        for i in range(4):
+            t = Tercero.objects.create(tipo_documento="CC", numero_documento=str(10 + i), nombre_razon_social=f"T{i}")
+            a = AsientoContable.objects.create(fecha=date(2025, 5, 10), tercero=t, concepto="Pago")
+            MovimientoContable.objects.create(asiento=a, cuenta_id="510506", debito=100000 * (i + 1))
+            MovimientoContable.objects.create(asiento=a, cuenta_id="110505", credito=100000 * (i + 1))
+        self.client.force_authenticate(User.objects.create_user("contador"))
+
+    def leer(self, contenido):
+        with zipfile.ZipFile(io.BytesIO(contenido)) as zf:
+            return {nombre: ElementTree.fromstring(zf.read(nombre)) for nombre in zf.namelist()}
+
+    def cabecera(self, xml):
+        return int(xml.findtext("Cab/NumEnvio")), int(xml.findtext("Cab/CantReg")), int(xml.findtext("Cab/ValorTotal"))
+
+    def test_partido_por_archivo(self):
+        zip_ = io.BytesIO()
+        with zipfile.ZipFile(zip_, "w") as zf:
+            nombres = exogena.escribir_zip(zf, exogena.Exogena(2025, ["1001"]), ["1001"], envio=7, por_archivo=3)
+        self.assertEqual(nombres, [exogena.nombre_archivo("1001", 2025, 7), exogena.nombre_archivo("1001", 2025, 8)])
+
+        archivos = self.leer(zip_.getvalue())
+        primero, segundo = (archivos[n] for n in nombres)
+        self.assertEqual(self.cabecera(primero), (7, 3, 600000))
+        self.assertEqual(self.cabecera(segundo), (8, 1, 400000))
+        self.assertEqual([p.get("nid") for p in primero.iter("pagos")], ["10", "11", "12"])
+        pago, = segundo.iter("pagos")
+        self.assertEqual((pago.get("tdoc"), pago.get("nid"), pago.get("pago")), ("13", "13", "400000"))
+
+    def test_vista(self):
+        self.assertEqual(exogena.REGISTROS_POR_ARCHIVO, 5000)
+        resp = self.client.get("/api/contabilidad/reportes/medios-magneticos/1001/?year=2025&salida=xml&envio=3")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp["Content-Type"], exportadores.ZIP_CONTENT_TYPE)
+        archivos = self.leer(b"".join(resp.streaming_content))
+        self.assertEqual(list(archivos), [exogena.nombre_archivo("1001", 2025, 3)])
+        self.assertEqual(self.cabecera(*archivos.values()), (3, 4, 1000000))
+
+        resp = self.client.get("/api/contabilidad/reportes/medios-magneticos/1001/?year=2024&salida=xml")
+        self.assertEqual(resp.status_code, 404)
+
+
+class CacheReportesTest(APITestCase):
+    """Solo se cachean respuestas acotadas, contando las filas de todos los niveles."""
+
+    def setUp(self):
+        Cuenta.objects.create(codigo="110505", nombre="Caja general")
+        Cuenta.objects.create(codigo="110510", nombre="Caja menor")
+        tercero = Tercero.objects.create(tipo_documento="NIT", numero_documento="900", nombre_razon_social="ACME")
+        self.client.force_authenticate(User.objects.create_user("contador"))
+        cache_reportes._cache().clear()
+        for i in range(3):
+            a = AsientoContable.objects.create(fecha=date(2026, 1, 10 + i), tercero=tercero, concepto="Traslado")
+            MovimientoContable.objects.create(asiento=a, cuenta_id="110505", debito=10)
+            MovimientoContable.objects.create(asiento=a, cuenta_id="110510", credito=10)
+
+    def aciertos(self, url):
+        antes = cache_reportes.estadisticas()["aciertos"]
+        for _ in range(2):
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return cache_reportes.estadisticas()["aciertos"] - antes
+
+    def test_lote_grande_no_se_cachea(self):
+        url = "/api/contabilidad/reportes/libro-mayor/?prefijo=1105&fecha_fin=2026-12-31"
+        # 2 cuentas y 6 movimientos: el tope se mide en movimientos, no en cuentas
+        with mock.patch.object(cache_reportes, "FILAS_CACHE", 5):
+            self.assertEqual(self.aciertos(url), 0)
+        with mock.patch.object(cache_reportes, "FILAS_CACHE", 8):
+            self.assertEqual(self.aciertos(url), 1)
+
+
+
+class LibroTestCase(APITestCase):
+    """Base de los reportes: un PUC pequeño con su jerarquía, un tercero y un usuario."""
+
+    CUENTAS = {
+        "1": "Activo", "11": "Disponible", "1105": "Caja", "110505": "Caja general", "110510": "Caja menor",
+        "13": "Deudores", "1305": "Clientes", "130505": "Clientes nacionales",
+        "2": "Pasivo", "22": "Proveedores", "2205": "Nacionales",
+        "3": "Patrimonio", "31": "Capital", "3105": "Capital suscrito",
+        "4": "Ingresos", "41": "Operacionales", "4135": "Comercio", "42": "No operacionales", "4210": "Financieros",
+        "47": "Ajustes por inflación", "4705": "Corrección monetaria",
+        "5": "Gastos", "51": "Administración", "5105": "Personal", "54": "Impuesto de renta", "5405": "Renta",
+        "59": "Ganancias y pérdidas", "5905": "Ganancias y pérdidas",
+        "6": "Costos de venta", "61": "Costo de ventas", "6135": "Comercio",
+    }
+
+    def setUp(self):
+        Cuenta.objects.bulk_create([
+            Cuenta(codigo=c, nombre=n, padre_id=c[:{2: 1, 4: 2, 6: 4}.get(len(c), 0)] or None)
+            for c, n in sorted(self.CUENTAS.items(), key=lambda x: len(x[0]))
+        ])
+        catalogo.reconstruir_ancestros()
+        self.tercero = Tercero.objects.create(tipo_documento="NIT", numero_documento="900", nombre_razon_social="ACME")
+        self.client.force_authenticate(User.objects.create_user("contador"))
+        cache_reportes._cache().clear()
+
+    def asiento(self, fecha, *lineas, tercero=None, **campos):
+        """Asiento con `lineas` (cuenta, débito, crédito) creado por el ORM."""
+        a = AsientoContable.objects.create(fecha=fecha, tercero=tercero or self.tercero, concepto="Prueba", **campos)
+        for cuenta, debito, credito in lineas:
+            MovimientoContable.objects.create(asiento=a, cuenta_id=cuenta, debito=debito, credito=credito)
+        return a
+
+
+class EstadoResultadosTest(LibroTestCase):
+    """Las claves del estado van por clase PUC y la utilidad coincide con la del balance."""
+
+    def test_utilidad_igual_en_ambos_estados(self):
+        self.asiento(date(2026, 3, 1), ("110505", 1000, 0), ("4135", 0, 1000))
+        self.asiento(date(2026, 3, 2), ("110505", 50, 0), ("4210", 0, 30), ("4705", 0, 20))
+        self.asiento(date(2026, 3, 3), ("6135", 400, 0), ("5105", 100, 0), ("5405", 60, 0), ("5905", 10, 0), ("110505", 0, 570))
+
+        er = self.client.get("/api/contabilidad/reportes/estado-resultados/?fecha_fin=2026-12-31").data
+        self.assertEqual(er["ingresos_operacionales"], Decimal("1050"))
+        self.assertEqual(er["gastos_operacionales"], Decimal("170"))
+        self.assertEqual(er["utilidad_operacional"], Decimal("480"))
+        self.assertEqual(er["por_grupo"]["ingresos_operacionales"], Decimal("1000"))
+        self.assertEqual(er["por_grupo"]["otros_ingresos"], Decimal("20"))
+        self.assertEqual(er["por_grupo"]["otros_gastos"], Decimal("10"))
+
+        bg = self.client.get("/api/contabilidad/reportes/balance-general/?fecha_fin=2026-12-31").data
+        self.assertEqual(er["utilidad_neta"], bg["pasivos_y_patrimonio"]["utilidad_del_ejercicio"])
+        self.assertTrue(bg["verificacion_ecuacion_contable"]["balance_correcto"])
+
+
+class ResumenBorradoTest(LibroTestCase):
+    """Borrar asientos descuenta el resumen en bloque: las consultas no dependen de las líneas."""
+
+    def grande(self, lineas):
+        return self.asiento(date(2026, 8, 5), ("4135", 0, lineas), *[("110505", 1, 0)] * lineas)
+
+    def resumen(self):
+        return set(SaldoCuentaPeriodo.objects.exclude(debito=0, credito=0).values_list(
+            "cuenta_id", "fiscal_year", "fiscal_period", "debito", "credito",
+        ))
+
+    def borrar(self, lineas):
+        asiento = self.grande(lineas)
+        with CaptureQueriesContext(connection) as ctx:
+            asiento.delete()
+        return len(ctx.captured_queries)
+
+    def test_consultas_constantes(self):
+        self.asiento(date(2026, 8, 1), ("110505", 7, 0), ("4135", 0, 7))
+        self.assertEqual(self.borrar(3), self.borrar(60))
+        resumen = self.resumen()
+        self.assertEqual(resumen, {("110505", 2026, 8, Decimal("7"), 0), ("4135", 2026, 8, 0, Decimal("7"))})
+
+    def test_borrado_por_queryset(self):
+        self.grande(4)
+        self.grande(6)
+        AsientoContable.objects.filter(fecha=date(2026, 8, 5)).delete()
+        self.assertEqual(self.resumen(), set())
+
+
+class BalanceNivelTest(LibroTestCase):
+    """?nivel= consolida el balance de prueba en las cuentas de ese nivel del PUC."""
+
+    def balance(self, nivel):
+        url = f"/api/contabilidad/reportes/balance-pruebas/?fecha_inicio=2026-03-01&fecha_fin=2026-03-31&nivel={nivel}"
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        return {
+            f["codigo_cuenta"]: (f["saldo_inicial"], f["total_debito"], f["total_credito"], f["saldo_final"])
+            for f in resp.data["detalle"]
+        }
+
+    def test_nivel(self):
+        self.asiento(date(2026, 2, 10), ("110505", 40, 0), ("4135", 0, 40))
+        self.asiento(date(2026, 3, 5), ("110505", 100, 0), ("110510", 20, 0), ("4135", 0, 120))
+        self.asiento(date(2026, 3, 9), ("130505", 30, 0), ("110510", 0, 30))
+
+        self.assertEqual(self.balance(4), {
+            "1105": (Decimal("40"), Decimal("120"), Decimal("30"), Decimal("130")),
+            "1305": (0, Decimal("30"), 0, Decimal("30")),
+            "4135": (Decimal("-40"), 0, Decimal("120"), Decimal("-160")),
+        })
+        self.assertEqual(self.balance(1), {
+            "1": (Decimal("40"), Decimal("150"), Decimal("30"), Decimal("160")),
+            "4": (Decimal("-40"), 0, Decimal("120"), Decimal("-160")),
+        })
+
+    def test_nivel_invalido(self):
+        resp = self.client.get("/api/contabilidad/reportes/balance-pruebas/?nivel=3")
+        self.assertEqual(resp.status_code, 400)
+
+
+class LibroDiarioStreamTest(LibroTestCase):
+    """?stream=ndjson y ?formato=csv escriben las mismas filas del libro diario por bloques."""
+
+    URL = "/api/contabilidad/reportes/libro-diario/?fecha_inicio=2026-03-01&fecha_fin=2026-03-31"
+
+    def setUp(self):
+        super().setUp()
+        self.asiento(date(2026, 2, 28), ("110505", 1, 0), ("4135", 0, 1))
+        self.asiento(date(2026, 3, 5), ("110505", 100, 0), ("4135", 0, 100))
+        self.asiento(date(2026, 3, 9), ("5105", 30, 0), ("110505", 0, 30))
+
+    def leer(self, params):
+        resp = self.client.get(self.URL + params)
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.streaming)
+        return resp, b"".join(resp.streaming_content).decode("utf-8")
+
+    def test_ndjson(self):
+        resp, texto = self.leer("&stream=ndjson")
+        self.assertEqual(resp["Content-Type"], "application/x-ndjson")
+        filas = [json.loads(linea) for linea in texto.splitlines()]
+        self.assertEqual(len(filas), 4)
+        self.assertEqual(filas[0], {
+            "fecha": "2026-03-05", "asiento_id": filas[0]["asiento_id"], "tercero": "ACME",
+            "codigo_cuenta": "110505", "nombre_cuenta": "Caja general", "concepto": "Prueba",
+            "debito": "100.00", "credito": "0.00",
+        })
+        self.assertEqual([f["codigo_cuenta"] for f in filas], ["110505", "4135", "5105", "110505"])
+
+    def test_csv(self):
+        resp, texto = self.leer("&formato=csv")
+        self.assertIn("libro_diario.csv", resp["Content-Disposition"])
+        self.assertTrue(texto.startswith("\ufeff"))
+        filas = list(csv.reader(io.StringIO(texto.lstrip("\ufeff"))))
+        self.assertEqual(filas[0], ["fecha", "asiento_id", "tercero", "codigo_cuenta", "nombre_cuenta", "concepto", "debito", "credito"])
+        self.assertEqual(len(filas), 5)
+        self.assertEqual(filas[-1][3:], ["110505", "Caja general", "Prueba", "0.00", "30.00"])
+
+
+class LibroMayorLoteTest(LibroTestCase):
+    """El libro mayor por lote trae saldo inicial, movimientos y saldo corrido de cada cuenta."""
+
+    def setUp(self):
+        super().setUp()
+        self.asiento(date(2026, 2, 10), ("110505", 40, 0), ("4135", 0, 40))
+        self.asiento(date(2026, 3, 5), ("110505", 100, 0), ("110510", 20, 0), ("4135", 0, 120))
+        self.asiento(date(2026, 3, 9), ("130505", 30, 0), ("110505", 0, 30))
+
+    def mayor(self, params):
+        resp = self.client.get(f"/api/contabilidad/reportes/libro-mayor/?fecha_inicio=2026-03-01&{params}")
+        self.assertEqual(resp.status_code, 200)
+        return {
+            c["cuenta"]["codigo"]: (c["saldo_inicial"], [m["saldo"] for m in c["movimientos"]], c["saldo_final"])
+            for c in resp.data["cuentas"]
+        }
+
+    def test_prefijo(self):
+        self.assertEqual(self.mayor("prefijo=11"), {
+            "110505": (Decimal("40"), [Decimal("140"), Decimal("110")], Decimal("110")),
+            "110510": (0, [Decimal("20")], Decimal("20")),
+        })
+
+    def test_lista_de_cuentas(self):
+        self.assertEqual(self.mayor("cuentas=130505,4135"), {
+            "130505": (0, [Decimal("30")], Decimal("30")),
+            "4135": (Decimal("-40"), [Decimal("-160")], Decimal("-160")),
+        })
+
+    def test_sin_cuentas(self):
+        self.assertEqual(self.client.get("/api/contabilidad/reportes/libro-mayor/").status_code, 400)
+
+
+class SerieMensualTest(LibroTestCase):
+    """?serie=mensual arma una columna por mes del año, con el Mes 13 si el período lo habilita."""
+
+    def setUp(self):
+        super().setUp()
+        self.asiento(date(2025, 6, 1), ("110505", 500, 0), ("3105", 0, 500))
+        self.asiento(date(2025, 7, 1), ("110505", 70, 0), ("4135", 0, 70))
+        self.asiento(date(2026, 1, 10), ("110505", 100, 0), ("4135", 0, 100))
+        self.asiento(date(2026, 3, 10), ("110505", 50, 0), ("4135", 0, 50))
+        self.asiento(date(2027, 1, 15), ("5105", 10, 0), ("110505", 0, 10), fiscal_year=2026, fiscal_period=13)
+
+    def serie(self, reporte, anio="2026"):
+        resp = self.client.get(f"/api/contabilidad/reportes/{reporte}/?serie=mensual&anio={anio}")
+        self.assertEqual(resp.status_code, 200)
+        return {c["periodo"]: c for c in resp.data["columnas"]}
+
+    def test_estado_resultados(self):
+        columnas = self.serie("estado-resultados")
+        self.assertEqual(list(columnas), list(range(1, 14)))
+        self.assertEqual(columnas[13]["etiqueta"], "Mes 13 (Ajustes de cierre)")
+        self.assertEqual(
+            [(c["mes"]["utilidad_neta"], c["acumulado"]["utilidad_neta"]) for p, c in columnas.items() if p in (1, 2, 3, 13)],
+            [(Decimal("100"), Decimal("100")), (0, Decimal("100")), (Decimal("50"), Decimal("150")),
+             (Decimal("-10"), Decimal("140"))],
+        )
+
+    def test_balance_general(self):
+        columnas = self.serie("balance-general")
+        self.assertEqual(columnas[1]["activos"], Decimal("670"))
+        self.assertEqual(columnas[12]["activos"], Decimal("720"))
+        self.assertEqual(columnas[13]["activos"], Decimal("710"))
+        self.assertEqual(columnas[13]["utilidad_del_ejercicio"], Decimal("210"))
+        self.assertTrue(all(c["ecuacion_ok"] for c in columnas.values()))
+
+    def test_sin_mes13(self):
+        p = PeriodoContable.ensure(2026)
+        p.habilitar_mes13 = False
+        p.save()
+        self.assertEqual(list(self.serie("estado-resultados")), list(range(1, 13)))
+
+    def test_sin_anio(self):
+        resp = self.client.get("/api/contabilidad/reportes/balance-general/?serie=mensual")
+        self.assertEqual(resp.status_code, 400)
+
+
+class ExportarXlsxTest(LibroTestCase):
+    """?formato=xlsx escribe el título, los encabezados, las filas y los totales del reporte."""
+
+    def libro(self, url):
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp["Content-Type"], exportadores.XLSX_CONTENT_TYPE)
+        wb = load_workbook(io.BytesIO(b"".join(resp.streaming_content)), read_only=True)
+        return [list(fila) for fila in wb.active.iter_rows(values_only=True)]
+
+    def test_balance_pruebas(self):
+        self.asiento(date(2026, 3, 5), ("110505", 100, 0), ("4135", 0, 100))
+        filas = self.libro("/api/contabilidad/reportes/balance-pruebas/?fecha_fin=2026-03-31&formato=xlsx")
+        self.assertEqual(filas[0][0], "NOMBRE DE LA EMPRESA + NIT")
+        self.assertEqual(filas[2], ["Cuenta", "Nombre Cuenta contable", "Saldo inicial", "Débitos", "Créditos", "Saldo final"])
+        self.assertEqual(filas[3:], [
+            ["110505", "Caja general", 0, 100, 0, 100],
+            ["4135", "Comercio", 0, 0, 100, -100],
+            [None, "TOTAL", 0, 100, 100, 0],
+        ])
+
+    def test_libro_diario(self):
+        self.asiento(date(2026, 3, 5), ("110505", 100, 0), ("4135", 0, 100))
+        filas = self.libro("/api/contabilidad/reportes/libro-diario/?formato=xlsx")
+        self.assertEqual(len(filas), 5)
+        self.assertEqual(filas[3][2:], ["ACME", "110505", "Caja general", "Prueba", 100, 0])
+
+
+class GetCondicionalTest(LibroTestCase):
+    """Con If-None-Match y la misma versión de datos se responde 304 sin recalcular."""
+
+    def revalidar(self, url, etag):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        return resp, len(ctx.captured_queries)
+
+    def test_reporte(self):
+        url = "/api/contabilidad/reportes/balance-pruebas/?fecha_fin=2026-03-31"
+        self.asiento(date(2026, 3, 5), ("110505", 100, 0), ("4135", 0, 100))
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        etag = resp["ETag"]
+        self.assertIn("no-cache", resp["Cache-Control"])
+
+        resp, consultas = self.revalidar(url, etag)
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(resp["ETag"], etag)
+        self.assertEqual(consultas, 1)
+
+        self.asiento(date(2026, 3, 6), ("110505", 5, 0), ("4135", 0, 5))
+        resp, _ = self.revalidar(url, etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(resp["ETag"], etag)
+
+    def test_catalogo(self):
+        url = "/api/contabilidad/cuentas/"
+        etag = self.client.get(url)["ETag"]
+        resp, consultas = self.revalidar(url, etag)
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(consultas, 1)
+
+        Cuenta.objects.create(codigo="110515", nombre="Caja de ahorro", padre_id="1105")
+        catalogo.reconstruir_ancestros()
+        resp, _ = self.revalidar(url, etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn("110515", [c["codigo"] for c in resp.data])
+
+
+class MovimientoDesnormalizadoTest(LibroTestCase):
+    """Los movimientos copian fecha, período, estado y tercero del asiento y los siguen al cambiar."""
+
+    def campos(self, asiento):
+        return set(asiento.movimientos.values_list("fecha", "fiscal_year", "fiscal_period", "estado", "tercero_id"))
+
+    def balance(self, desde, hasta):
+        url = f"/api/contabilidad/reportes/balance-pruebas/?fecha_inicio={desde}&fecha_fin={hasta}"
+        return {f["codigo_cuenta"]: f["total_debito"] for f in self.client.get(url).data["detalle"]}
+
+    def test_cambios_del_asiento(self):
+        a = self.asiento(date(2026, 3, 5), ("110505", 100, 0), ("4135", 0, 100))
+        self.assertEqual(self.campos(a), {(date(2026, 3, 5), 2026, 3, "vigente", self.tercero.id)})
+
+        otro = Tercero.objects.create(tipo_documento="CC", numero_documento="123", nombre_razon_social="Juan")
+        a.fecha, a.fiscal_period, a.tercero = date(2026, 4, 10), 4, otro
+        a.save()
+        self.assertEqual(self.campos(a), {(date(2026, 4, 10), 2026, 4, "vigente", otro.id)})
+        self.assertEqual(self.balance("2026-03-01", "2026-03-31"), {})
+        self.assertEqual(self.balance("2026-04-01", "2026-04-30")["110505"], Decimal("100"))
+
+        a.estado = "anulado"
+        a.save()
+        self.assertEqual(set(a.movimientos.values_list("estado", flat=True)), {"anulado"})
+
+
+class AutocompletarTest(LibroTestCase):
+    """El autocompletado busca por prefijo de código o de palabra, sin tildes."""
+
+    URL = "/api/contabilidad/cuentas/autocomplete/"
+
+    def setUp(self):
+        super().setUp()
+        # El índice es del proceso: que no venga armado por otro test con la misma versión
+        busqueda._estado["indice"] = None
+        self.addCleanup(busqueda._estado.update, indice=None)
+
+    def buscar(self, q, **params):
+        resp = self.client.get(self.URL, {"q": q, **params})
+        self.assertEqual(resp.status_code, 200)
+        return [c["codigo"] for c in resp.data]
+
+    def test_por_codigo(self):
+        self.assertEqual(self.buscar("1105"), ["1105", "110505", "110510"])
+        self.assertEqual(self.buscar("11", limite=2), ["11", "1105"])
+
+    def test_por_nombre(self):
+        self.assertEqual(self.buscar("ganancias"), ["59", "5905"])
+        self.assertEqual(self.buscar("operac"), ["41", "42"])
+        self.assertEqual(self.buscar("CAJA men"), ["110510"])
+        self.assertEqual(self.buscar("comercio 6"), ["6135"])
+
+    def test_sin_tildes_y_catalogo_nuevo(self):
+        self.assertEqual(self.buscar("deposito"), [])
+        Cuenta.objects.create(codigo="1110", nombre="Depósitos", padre_id="11")
+        with self.captureOnCommitCallbacks(execute=True):
+            catalogo.reconstruir_ancestros()
+        self.assertEqual(self.buscar("deposito"), ["1110"])
+
+
+class ArbolCuentasTest(LibroTestCase):
+    """/cuentas/arbol/ anida el PUC bajo una raíz hasta la profundidad pedida."""
+
+    def arbol(self, **params):
+        resp = self.client.get("/api/contabilidad/cuentas/arbol/", params)
+        self.assertEqual(resp.status_code, 200)
+        return resp.data
+
+    def codigos(self, nodos):
+        return [(n["codigo"], n["tiene_hijos"], self.codigos(n["hijos"])) for n in nodos]
+
+    def test_primer_nivel(self):
+        self.assertEqual(self.codigos(self.arbol(profundidad=0)), [
+            (c, True, []) for c in ("1", "2", "3", "4", "5", "6")
+        ])
+
+    def test_subarbol(self):
+        self.assertEqual(self.codigos(self.arbol(raiz="1")), [
+            ("1", True, [
+                ("11", True, [("1105", True, [("110505", False, []), ("110510", False, [])])]),
+                ("13", True, [("1305", True, [("130505", False, [])])]),
+            ]),
+        ])
+        self.assertEqual(self.codigos(self.arbol(raiz="11", profundidad=1)), [("11", True, [("1105", True, [])])])
+
+    def test_errores(self):
+        url = "/api/contabilidad/cuentas/arbol/"
+        self.assertEqual(self.client.get(url, {"raiz": "99"}).status_code, 404)
+        self.assertEqual(self.client.get(url, {"profundidad": "-1"}).status_code, 400)
+
+
+class ImportPucUpsertTest(LibroTestCase):
+    """import_puc --upsert agrega y actualiza sin borrar, no toca cuentas con movimientos y es idempotente."""
+
+    def importar(self, filas):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", encoding="utf-8", newline="", delete=False) as f:
+            csv.writer(f).writerows([("codigo", "nombre"), *filas])
+        self.addCleanup(Path(f.name).unlink)
+        salida = io.StringIO()
+        call_command("import_puc", f.name, "--upsert", stdout=salida)
+        return salida.getvalue()
+
+    def test_upsert(self):
+        self.asiento(date(2026, 3, 5), ("110505", 100, 0), ("4135", 0, 100))
+        filas = [
+            ("1105", "Caja"),
+            ("110505", "Caja principal"),
+            ("110510", "Cajas menores"),
+            ("110515", "Caja de ahorro"),
+        ]
+        salida = self.importar(filas)
+        self.assertIn("Agregadas: 1, actualizadas: 1, sin cambios: 1, en uso (no modificadas): 1", salida)
+        self.assertEqual(
+            dict(Cuenta.objects.filter(codigo__startswith="1105").values_list("codigo", "nombre")),
+            {"1105": "Caja", "110505": "Caja general", "110510": "Cajas menores", "110515": "Caja de ahorro"},
+        )
+        self.assertEqual(Cuenta.objects.count(), len(self.CUENTAS) + 1)
+        self.assertEqual(Cuenta.objects.get(codigo="110515").padre_id, "1105")
+        self.assertEqual(
+            set(CuentaAncestro.objects.filter(cuenta_id="110515").values_list("ancestro_id", flat=True)),
+            {"110515", "1105", "11", "1"},
+        )
+
+        salida = self.importar(filas)
+        self.assertIn("Agregadas: 0, actualizadas: 0, sin cambios: 3, en uso (no modificadas): 1", salida)
+
+
+class BalancePorTerceroTest(LibroTestCase):
+    """El balance por tercero abre saldo inicial, débitos, créditos y saldo final por cuenta y tercero."""
+
+    URL = "/api/contabilidad/reportes/balance-por-tercero/"
+
+    def test_por_cuenta_y_tercero(self):
+        otro = Tercero.objects.create(tipo_documento="CC", numero_documento="123", nombre_razon_social="Juan")
+        self.asiento(date(2026, 2, 10), ("130505", 300, 0), ("4135", 0, 300))
+        self.asiento(date(2026, 3, 5), ("110505", 100, 0), ("130505", 0, 100))
+        self.asiento(date(2026, 3, 9), ("130505", 50, 0), ("4135", 0, 50), tercero=otro)
+
+        resp = self.client.get(self.URL, {"cuenta": "13", "fecha_inicio": "2026-03-01", "fecha_fin": "2026-03-31"})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(
+            {
+                (f["codigo_cuenta"], f["numero_documento"]): (f["saldo_inicial"], f["total_debito"], f["total_credito"], f["saldo_final"])
+                for f in resp.data["detalle"]
+            },
+            {
+                ("130505", "900"): (Decimal("300"), 0, Decimal("100"), Decimal("200")),
+                ("130505", "123"): (0, Decimal("50"), 0, Decimal("50")),
+            },
+        )
+        self.assertEqual(resp.data["totales"]["total_final"], Decimal("250"))
+
+    def test_cuenta_invalida(self):
+        self.assertEqual(self.client.get(self.URL, {"cuenta": "13a"}).status_code, 400)
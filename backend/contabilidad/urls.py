@@ -7,11 +7,14 @@ from .views import (
     AsientoContableViewSet,
     LibroDiarioView,
     BalancePruebasView,
+    BalancePorTerceroView,
     LibroMayorView,
+    LibroMayorLoteView,
     EstadoResultadosView,
     BalanceGeneralView,
     MediosMagneticosView,
     periodo_view,
+    cache_reportes_view,
 )
 
 
@@ -27,9 +30,12 @@ urlpatterns = [
     path('', include(router.urls)),
     path('reportes/libro-diario/', LibroDiarioView.as_view(), name='libro-diario'),
     path('reportes/balance-pruebas/', BalancePruebasView.as_view(), name='balance-pruebas'),
+    path('reportes/balance-por-tercero/', BalancePorTerceroView.as_view(), name='balance-por-tercero'),
+    path('reportes/libro-mayor/', LibroMayorLoteView.as_view(), name='libro-mayor-lote'),
     path('reportes/libro-mayor/<str:codigo_cuenta>/', LibroMayorView.as_view(), name='libro-mayor'),
     path('reportes/estado-resultados/', EstadoResultadosView.as_view(), name='estado-resultados'),
     path('reportes/balance-general/', BalanceGeneralView.as_view(), name='balance-general'),
     path('reportes/medios-magneticos/<str:formato>/', MediosMagneticosView.as_view(), name='medios-magneticos'),
     path("periodo/", periodo_view, name="periodo-contable"),
+    path("reportes/cache/", cache_reportes_view, name="cache-reportes"),
 ]
\ No newline at end of file
@@ -3,28 +3,29 @@
 from rest_framework import viewsets, filters, views
 from rest_framework.response import Response
 #from rest_framework.permissions import AllowAny   # 👈 añade esto
-from .models import Cuenta, AsientoContable, MovimientoContable
+from .models import Cuenta, AsientoContable, MovimientoContable, resumen_diferido
 from .serializers import CuentaSerializer, AsientoContableSerializer, MovimientoContableSerializer
 from django.utils import timezone
 from datetime import date
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework import status
 from .models import PeriodoContable
-from openpyxl import Workbook
-from openpyxl.utils import get_column_letter
-from openpyxl.styles import Alignment, Font
-from django.http import HttpResponse
-from django.db.models import Sum
+from django.db import transaction
+from django.db.models import F, Q, Value
 from decimal import Decimal
 from datetime import datetime
+import io
 from rest_framework.decorators import api_view, permission_classes
+from . import busqueda, cache_reportes, catalogo, exogena, exportadores, importacion, reportes, saldos
+from .cache_reportes import cachear_reporte
+from .paginacion import AsientoCursorPagination, decodificar_cursor, paginar, solicita_pagina
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def periodo_view(request):
     anio = int(request.query_params.get('anio'))
-    p = PeriodoContable.ensure(anio)
+    p = PeriodoContable.obtener(anio)
     return Response({
         "anio": p.anio,
         "estado": p.estado,
@@ -39,6 +40,12 @@ def periodo_view(request):
         }
     })
 
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def cache_reportes_view(request):
+    """Aciertos/fallos de la caché de reportes en este proceso."""
+    return Response(cache_reportes.estadisticas())
+
 def _parse_date(val):
     if not val:
         return None
@@ -65,6 +72,43 @@ class CuentaViewSet(viewsets.ReadOnlyModelViewSet):
     search_fields = ["codigo", "nombre"]
     pagination_class = None
 
+    # ETag por versión del catálogo: si no cambió, 304 sin consultar ni serializar
+    @cache_reportes.con_etag(cache_reportes.clave_catalogo)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @cache_reportes.con_etag(cache_reportes.clave_catalogo)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    @action(detail=False, methods=["get"], url_path="arbol")
+    @cache_reportes.con_etag(cache_reportes.clave_catalogo)
+    def arbol(self, request):
+        """
+        GET /cuentas/arbol/?raiz=11&profundidad=2
+        Cuentas anidadas bajo `raiz` (o desde el primer nivel) hasta `profundidad` niveles.
+        `tiene_hijos` indica si un nodo se puede expandir con otra petición.
+        """
+        profundidad = request.query_params.get('profundidad')
+        if profundidad is not None and not profundidad.isdigit():
+            return Response({"error": "'profundidad' debe ser un entero >= 0."}, status=400)
+        raiz = request.query_params.get('raiz') or None
+        nodos = catalogo.arbol(raiz, int(profundidad) if profundidad is not None else None)
+        if nodos is None:
+            return Response({"error": "La cuenta especificada no existe."}, status=404)
+        return Response(nodos, status=200)
+
+    @action(detail=False, methods=["get"], url_path="autocomplete")
+    def autocomplete(self, request):
+        """
+        GET /cuentas/autocomplete/?q=1105 o ?q=deposito&limite=20
+        Búsqueda en el índice en memoria (contabilidad/busqueda.py), sin tocar la base.
+        """
+        limite = request.query_params.get('limite', '')
+        limite = min(int(limite), busqueda.LIMITE_MAXIMO) if limite.isdigit() and int(limite) > 0 else busqueda.LIMITE_DEFECTO
+        resultados = busqueda.indice().buscar(request.query_params.get('q', ''), limite)
+        return Response([{'codigo': c, 'nombre': n} for c, n in resultados], status=200)
+
 class AsientoContableViewSet(viewsets.ModelViewSet):
     """
     ViewSet para la gestión de Asientos Contables.
@@ -76,6 +120,7 @@ class AsientoContableViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
     queryset = AsientoContable.objects.prefetch_related("movimientos").all()
     serializer_class = AsientoContableSerializer
+    pagination_class = AsientoCursorPagination
     http_method_names = ['get', 'post', 'head', 'options']  # Deshabilitar PUT, PATCH, DELETE
 
     def get_queryset(self):
@@ -91,7 +136,34 @@ class AsientoContableViewSet(viewsets.ModelViewSet):
             qs = qs.filter(fecha__lte=ff)
         return qs
 
+    @action(detail=False, methods=["post"], url_path="importar")
+    def importar(self, request):
+        """
+        Importación masiva: archivo en el campo 'archivo' (multipart) o el cuerpo
+        tal cual con Content-Type application/x-ndjson o text/csv.
+        ?formato=ndjson|csv si no se deduce del nombre o del Content-Type.
+        Devuelve {"creados", "movimientos", "errores": [{"fila", "referencia", "errores"}]}.
+        """
+        if request.content_type.startswith("multipart/"):
+            archivo = request.FILES.get("archivo")
+            if archivo is None:
+                return Response({"error": "Adjunte el archivo en el campo 'archivo'."}, status=400)
+            nombre = archivo.name.lower()
+        else:
+            archivo = io.BytesIO(request.body)
+            nombre = ""
+        formato = request.query_params.get("formato") or (
+            "csv" if nombre.endswith(".csv") or "csv" in request.content_type else "ndjson"
+        )
+        try:
+            registros = importacion.leer(archivo, formato)
+            informe = importacion.Importador().importar(registros)
+        except importacion.ErrorFormato as e:
+            return Response({"error": str(e)}, status=400)
+        return Response(informe, status=200)
+
     @action(detail=True, methods=["post"], url_path="anular")
+    @transaction.atomic
     def anular(self, request, pk=None):
         asiento = self.get_object()
         if asiento.estado == "anulado":
@@ -100,7 +172,7 @@ class AsientoContableViewSet(viewsets.ModelViewSet):
         hoy = timezone.localdate()
         # Tomamos el año fiscal del asiento si existe, si no, el de la fecha
         anio_fiscal = asiento.fiscal_year or asiento.fecha.year
-        periodo = PeriodoContable.ensure(anio_fiscal)
+        periodo = PeriodoContable.leer(anio_fiscal)
 
         # Estado del periodo
         if periodo.estado == "cerrado":
@@ -134,106 +206,143 @@ class AsientoContableViewSet(viewsets.ModelViewSet):
 
         motivo = request.data.get("motivo", "")
 
-        # Crear asiento de ajuste (inverso) y marcar anulado
-        ajuste = AsientoContable.objects.create(
-            fecha=hoy,
-            concepto=f"AJUSTE POR ANULACIÓN del asiento #{asiento.id}",
-            tercero=asiento.tercero,
-            descripcion_adicional=f"Motivo: {motivo}",
-        )
-        for m in asiento.movimientos.all():
-            MovimientoContable.objects.create(
-                asiento=ajuste,
-                cuenta=m.cuenta,
-                debito=m.credito,
-                credito=m.debito,
+        # Crear asiento de ajuste (inverso) y marcar anulado; el resumen se
+        # actualiza en bloque con registrar_movimientos
+        with resumen_diferido():
+            ajuste = AsientoContable.objects.create(
+                fecha=hoy,
+                concepto=f"AJUSTE POR ANULACIÓN del asiento #{asiento.id}",
+                tercero=asiento.tercero,
+                descripcion_adicional=f"Motivo: {motivo}",
             )
-
-        asiento.estado = "anulado"
-        asiento.anulado_por = request.user
-        asiento.anulado_en = timezone.now()
-        asiento.anulacion_motivo = motivo
-        asiento.ajusta_a = ajuste
-        asiento.save()
+            movs_ajuste = [
+                MovimientoContable.objects.create(
+                    asiento=ajuste,
+                    cuenta=m.cuenta,
+                    debito=m.credito,
+                    credito=m.debito,
+                )
+                for m in asiento.movimientos.all()
+            ]
+            saldos.registrar_movimientos(ajuste, movs_ajuste)
+            cache_reportes.incrementar_version_libro(asiento, ajuste)
+
+            asiento.estado = "anulado"
+            asiento.anulado_por = request.user
+            asiento.anulado_en = timezone.now()
+            asiento.anulacion_motivo = motivo
+            asiento.ajusta_a = ajuste
+            asiento.save()
 
         return Response({"detail": "Asiento anulado y ajuste generado", "ajuste_id": ajuste.id}, status=200)
 
+# Orden estable de los libros (también es la clave del cursor)
+LIBRO_ORDEN = ('fecha', 'asiento_id', 'id')
+
+DIARIO_CAMPOS = (
+    'fecha', 'asiento_id', 'tercero', 'codigo_cuenta', 'nombre_cuenta', 'concepto', 'debito', 'credito',
+)
+DIARIO_ENCABEZADOS = (
+    "Fecha", "Asiento", "Tercero", "Cuenta", "Nombre cuenta", "Concepto", "Débito", "Crédito",
+)
+MAYOR_ENCABEZADOS = ("Fecha", "Asiento", "Tercero", "Concepto", "Débito", "Crédito", "Saldo")
+MAYOR_CAMPOS = ('fecha', 'asiento_id', 'tercero', 'concepto', 'debito', 'credito', 'saldo')
+MAYOR_COLUMNAS = (
+    'fecha', 'asiento_id', 'tercero__nombre_razon_social',
+    'asiento__concepto', 'debito', 'credito', 'saldo',
+)
+DIARIO_COLUMNAS = (
+    'fecha', 'asiento_id', 'tercero__nombre_razon_social',
+    'cuenta_id', 'cuenta__nombre', 'asiento__concepto', 'debito', 'credito',
+)
+
+
 class LibroDiarioView(views.APIView):
     """
     Vista para generar el reporte de Libro Diario.
     Devuelve todos los movimientos contables ordenados por fecha.
+
+    ?stream=ndjson, ?formato=csv y ?formato=xlsx recorren el queryset por
+    bloques y escriben mientras leen, con memoria constante sin importar el rango.
+    ?limite=N (y luego ?cursor=...) devuelve páginas por cursor sobre
+    (fecha, asiento, movimiento).
     """
+    @cachear_reporte('libro-diario')
     def get(self, request):
         fi = _parse_date(request.query_params.get('fecha_inicio'))
         ff = _parse_date(request.query_params.get('fecha_fin'))
 
         movimientos = (
             MovimientoContable.objects
-            .select_related('asiento', 'cuenta')
-            .order_by('asiento__fecha', 'asiento__id')
+            .order_by(*LIBRO_ORDEN)
         )
         if fi:
-            movimientos = movimientos.filter(asiento__fecha__gte=fi)
+            movimientos = movimientos.filter(fecha__gte=fi)
         if ff:
-            movimientos = movimientos.filter(asiento__fecha__lte=ff)
-
-        data = []
-        for m in movimientos:
-            data.append({
-                'fecha': m.asiento.fecha,
-                'asiento_id': m.asiento.id,
-                'tercero': getattr(m.asiento.tercero, 'nombre_razon_social', None),
-                'codigo_cuenta': m.cuenta.codigo,
-                'nombre_cuenta': m.cuenta.nombre,
-                'concepto': m.asiento.concepto,
-                'debito': m.debito,
-                'credito': m.credito,
-            })
-        return Response(data, status=200)
+            movimientos = movimientos.filter(fecha__lte=ff)
+
+        if solicita_pagina(request):
+            filas, _, siguiente = paginar(
+                request, movimientos.values_list(*DIARIO_COLUMNAS, 'id'), LIBRO_ORDEN,
+                clave=lambda f: (f[0], f[1], f[-1]),
+            )
+            return Response({
+                'next': siguiente(),
+                'results': [dict(zip(DIARIO_CAMPOS, f)) for f in filas],
+            }, status=200)
+
+        # Tuplas planas (incluye el tercero en el mismo JOIN: sin N+1)
+        filas = movimientos.values_list(*DIARIO_COLUMNAS)
+
+        formato = request.query_params.get('formato')
+        if formato == 'csv':
+            return exportadores.respuesta_csv(
+                DIARIO_CAMPOS, filas.iterator(chunk_size=exportadores.CHUNK_SIZE), "libro_diario.csv",
+            )
+        if formato == 'xlsx':
+            return exportadores.respuesta_xlsx(
+                "Libro Diario", DIARIO_ENCABEZADOS, filas.iterator(chunk_size=exportadores.CHUNK_SIZE),
+                "libro_diario.xlsx",
+                titulo=["NOMBRE DE LA EMPRESA + NIT", f"Libro Diario   {fi or ''} - {ff or ''}"],
+                anchos=[12, 10, 32, 12, 36, 40, 16, 16],
+            )
+
+        registros = (dict(zip(DIARIO_CAMPOS, f)) for f in filas.iterator(chunk_size=exportadores.CHUNK_SIZE))
+        if request.query_params.get('stream') == 'ndjson':
+            return exportadores.respuesta_ndjson(registros)
+
+        return Response(list(registros), status=200)
 
 
 class BalancePruebasView(views.APIView):
+    """
+    Balance de prueba por rango de fechas.
+    ?nivel=1|2|4|6 consolida los saldos en las cuentas de ese nivel del PUC
+    (clase, grupo, cuenta, subcuenta).
+    """
+    @cachear_reporte('balance-pruebas')
     def get(self, request):
         fi = _parse_date(request.query_params.get('fecha_inicio'))
         ff = _parse_date(request.query_params.get('fecha_fin'))
 
+        nivel = request.query_params.get('nivel')
+        if nivel:
+            if not nivel.isdigit() or int(nivel) not in catalogo.NIVELES_PUC:
+                return Response({"error": "El parámetro 'nivel' debe ser 1, 2, 4 o 6."}, status=400)
+            nivel = int(nivel)
+
         cuentas = Cuenta.objects.all().order_by('codigo')
 
-        # Movimientos del período
-        movs = MovimientoContable.objects.all()
-        if fi:
-            movs = movs.filter(asiento__fecha__gte=fi)
-        if ff:
-            movs = movs.filter(asiento__fecha__lte=ff)
-
-        periodo = movs.values('cuenta__codigo','cuenta__nombre') \
-                      .annotate(total_debito=Sum('debito'), total_credito=Sum('credito')) \
-                      .order_by('cuenta__codigo')
-        periodo_dict = {
-            x['cuenta__codigo']: {
-                'nombre': x['cuenta__nombre'],
-                'deb': x['total_debito'] or Decimal('0'),
-                'cre': x['total_credito'] or Decimal('0'),
-            } for x in periodo
-        }
-
-        # Saldos anteriores (saldo inicial)
-        prev_dict = {}
-        if fi:
-            movs_prev = MovimientoContable.objects.filter(asiento__fecha__lt=fi)
-            prev = movs_prev.values('cuenta__codigo').annotate(deb=Sum('debito'), cre=Sum('credito'))
-            prev_dict = {
-                x['cuenta__codigo']: (x['deb'] or Decimal('0')) - (x['cre'] or Decimal('0'))
-                for x in prev
-            }
+        # Saldo inicial, débitos y créditos en una consulta (tabla resumen si el rango son meses completos)
+        saldos_dict = saldos.saldos_por_rango(fi, ff, nivel=nivel)
 
         reporte = []
         total_ini = total_debitos = total_creditos = total_fin = Decimal('0')
 
         for cta in cuentas:
-            ini = prev_dict.get(cta.codigo, Decimal('0'))
-            deb = periodo_dict.get(cta.codigo, {}).get('deb', Decimal('0'))
-            cre = periodo_dict.get(cta.codigo, {}).get('cre', Decimal('0'))
+            if cta.codigo not in saldos_dict:
+                continue
+            ini, deb, cre = saldos_dict[cta.codigo]
             if ini == 0 and deb == 0 and cre == 0:
                 continue
             fin = ini + deb - cre
@@ -252,40 +361,26 @@ class BalancePruebasView(views.APIView):
 
         formato = request.query_params.get("formato")
         if formato == "xlsx":
-            wb = Workbook()
-            ws = wb.active
-            ws.title = "Balance de Prueba"
-
-            ws["A1"] = "NOMBRE DE LA EMPRESA + NIT"
-            ws["A2"] = f"Balance de Prueba   {ff or fi or ''}"
-            ws["A1"].font = ws["A2"].font = Font(bold=True)
-
-            headers = ["Cuenta","Nombre Cuenta contable","Saldo inicial","Débitos","Créditos","Saldo final"]
-            ws.append(headers)
-            for cell in ws[3]:
-                cell.font = Font(bold=True)
-
-            for row in reporte:
-                ws.append([
+            filas = (
+                (
                     row["codigo_cuenta"],
                     row["nombre_cuenta"],
                     float(row["saldo_inicial"]),
                     float(row["total_debito"]),
                     float(row["total_credito"]),
                     float(row["saldo_final"]),
-                ])
-
-            ws.append(["","TOTAL", float(total_ini), float(total_debitos), float(total_creditos), float(total_fin)])
-            widths = [12, 40, 16, 14, 14, 16]
-            for i,w in enumerate(widths, start=1):
-                ws.column_dimensions[get_column_letter(i)].width = w
-                for cell in ws[get_column_letter(i)]:
-                    cell.alignment = Alignment(horizontal="left", vertical="center")
-
-            resp = HttpResponse(content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
-            resp["Content-Disposition"] = 'attachment; filename="balance_prueba.xlsx"'
-            wb.save(resp)
-            return resp
+                )
+                for row in reporte
+            )
+            return exportadores.respuesta_xlsx(
+                "Balance de Prueba",
+                ["Cuenta", "Nombre Cuenta contable", "Saldo inicial", "Débitos", "Créditos", "Saldo final"],
+                filas,
+                "balance_prueba.xlsx",
+                titulo=["NOMBRE DE LA EMPRESA + NIT", f"Balance de Prueba   {ff or fi or ''}"],
+                anchos=[12, 40, 16, 14, 14, 16],
+                totales=["", "TOTAL", float(total_ini), float(total_debitos), float(total_creditos), float(total_fin)],
+            )
 
         return Response({
             'detalle': reporte,
@@ -298,11 +393,70 @@ class BalancePruebasView(views.APIView):
         }, status=200)
 
 
+TERCERO_ENCABEZADOS = (
+    "Cuenta", "Nombre cuenta", "Tipo doc.", "Número doc.", "Tercero",
+    "Saldo inicial", "Débitos", "Créditos", "Saldo final",
+)
+TERCERO_CAMPOS = (
+    'codigo_cuenta', 'nombre_cuenta', 'tipo_documento', 'numero_documento', 'tercero',
+    'saldo_inicial', 'total_debito', 'total_credito', 'saldo_final',
+)
+
+
+class BalancePorTerceroView(views.APIView):
+    """
+    Balance de prueba por cuenta y tercero (auxiliar por tercero).
+    GET /reportes/balance-por-tercero/?cuenta=1305&fecha_inicio=YYYY-MM-DD&fecha_fin=YYYY-MM-DD
+
+    `cuenta` es un prefijo de código (1305 trae 130505, 130510...). Una sola
+    consulta agrupada por (cuenta, tercero); ?stream=ndjson y ?formato=xlsx la
+    recorren por bloques.
+    """
+    @cachear_reporte('balance-por-tercero')
+    def get(self, request):
+        prefijo = (request.query_params.get('cuenta') or '').strip()
+        if prefijo and not prefijo.isdigit():
+            return Response({"error": "'cuenta' debe ser un código o prefijo numérico."}, status=400)
+        fi = _parse_date(request.query_params.get('fecha_inicio'))
+        ff = _parse_date(request.query_params.get('fecha_fin'))
+
+        filas = saldos.saldos_por_tercero(prefijo, fi, ff)
+
+        if request.query_params.get('formato') == 'xlsx':
+            t = saldos.totales_por_tercero(prefijo, fi, ff)
+            return exportadores.respuesta_xlsx(
+                "Balance por Tercero", TERCERO_ENCABEZADOS,
+                (f[:5] + tuple(float(v) for v in f[5:]) for f in filas.iterator(chunk_size=exportadores.CHUNK_SIZE)),
+                "balance_por_tercero.xlsx",
+                titulo=["NOMBRE DE LA EMPRESA + NIT", f"Balance por Tercero {prefijo}   {fi or ''} - {ff or ''}"],
+                anchos=[12, 32, 10, 16, 36, 16, 14, 14, 16],
+                totales=["", "TOTAL", "", "", ""] + [float(t[c]) for c in saldos.TERCERO_SALDOS],
+            )
+
+        registros = (dict(zip(TERCERO_CAMPOS, f)) for f in filas.iterator(chunk_size=exportadores.CHUNK_SIZE))
+        if request.query_params.get('stream') == 'ndjson':
+            return exportadores.respuesta_ndjson(registros)
+
+        detalle = list(registros)
+        return Response({
+            'detalle': detalle,
+            'totales': {
+                'total_inicial': sum((r['saldo_inicial'] for r in detalle), Decimal('0')),
+                'total_debitos': sum((r['total_debito'] for r in detalle), Decimal('0')),
+                'total_creditos': sum((r['total_credito'] for r in detalle), Decimal('0')),
+                'total_final': sum((r['saldo_final'] for r in detalle), Decimal('0')),
+            },
+        }, status=200)
+
+
 class LibroMayorView(views.APIView):
     """
     Reporte de Libro Mayor para una cuenta (por código).
     GET /api/contabilidad/libro-mayor/<codigo_cuenta>/?fecha_inicio=YYYY-MM-DD&fecha_fin=YYYY-MM-DD
+    Con ?limite=N pagina por cursor; el cursor lleva el saldo acumulado, así
+    las páginas siguientes no recalculan el saldo inicial.
     """
+    @cachear_reporte('libro-mayor')
     def get(self, request, codigo_cuenta):
         try:
             cuenta = Cuenta.objects.get(pk=codigo_cuenta)   # tu PK de cuenta es 'codigo'
@@ -311,208 +465,378 @@ class LibroMayorView(views.APIView):
 
         fecha_inicio = request.query_params.get('fecha_inicio')
         fecha_fin    = request.query_params.get('fecha_fin')
+        fi, ff = _parse_date(fecha_inicio), _parse_date(fecha_fin)
 
-        # Saldo inicial
-        mov_prev = MovimientoContable.objects.filter(cuenta=cuenta)
-        if fecha_inicio:
-            mov_prev = mov_prev.filter(asiento__fecha__lt=fecha_inicio)
-        agg_prev = mov_prev.aggregate(total_debito=Sum('debito'), total_credito=Sum('credito'))
-        deb_prev = agg_prev['total_debito']  or Decimal('0')
-        cre_prev = agg_prev['total_credito'] or Decimal('0')
-        saldo_inicial = deb_prev - cre_prev
-
-        # Movimientos del período
+        # Movimientos del período (las mismas fechas acotan filas y saldo inicial)
         qs = MovimientoContable.objects.filter(cuenta=cuenta)
-        if fecha_inicio:
-            qs = qs.filter(asiento__fecha__gte=fecha_inicio)
-        if fecha_fin:
-            qs = qs.filter(asiento__fecha__lte=fecha_fin)
-        qs = qs.select_related('asiento', 'asiento__tercero').order_by('asiento__fecha','asiento__id')
+        if fi:
+            qs = qs.filter(saldos.contable_desde(fi))
+        if ff:
+            qs = qs.filter(saldos.contable_hasta(ff))
+
+        # Saldo inicial (subconsulta) y saldo corrido (ventana) salen de la misma consulta.
+        # En páginas siguientes el saldo llega en el cursor.
+        estado = {}
+        if solicita_pagina(request) and request.query_params.get('cursor'):
+            estado = decodificar_cursor(request.query_params['cursor'])
+        if 'saldo' in estado:
+            inicial = Value(Decimal(estado['saldo']), output_field=saldos.MONTO)
+        else:
+            inicial = saldos.saldo_anterior(cuenta, fi)
+        qs = saldos.con_saldo_acumulado(qs, inicial, LIBRO_ORDEN).values_list(
+            *MAYOR_COLUMNAS, 'saldo_inicial', 'id',
+        )
 
-        detalle = []
-        saldo = saldo_inicial
-        for m in qs:
-            saldo += m.debito - m.credito
-            detalle.append({
-                'fecha': m.asiento.fecha,
-                'asiento_id': m.asiento.id,
-                'tercero': getattr(m.asiento.tercero, 'nombre_razon_social', None),
-                'concepto': m.asiento.concepto,
-                'debito': m.debito,
-                'credito': m.credito,
-                'saldo': saldo,
-            })
+        if request.query_params.get('formato') == 'xlsx':
+            filas = qs.order_by(*LIBRO_ORDEN).iterator(chunk_size=exportadores.CHUNK_SIZE)
+            return exportadores.respuesta_xlsx(
+                "Libro Mayor", MAYOR_ENCABEZADOS, _mayor_filas(filas, cuenta, fi), f"libro_mayor_{cuenta.codigo}.xlsx",
+                titulo=["NOMBRE DE LA EMPRESA + NIT", f"Libro Mayor   {cuenta}   {fi or ''} - {ff or ''}"],
+                anchos=[12, 10, 32, 40, 16, 16, 16],
+            )
 
-        return Response({
+        siguiente = None
+        if solicita_pagina(request):
+            qs, _, siguiente = paginar(request, qs, LIBRO_ORDEN, clave=lambda f: (f[0], f[1], f[-1]))
+        else:
+            qs = qs.order_by(*LIBRO_ORDEN)
+
+        detalle = []
+        saldo_inicial = None
+        for f in qs:
+            if saldo_inicial is None:
+                saldo_inicial = f[-2]
+            detalle.append(dict(zip(MAYOR_CAMPOS, f)))
+
+        if saldo_inicial is None:
+            # Sin movimientos en el rango: el saldo inicial es también el final
+            if 'saldo' in estado:
+                saldo_inicial = Decimal(estado['saldo'])
+            else:
+                saldo_inicial = _saldo_sin_movimientos(cuenta, fi)
+        saldo = detalle[-1]['saldo'] if detalle else saldo_inicial
+
+        data = {
             'cuenta': {'codigo': cuenta.codigo, 'nombre': cuenta.nombre},
             'fecha_inicio_reporte': fecha_inicio,
             'fecha_fin_reporte': fecha_fin,
             'saldo_inicial': saldo_inicial,
             'movimientos': detalle,
             'saldo_final': saldo,
-        }, status=200)
+        }
+        if siguiente is not None:
+            data['next'] = siguiente({'saldo': str(saldo)})
+        return Response(data, status=200)
 
 
-class EstadoResultadosView(views.APIView):
+def _saldo_sin_movimientos(cuenta, fi):
+    """Saldo de `cuenta` antes de `fi` cuando el rango no trae filas de donde leerlo."""
+    if not fi:
+        return Decimal('0')
+    return saldos.saldos_iniciales(fi, Q(cuenta=cuenta)).get(cuenta.codigo, Decimal('0'))
+
+
+def _mayor_filas(filas, cuenta, fi):
     """
-    Vista para generar el Estado de Resultados a una fecha de corte.
+    Filas de MAYOR_COLUMNAS (+ saldo_inicial, id) precedidas siempre del saldo
+    inicial: el de la primera fila o, si el rango está vacío, el calculado a `fi`.
     """
-    
+    filas = iter(filas)
+    primera = next(filas, None)
+    inicial = _saldo_sin_movimientos(cuenta, fi) if primera is None else primera[-2]
+    yield (fi, None, None, 'SALDO INICIAL', None, None, inicial)
+    if primera is not None:
+        yield primera[:-2]
+    for f in filas:
+        yield f[:-2]
 
-    def get(self, request):
-        from django.db.models import Sum
-        from decimal import Decimal
 
-        fecha_fin = request.query_params.get('fecha_fin')
-        if not fecha_fin:
-            return Response({"error": "Debe proporcionar una 'fecha_fin' en los parámetros."}, status=400)
+class LibroMayorLoteView(views.APIView):
+    """
+    Libro Mayor de varias cuentas en una sola petición.
+    GET /api/contabilidad/reportes/libro-mayor/?prefijo=11&fecha_inicio=...&fecha_fin=...
+    GET /api/contabilidad/reportes/libro-mayor/?cuentas=110505,130505
+
+    Los saldos iniciales salen de una consulta agrupada y los movimientos de un
+    único recorrido ordenado por cuenta, con el saldo corrido calculado por una
+    ventana particionada por cuenta. ?stream=ndjson, ?formato=csv y
+    ?formato=xlsx escriben a medida que leen.
+    """
+    @cachear_reporte('libro-mayor-lote')
+    def get(self, request):
+        prefijo = request.query_params.get('prefijo')
+        codigos = [c.strip() for c in request.query_params.get('cuentas', '').split(',') if c.strip()]
+        if not prefijo and not codigos:
+            return Response({"error": "Debe proporcionar 'prefijo' o 'cuentas'."}, status=400)
 
-        # 1. Ingresos (Clase 4)
-        ingresos_agg = MovimientoContable.objects.filter(
-            asiento__fecha__lte=fecha_fin,
-            cuenta__codigo__startswith='4'
-        ).aggregate(total_credito=Sum('credito'), total_debito=Sum('debito'))
-        total_ingresos = (ingresos_agg['total_credito'] or 0) - (ingresos_agg['total_debito'] or 0)
+        fi = _parse_date(request.query_params.get('fecha_inicio'))
+        ff = _parse_date(request.query_params.get('fecha_fin'))
 
-        # 2. Costos de Ventas (Clase 6)
-        costos_agg = MovimientoContable.objects.filter(
-            asiento__fecha__lte=fecha_fin,
-            cuenta__codigo__startswith='6'
-        ).aggregate(total_debito=Sum('debito'), total_credito=Sum('credito'))
-        total_costos = (costos_agg['total_debito'] or 0) - (costos_agg['total_credito'] or 0)
+        filtro = Q(cuenta__codigo__startswith=prefijo) if prefijo else Q(cuenta_id__in=codigos)
+        cuentas = Cuenta.objects.order_by('codigo')
+        cuentas = cuentas.filter(codigo__startswith=prefijo) if prefijo else cuentas.filter(codigo__in=codigos)
+        cuentas = list(cuentas.values_list('codigo', 'nombre'))
 
-        utilidad_bruta = total_ingresos - total_costos
+        iniciales = saldos.saldos_iniciales(fi, filtro)
 
-        # 3. Gastos Operacionales (Clase 5)
-        gastos_agg = MovimientoContable.objects.filter(
-            asiento__fecha__lte=fecha_fin,
-            cuenta__codigo__startswith='5'
-        ).aggregate(total_debito=Sum('debito'), total_credito=Sum('credito'))
-        total_gastos = (gastos_agg['total_debito'] or 0) - (gastos_agg['total_credito'] or 0)
+        qs = MovimientoContable.objects.filter(filtro)
+        if fi:
+            qs = qs.filter(saldos.contable_desde(fi))
+        if ff:
+            qs = qs.filter(saldos.contable_hasta(ff))
+        filas = saldos.con_saldo_acumulado(
+            qs, Value(Decimal('0'), output_field=saldos.MONTO), LIBRO_ORDEN, particion=[F('cuenta_id')],
+        ).values_list('cuenta_id', *MAYOR_COLUMNAS).order_by('cuenta_id', *LIBRO_ORDEN)
 
-        utilidad_operacional = utilidad_bruta - total_gastos
+        bloques = _mayor_por_cuenta(cuentas, iniciales, filas.iterator(chunk_size=exportadores.CHUNK_SIZE))
 
-        # Por ahora, un cálculo simplificado. Se pueden añadir más niveles (no operacionales, impuestos, etc.)
-        utilidad_neta_antes_impuestos = utilidad_operacional
+        formato = request.query_params.get('formato')
+        if formato == 'csv':
+            return exportadores.respuesta_csv(
+                ('codigo_cuenta', 'nombre_cuenta') + MAYOR_CAMPOS, _mayor_csv(bloques, fi), "libro_mayor.csv",
+            )
+        if formato == 'xlsx':
+            return exportadores.respuesta_xlsx(
+                "Libro Mayor", ("Cuenta", "Nombre cuenta") + MAYOR_ENCABEZADOS, _mayor_csv(bloques, fi),
+                "libro_mayor.xlsx",
+                titulo=["NOMBRE DE LA EMPRESA + NIT", f"Libro Mayor   {fi or ''} - {ff or ''}"],
+                anchos=[12, 32, 12, 10, 32, 40, 16, 16, 16],
+            )
+        if request.query_params.get('stream') == 'ndjson':
+            return exportadores.respuesta_ndjson(_mayor_ndjson(bloques))
 
         return Response({
-            'fecha_corte': fecha_fin,
-            'ingresos_operacionales': total_ingresos,
-            'costo_de_ventas': total_costos,
-            'utilidad_bruta': utilidad_bruta,
-            'gastos_operacionales': total_gastos,
-            'utilidad_operacional': utilidad_operacional,
-            'utilidad_neta_antes_de_impuestos': utilidad_neta_antes_impuestos
-        })
+            'fecha_inicio_reporte': fi,
+            'fecha_fin_reporte': ff,
+            'cuentas': [
+                {
+                    'cuenta': {'codigo': codigo, 'nombre': nombre},
+                    'saldo_inicial': inicial,
+                    'movimientos': list(movimientos),
+                    'saldo_final': saldo_final(),
+                }
+                for codigo, nombre, inicial, movimientos, saldo_final in bloques
+            ],
+        }, status=200)
 
-class BalanceGeneralView(views.APIView):
+
+def _mayor_por_cuenta(cuentas, iniciales, filas):
     """
-    Vista para generar el Balance General (Estado de Situación Financiera).
+    Cruza el catálogo (ordenado) con el recorrido de movimientos (mismo orden).
+    Produce (codigo, nombre, saldo_inicial, movimientos, saldo_final) por cuenta
+    con saldo o movimientos; `movimientos` es un generador que debe consumirse
+    antes de pedir el siguiente bloque.
     """
-    
+    filas = iter(filas)
+    actual = next(filas, None)
+    for codigo, nombre in cuentas:
+        inicial = iniciales.get(codigo, Decimal('0'))
+        if (actual is None or actual[0] != codigo) and not inicial:
+            continue
+        ultimo = [inicial]
+
+        def movimientos(codigo=codigo, inicial=inicial, ultimo=ultimo):
+            nonlocal actual
+            while actual is not None and actual[0] == codigo:
+                mov = dict(zip(MAYOR_CAMPOS, actual[1:]))
+                mov['saldo'] = inicial + mov['saldo']
+                ultimo[0] = mov['saldo']
+                yield mov
+                actual = next(filas, None)
+
+        yield codigo, nombre, inicial, movimientos(), lambda ultimo=ultimo: ultimo[0]
+
+
+def _mayor_ndjson(bloques):
+    for codigo, nombre, inicial, movimientos, saldo_final in bloques:
+        yield {'tipo': 'cuenta', 'codigo': codigo, 'nombre': nombre, 'saldo_inicial': inicial}
+        for mov in movimientos:
+            yield {'tipo': 'movimiento', 'codigo': codigo, **mov}
+        yield {'tipo': 'cierre', 'codigo': codigo, 'saldo_final': saldo_final()}
+
 
+def _mayor_csv(bloques, fi):
+    for codigo, nombre, inicial, movimientos, _ in bloques:
+        yield (codigo, nombre, fi, '', '', 'SALDO INICIAL', '', '', inicial)
+        for mov in movimientos:
+            yield (codigo, nombre, *mov.values())
+
+
+def _periodos_serie(request):
+    """Períodos 1..12 (y 13 si el año lo habilita) para ?serie=mensual&anio=YYYY."""
+    anio = request.query_params.get('anio')
+    if not anio or not anio.isdigit():
+        return None, Response({"error": "Debe proporcionar 'anio' (YYYY) para la serie mensual."}, status=400)
+    anio = int(anio)
+    periodos = list(range(1, 13))
+    if PeriodoContable.obtener(anio).habilitar_mes13:
+        periodos.append(13)
+    return (anio, periodos), None
+
+
+class EstadoResultadosView(views.APIView):
+    """
+    Vista para generar el Estado de Resultados a una fecha de corte
+    (opcionalmente desde ?fecha_inicio). Una sola consulta agrupada.
+    ?serie=mensual&anio=YYYY devuelve una columna por mes (incluye el Mes 13)
+    con el resultado del mes y el acumulado del año.
+    """
+
+    @cachear_reporte('estado-resultados')
     def get(self, request):
-        from django.db.models import Sum
-        from decimal import Decimal
+        if request.query_params.get('serie') == 'mensual':
+            serie, error = _periodos_serie(request)
+            if error:
+                return error
+            anio, periodos = serie
+            return Response({
+                'anio': anio,
+                'serie': 'mensual',
+                'columnas': [
+                    {
+                        'periodo': p,
+                        'etiqueta': etiqueta,
+                        'mes': reportes.estado_resultados(mes),
+                        'acumulado': reportes.estado_resultados(acumulado),
+                    }
+                    for p, etiqueta, mes, acumulado, _ in reportes.columnas_mensuales(anio, periodos)
+                ],
+            })
 
         fecha_fin = request.query_params.get('fecha_fin')
         if not fecha_fin:
             return Response({"error": "Debe proporcionar una 'fecha_fin' en los parámetros."}, status=400)
+        ff = _parse_date(fecha_fin)
+        fi = _parse_date(request.query_params.get('fecha_inicio'))
+        if not ff:
+            return Response({"error": "La 'fecha_fin' no es una fecha válida."}, status=400)
 
-        # Función auxiliar para calcular el saldo de una clase de cuenta
-        def calcular_saldo_clase(clase):
-            movimientos = MovimientoContable.objects.filter(
-                asiento__fecha__lte=fecha_fin,
-                cuenta__codigo__startswith=str(clase)
-            )
-            saldo = movimientos.aggregate(
-                total_debito=Sum('debito', default=Decimal(0)),
-                total_credito=Sum('credito', default=Decimal(0))
-            )
-            return saldo['total_debito'] - saldo['total_credito']
+        estado = reportes.estado_resultados(reportes.totales(ff, fi))
+        return Response({'fecha_corte': fecha_fin, **estado})
 
-        # Calcular saldos para Activo (1), Pasivo (2), y Patrimonio (3)
-        total_activos = calcular_saldo_clase(1)
-        total_pasivos = calcular_saldo_clase(2) * -1 # Se multiplica por -1 porque los pasivos son de naturaleza crédito
-        total_patrimonio_inicial = calcular_saldo_clase(3) * -1
+class BalanceGeneralView(views.APIView):
+    """
+    Vista para generar el Balance General (Estado de Situación Financiera).
+    Una sola consulta agrupada para todas las clases.
+    ?serie=mensual&anio=YYYY devuelve el balance al cierre de cada mes (incluye
+    el Mes 13).
+    """
 
-        # Calcular la utilidad del ejercicio (Ingresos - Gastos - Costos)
-        utilidad_ingresos = calcular_saldo_clase(4) * -1
-        utilidad_gastos = calcular_saldo_clase(5)
-        utilidad_costos = calcular_saldo_clase(6)
-        utilidad_del_ejercicio = utilidad_ingresos - utilidad_gastos - utilidad_costos
+    @cachear_reporte('balance-general')
+    def get(self, request):
+        if request.query_params.get('serie') == 'mensual':
+            serie, error = _periodos_serie(request)
+            if error:
+                return error
+            anio, periodos = serie
+            return Response({
+                'anio': anio,
+                'serie': 'mensual',
+                'columnas': [
+                    {'periodo': p, 'etiqueta': etiqueta, **reportes.balance_general(historico)}
+                    for p, etiqueta, _, _, historico in reportes.columnas_mensuales(anio, periodos)
+                ],
+            })
 
-        total_patrimonio = total_patrimonio_inicial + utilidad_del_ejercicio
+        fecha_fin = request.query_params.get('fecha_fin')
+        if not fecha_fin:
+            return Response({"error": "Debe proporcionar una 'fecha_fin' en los parámetros."}, status=400)
+        ff = _parse_date(fecha_fin)
+        if not ff:
+            return Response({"error": "La 'fecha_fin' no es una fecha válida."}, status=400)
 
-        # Verificación de la ecuación contable
-        ecuacion_ok = total_activos == (total_pasivos + total_patrimonio)
+        balance = reportes.balance_general(reportes.totales(ff))
 
         return Response({
             'fecha_corte': fecha_fin,
             'activos': {
-                'total': total_activos,
+                'total': balance['activos'],
             },
             'pasivos_y_patrimonio': {
-                'total_pasivos': total_pasivos,
-                'total_patrimonio': total_patrimonio,
-                'total_pasivo_y_patrimonio': total_pasivos + total_patrimonio,
+                'total_pasivos': balance['pasivos'],
+                'total_patrimonio': balance['patrimonio'],
+                'total_pasivo_y_patrimonio': balance['pasivos'] + balance['patrimonio'],
+                'utilidad_del_ejercicio': balance['utilidad_del_ejercicio'],
             },
             'verificacion_ecuacion_contable': {
                 'ecuacion': 'Activo = Pasivo + Patrimonio',
-                'balance_correcto': ecuacion_ok
+                'balance_correcto': balance['ecuacion_ok']
             }
         })
 
 class MediosMagneticosView(views.APIView):
     """
     Vista para generar reportes de Medios Magnéticos (Exógena) para la DIAN.
+    GET /reportes/medios-magneticos/1001/?year=2025
+    GET /reportes/medios-magneticos/1001,1007,1008/?year=2025  (o 'todos')
+
+    Todos los formatos pedidos salen de un solo recorrido de los movimientos del
+    año (ver contabilidad/exogena.py). Con un solo formato, ?salida=xlsx lo
+    exporta a Excel; ?salida=xml devuelve un zip con los XML de la DIAN
+    (archivos de 5.000 registros, numerados desde ?envio=, por defecto 1).
     """
-    
 
+    @cachear_reporte('medios-magneticos')
     def get(self, request, formato):
         year = request.query_params.get('year')
         if not year:
             return Response({"error": "Debe proporcionar el parámetro 'year'."}, status=400)
-
-        if formato == '1001':
-            return self.formato_1001(year)
-
-        # Aquí se añadirían las llamadas a otros formatos (1003, 1005, etc.)
-
-        return Response({"error": f"El formato '{formato}' no es soportado aún."}, status=404)
-
-    def formato_1001(self, year):
-        """
-        Genera los datos para el Formato 1001 v10: Pagos o abonos en cuenta.
-        Conceptos de ejemplo: 5002 (Salarios), 5016 (Honorarios).
-        """
-        from django.db.models import Sum, Value, CharField
-        from django.db.models.functions import Coalesce
-
-        # Filtra movimientos de cuentas de Gasto (clase 5) para el año especificado.
-        pagos = MovimientoContable.objects.filter(
-            asiento__fecha__year=year,
-            cuenta__codigo__startswith='5'
-        ).values(
-            'asiento__tercero__tipo_documento',
-            'asiento__tercero__numero_documento',
-            'asiento__tercero__nombre_razon_social'
-        ).annotate(
-            # Agregamos el concepto basado en la cuenta. Lógica de ejemplo.
-            concepto_pago=Value('5016', output_field=CharField()), # Asumimos honorarios por defecto
-            valor_pago=Sum('debito')
-        ).filter(valor_pago__gt=0) # Solo pagos, no notas crédito
-
-        # Aquí iría una lógica más compleja para mapear cuentas a conceptos DIAN.
-        # Por ahora, es una implementación de ejemplo.
-
-        data = list(pagos)
-
-        return Response({
-            'formato': '1001',
-            'version': '10',
+        if not year.isdigit():
+            return Response({"error": "'year' debe ser un año (YYYY)."}, status=400)
+
+        formatos = list(exogena.FORMATOS) if formato == 'todos' else [f.strip() for f in formato.split(',')]
+        no_soportados = [f for f in formatos if f not in exogena.FORMATOS]
+        if no_soportados:
+            return Response({"error": f"El formato '{no_soportados[0]}' no es soportado aún."}, status=404)
+
+        motor = exogena.Exogena(int(year), formatos)
+
+        if request.query_params.get('salida') == 'xlsx':
+            if len(formatos) != 1:
+                return Response({"error": "La salida xlsx es para un solo formato."}, status=400)
+            return self.xlsx(motor, formatos[0], year)
+        if request.query_params.get('salida') == 'xml':
+            return self.xml(motor, formatos, year, request.query_params.get('envio', '1'))
+
+        datos = {f: self.formato_json(motor, f, year) for f in formatos}
+        if len(formatos) == 1:
+            return Response(datos[formatos[0]], status=200)
+        return Response({'año': year, 'formatos': datos}, status=200)
+
+    @staticmethod
+    def formato_json(motor, formato, year):
+        cantidad, total = motor.totales(formato)
+        return {
+            'formato': formato,
+            'version': exogena.FORMATOS[formato].version,
+            'nombre': exogena.FORMATOS[formato].nombre,
             'año': year,
-            'registros': data
-        })
+            'cantidad_registros': cantidad,
+            'valor_total': total,
+            'registros': list(motor.registros(formato)),
+        }
+
+    @staticmethod
+    def xml(motor, formatos, year, envio):
+        if not envio.isdigit() or int(envio) < 1:
+            return Response({"error": "'envio' debe ser un número de envío (1, 2, ...)."}, status=400)
+        formatos = [f for f in formatos if motor.totales(f)[0]]
+        if not formatos:
+            return Response({"error": "No hay registros para los formatos pedidos."}, status=404)
+        return exportadores.respuesta_zip(
+            lambda zf: exogena.escribir_zip(zf, motor, formatos, envio=int(envio)),
+            f"exogena_{year}_{'_'.join(formatos)}.zip",
+        )
 
-        
\ No newline at end of file
+    @staticmethod
+    def xlsx(motor, formato, year):
+        meta = exogena.FORMATOS[formato]
+        campos = (() if formato in exogena.SIN_CONCEPTO else ('concepto',)) \
+            + ('tipo_documento', 'numero_documento', 'nombre_razon_social') + meta.columnas
+        encabezados = [c.replace('_', ' ').capitalize() for c in campos]
+        filas = ([r.get(c) for c in campos] for r in motor.registros(formato))
+        return exportadores.respuesta_xlsx(
+            f"Formato {formato}", encabezados, filas, f"formato_{formato}_{year}.xlsx",
+            titulo=[f"Formato {formato} v{meta.version} - {meta.nombre} - {year}"],
+            anchos=[{'concepto': 10, 'tipo_documento': 10, 'numero_documento': 16, 'nombre_razon_social': 40}.get(c, 18) for c in campos],
+        )
@@ -1,6 +1,6 @@
 # backend/facturacion/admin.py
 from django.contrib import admin
-from .models import Factura, ItemFactura
+from .models import Factura, ItemFactura, totales_diferidos
 
 class ItemFacturaInline(admin.TabularInline):
     """
@@ -57,6 +57,12 @@ class FacturaAdmin(admin.ModelAdmin):
     
     get_estado_badge.short_description = 'Estado'
     get_estado_badge.allow_tags = True
+
+    def save_related(self, request, form, formsets, change):
+        # Los ítems del inline se guardan uno a uno: totales una sola vez al final
+        with totales_diferidos():
+            super().save_related(request, form, formsets, change)
+        form.instance.calcular_totales()
     
     actions = ['marcar_como_emitida', 'marcar_como_pagada', 'marcar_como_anulada']
     
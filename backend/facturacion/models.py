@@ -1,12 +1,42 @@
 # backend/facturacion/models.py
 
 
+import threading
+from contextlib import contextmanager
+
 from django.db import models
+from django.db.models import DecimalField, ExpressionWrapper, F, Q, Sum
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from decimal import Decimal
 from terceros.models import Tercero
 
+# Tasa de IVA estándar en Colombia
+IVA_RATE = Decimal('0.19')
+
+SUBTOTAL_LINEA = ExpressionWrapper(
+    F('cantidad') * F('precio_unitario'), output_field=DecimalField(max_digits=25, decimal_places=4),
+)
+
+# Campos editables de un ítem y su valor si no se envían
+ITEM_DEFECTOS = {'descripcion': '', 'cantidad': 0, 'precio_unitario': 0, 'lleva_iva': True}
+
+_senales = threading.local()
+
+
+@contextmanager
+def totales_diferidos():
+    """
+    Suspende el recálculo de totales por señal en este hilo (operaciones por
+    lote sobre los ítems). Quien lo usa llama a calcular_totales() una vez al final.
+    """
+    anterior = getattr(_senales, 'diferir', False)
+    _senales.diferir = True
+    try:
+        yield
+    finally:
+        _senales.diferir = anterior
+
 class Factura(models.Model):
     """
     Representa el encabezado de una factura de venta.
@@ -31,20 +61,54 @@ class Factura(models.Model):
     fecha_actualizacion = models.DateTimeField(auto_now=True)
 
     def calcular_totales(self):
-        """Recalcula los totales de la factura basándose en sus items"""
-        subtotal = Decimal('0')
-        impuestos = Decimal('0')
-        
-        for item in self.items.all():
-            subtotal_item = item.cantidad * item.precio_unitario
-            subtotal += subtotal_item
-            if item.lleva_iva:
-                impuestos += subtotal_item * Decimal('0.19')
-        
+        """Recalcula los totales de la factura con una sola consulta agregada sobre sus items"""
+        sumas = self.items.aggregate(
+            subtotal=Sum(SUBTOTAL_LINEA),
+            gravado=Sum(SUBTOTAL_LINEA, filter=Q(lleva_iva=True)),
+        )
+        subtotal = sumas['subtotal'] or Decimal('0')
+        impuestos = (sumas['gravado'] or Decimal('0')) * IVA_RATE
+
         self.subtotal = subtotal
         self.impuestos = impuestos.quantize(Decimal('0.01'))
         self.total = subtotal + impuestos
-        self.save()
+        self.save(update_fields=['subtotal', 'impuestos', 'total', 'fecha_actualizacion'])
+
+    def agregar_items(self, items_data):
+        """Crea los items con un solo bulk_create (no dispara las señales de totales)."""
+        return ItemFactura.objects.bulk_create([
+            ItemFactura(factura=self, **{**ITEM_DEFECTOS, **item_data, 'id': None}).calcular_subtotal()
+            for item_data in items_data
+        ])
+
+    def sincronizar_items(self, items_data):
+        """
+        Deja los items como `items_data`, emparejando por 'id': bulk_update de los
+        que cambian, bulk_create de los nuevos (sin id o con un id que no es de
+        esta factura) y un solo delete de los que no vienen. Los totales los
+        recalcula quien llama, una vez.
+        """
+        actuales = {item.pk: item for item in self.items.all()}
+        cambiados, nuevos, conservados = [], [], set()
+        for item_data in items_data:
+            datos = {k: v for k, v in item_data.items() if k in ITEM_DEFECTOS}
+            item = actuales.get(item_data.get('id'))
+            if item is None or item.pk in conservados:
+                nuevos.append(datos)
+                continue
+            conservados.add(item.pk)
+            if any(getattr(item, campo) != valor for campo, valor in datos.items()):
+                for campo, valor in datos.items():
+                    setattr(item, campo, valor)
+                cambiados.append(item.calcular_subtotal())
+
+        with totales_diferidos():
+            self.items.exclude(pk__in=conservados).delete()
+        if cambiados:
+            ItemFactura.objects.bulk_update(cambiados, [*ITEM_DEFECTOS, 'subtotal_linea'])
+        self.agregar_items(nuevos)
+        # Los items precargados (prefetch_related) ya no corresponden
+        getattr(self, '_prefetched_objects_cache', {}).pop('items', None)
 
     def __str__(self):
         return f"Factura #{self.id} - {self.cliente.nombre_razon_social}"
@@ -65,9 +129,13 @@ class ItemFactura(models.Model):
     lleva_iva = models.BooleanField(default=True, verbose_name="¿Lleva IVA?")
     subtotal_linea = models.DecimalField(max_digits=15, decimal_places=2, help_text="Subtotal antes de impuestos")
 
+    def calcular_subtotal(self):
+        self.subtotal_linea = self.cantidad * self.precio_unitario
+        return self
+
     def save(self, *args, **kwargs):
         # Calcular el subtotal de la línea antes de guardar
-        self.subtotal_linea = self.cantidad * self.precio_unitario
+        self.calcular_subtotal()
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -81,9 +149,11 @@ class ItemFactura(models.Model):
 @receiver(post_save, sender=ItemFactura)
 def actualizar_totales_factura_on_save(sender, instance, **kwargs):
     """Actualiza los totales cuando se guarda un item"""
-    instance.factura.calcular_totales()
+    if not getattr(_senales, 'diferir', False):
+        instance.factura.calcular_totales()
 
 @receiver(post_delete, sender=ItemFactura)
 def actualizar_totales_factura_on_delete(sender, instance, **kwargs):
     """Actualiza los totales cuando se elimina un item"""
-    instance.factura.calcular_totales()
\ No newline at end of file
+    if not getattr(_senales, 'diferir', False):
+        instance.factura.calcular_totales()
\ No newline at end of file
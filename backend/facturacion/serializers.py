@@ -1,20 +1,20 @@
 # backend/facturacion/serializers.py
 from rest_framework import serializers
 from django.db import transaction
-from decimal import Decimal
 from .models import Factura, ItemFactura
 
-# Tasa de IVA estándar en Colombia
-IVA_RATE = Decimal('0.19')
-
 class ItemFacturaSerializer(serializers.ModelSerializer):
+    # Escribible para emparejar los ítems existentes al editar
+    id = serializers.IntegerField(required=False)
+
     class Meta:
         model = ItemFactura
         fields = ['id', 'descripcion', 'cantidad', 'precio_unitario', 'lleva_iva', 'subtotal_linea']
-        read_only_fields = ['id', 'subtotal_linea']
+        read_only_fields = ['subtotal_linea']
 
 class FacturaSerializer(serializers.ModelSerializer):
-    items = ItemFacturaSerializer(many=True)
+    # Opcional al editar (PUT o PATCH sin 'items' conserva los ítems); obligatorio al crear
+    items = ItemFacturaSerializer(many=True, required=False)
     cliente_nombre = serializers.CharField(source='cliente.nombre_razon_social', read_only=True)
 
     class Meta:
@@ -30,29 +30,17 @@ class FacturaSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         items_data = validated_data.pop('items')
         factura = Factura.objects.create(**validated_data)
-
-        subtotal_factura = Decimal('0.00')
-        impuestos_factura = Decimal('0.00')
-
-        for item_data in items_data:
-            item = ItemFactura.objects.create(factura=factura, **item_data)  # usa save() -> calcula subtotal_linea
-            subtotal_factura += item.subtotal_linea
-            if item.lleva_iva:
-                impuestos_factura += item.subtotal_linea * IVA_RATE
-
-        factura.subtotal = subtotal_factura
-        factura.impuestos = impuestos_factura.quantize(Decimal('0.01'))
-        factura.total = subtotal_factura + impuestos_factura
-        factura.save()
-
+        factura.agregar_items(items_data)  # un solo INSERT; los totales se calculan una vez
+        factura.calcular_totales()
         return factura
 
     # ----- EDITAR (nuevo) -----
     @transaction.atomic
     def update(self, instance: Factura, validated_data):
         """
-        Edita encabezado y, si 'items' viene en el payload, reemplaza TODOS los ítems.
-        Si haces PATCH y no envías 'items', los ítems se mantienen igual.
+        Edita encabezado y, si 'items' viene en el payload, sincroniza los ítems por
+        'id' (actualiza, crea y borra solo lo necesario).
+        Si no envías 'items' (PUT o PATCH), los ítems se mantienen igual.
         """
         items_data = validated_data.pop('items', None)
 
@@ -62,27 +50,15 @@ class FacturaSerializer(serializers.ModelSerializer):
         instance.save()
 
         if items_data is not None:
-            # Reemplazo simple: borro y creo (suficiente para ahora)
-            instance.items.all().delete()
-
-            subtotal_factura = Decimal('0.00')
-            impuestos_factura = Decimal('0.00')
-
-            for item_data in items_data:
-                item = ItemFactura.objects.create(factura=instance, **item_data)
-                subtotal_factura += item.subtotal_linea
-                if item.lleva_iva:
-                    impuestos_factura += item.subtotal_linea * IVA_RATE
-
-            instance.subtotal = subtotal_factura
-            instance.impuestos = impuestos_factura.quantize(Decimal('0.01'))
-            instance.total = subtotal_factura + impuestos_factura
-            instance.save()
+            instance.sincronizar_items(items_data)
+            instance.calcular_totales()
 
         return instance
 
     # (Opcional) Si quieres evitar que una factura NO borrador sea editada:
     def validate(self, attrs):
+        if self.instance is None and 'items' not in attrs:
+            raise serializers.ValidationError({'items': 'Este campo es requerido.'})
         # Solo aplica cuando ya existe (update)
         if self.instance and self.instance.estado != 'borrador':
             # permite cambiar estado a 'emitida/pagada/anulada', pero bloquea edición de contenido si envían items
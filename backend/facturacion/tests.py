@@ -1,3 +1,141 @@
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from terceros.models import Tercero
+from .models import Factura, ItemFactura, totales_diferidos
+
+
+class SincronizarItemsTest(APITestCase):
+    """Editar los ítems de una factura solo escribe las líneas que cambian, emparejadas por 'id'."""
+
+    def setUp(self):
+        cliente = Tercero.objects.create(tipo_documento="NIT", numero_documento="900", nombre_razon_social="ACME")
+        self.factura = Factura.objects.create(
+            cliente=cliente, fecha_emision="2026-03-15", fecha_vencimiento="2026-04-15",
+        )
+        self.client.force_authenticate(User.objects.create_user("contador"))
+
+    def crear_items(self, n):
+        return self.factura.agregar_items(
+            {"descripcion": f"Item {i}", "cantidad": Decimal("1"), "precio_unitario": Decimal("100")}
+            for i in range(n)
+        )
+
+    def editar(self, items, metodo="patch"):
+        datos = {"items": items}
+        if metodo == "put":
+            datos.update(cliente=self.factura.cliente_id, fecha_emision="2026-03-15", fecha_vencimiento="2026-04-15")
+        with CaptureQueriesContext(connection) as ctx:
+            resp = getattr(self.client, metodo)(f"/api/facturacion/facturas/{self.factura.id}/", datos, format="json")
+        self.assertEqual(resp.status_code, 200, resp.data)
+        return len(ctx.captured_queries)
+
+    def sincronizar(self, n):
+        """Cambia el primer ítem, borra el segundo, conserva el resto y agrega uno nuevo."""
+        ItemFactura.objects.all().delete()
+        actuales = self.crear_items(n)
+        items = [{"id": str(actuales[0].id), "descripcion": "Cambiado", "cantidad": "2", "precio_unitario": "100"}]
+        items += [
+            {"id": it.id, "descripcion": it.descripcion, "cantidad": "1.00", "precio_unitario": "100.00"}
+            for it in actuales[2:]
+        ]
+        items.append({"descripcion": "Nuevo", "cantidad": "3", "precio_unitario": "10"})
+        consultas = self.editar(items)
+
+        self.assertEqual(ItemFactura.objects.get(id=actuales[0].id).descripcion, "Cambiado")
+        self.assertFalse(ItemFactura.objects.filter(id=actuales[1].id).exists())
+        self.assertEqual(
+            set(ItemFactura.objects.filter(descripcion__startswith="Item").values_list("id", flat=True)),
+            {it.id for it in actuales[2:]},
+        )
+        self.factura.refresh_from_db()
+        self.assertEqual(self.factura.subtotal, Decimal("200") + 100 * (n - 2) + Decimal("30"))
+        return consultas
+
+    def test_consultas_constantes(self):
+        pocas = self.sincronizar(3)
+        muchas = self.sincronizar(60)
+        self.assertEqual(pocas, muchas)
+
+    def test_put_con_items(self):
+        actual, = self.crear_items(1)
+        self.editar([{"id": actual.id, "descripcion": "Cambiado", "cantidad": "2", "precio_unitario": "50"}], "put")
+        self.assertEqual(list(self.factura.items.values_list("id", "descripcion")), [(actual.id, "Cambiado")])
+
+    def test_put_sin_items_los_conserva(self):
+        actuales = self.crear_items(2)
+        resp = self.client.put(
+            f"/api/facturacion/facturas/{self.factura.id}/",
+            {"cliente": self.factura.cliente_id, "fecha_emision": "2026-03-15", "fecha_vencimiento": "2026-05-15"},
+            format="json",
+        )
+        self.assertEqual(resp.status_code, 200, resp.data)
+        self.assertEqual(sorted(i["id"] for i in resp.data["items"]), [it.id for it in actuales])
+        self.factura.refresh_from_db()
+        self.assertEqual(str(self.factura.fecha_vencimiento), "2026-05-15")
+
+    def test_crear_sin_items(self):
+        resp = self.client.post(
+            "/api/facturacion/facturas/",
+            {"cliente": self.factura.cliente_id, "fecha_emision": "2026-03-15", "fecha_vencimiento": "2026-04-15"},
+            format="json",
+        )
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn("items", resp.data)
+
+    def test_item_invalido(self):
+        self.crear_items(1)
+        resp = self.client.patch(
+            f"/api/facturacion/facturas/{self.factura.id}/",
+            {"items": [{"descripcion": "x", "cantidad": None, "precio_unitario": "10"}]},
+            format="json",
+        )
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(self.factura.items.count(), 1)
+
+class TotalesFacturaTest(TestCase):
+    """Los totales salen de una consulta agregada y se recalculan por señal salvo en totales_diferidos()."""
+
+    def setUp(self):
+        cliente = Tercero.objects.create(tipo_documento="NIT", numero_documento="900", nombre_razon_social="ACME")
+        self.factura = Factura.objects.create(
+            cliente=cliente, fecha_emision="2026-03-15", fecha_vencimiento="2026-04-15",
+        )
+
+    def item(self, precio, lleva_iva=True):
+        return ItemFactura.objects.create(
+            factura=self.factura, descripcion="Item", cantidad=Decimal("2"), precio_unitario=Decimal(precio),
+            lleva_iva=lleva_iva,
+        )
+
+    def totales(self):
+        self.factura.refresh_from_db()
+        return self.factura.subtotal, self.factura.impuestos, self.factura.total
+
+    def test_calcular_totales(self):
+        self.factura.agregar_items([
+            {"descripcion": "Gravado", "cantidad": Decimal("2"), "precio_unitario": Decimal("100")},
+            {"descripcion": "Exento", "cantidad": Decimal("1"), "precio_unitario": Decimal("50"), "lleva_iva": False},
+        ])
+        with self.assertNumQueries(2):
+            self.factura.calcular_totales()
+        self.assertEqual(self.totales(), (Decimal("250"), Decimal("38"), Decimal("288")))
+
+    def test_senales_y_totales_diferidos(self):
+        gravado = self.item("100")
+        self.assertEqual(self.totales(), (Decimal("200"), Decimal("38"), Decimal("238")))
+
+        with totales_diferidos():
+            self.item("25", lleva_iva=False)
+            gravado.delete()
+        self.assertEqual(self.totales(), (Decimal("200"), Decimal("38"), Decimal("238")))
+        self.factura.calcular_totales()
+        self.assertEqual(self.totales(), (Decimal("50"), 0, Decimal("50")))
 
-# Create your tests here.
+        self.factura.items.get().delete()
+        self.assertEqual(self.totales(), (0, 0, 0))
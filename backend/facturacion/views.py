@@ -4,14 +4,13 @@ from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework.permissions import AllowAny  # DEV; en prod usa IsAuthenticated
 from rest_framework.permissions import IsAuthenticated
-from django.db import transaction
 from django.http import HttpResponse
 
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter
 from reportlab.lib.units import mm
 
-from .models import Factura, ItemFactura
+from .models import Factura
 from .serializers import FacturaSerializer
 
 
@@ -19,6 +18,8 @@ class FacturaViewSet(viewsets.ModelViewSet):
     """
     CRUD de facturas con items embebidos.
     - Solo se puede eliminar si estado == 'borrador'
+    - PUT/PATCH con 'items': se validan con ItemFacturaSerializer y se
+      sincronizan por 'id' (FacturaSerializer.update); totales una sola vez
     - Acción /pdf para ver/descargar el PDF
     """
 
@@ -41,39 +42,6 @@ class FacturaViewSet(viewsets.ModelViewSet):
             )
         return super().destroy(request, *args, **kwargs)
 
-    @transaction.atomic
-    def update(self, request, *args, **kwargs):
-        """
-        Actualiza factura y reemplaza sus items si 'items' viene en el payload.
-        """
-        partial = kwargs.pop('partial', False)
-        instance: Factura = self.get_object()
-        data = request.data.copy()
-
-        # Si el front manda items, los reemplazamos por simplicidad
-        items_data = data.pop("items", None)
-
-        # Validar/actualizar cabecera
-        serializer = self.get_serializer(instance, data=data, partial=partial)
-        serializer.is_valid(raise_exception=True)
-        self.perform_update(serializer)
-
-        # Reemplazo de items (opcional)
-        if items_data is not None:
-            instance.items.all().delete()
-            for it in items_data:
-                ItemFactura.objects.create(
-                    factura=instance,
-                    descripcion=it.get("descripcion", ""),
-                    cantidad=it.get("cantidad", 0),
-                    precio_unitario=it.get("precio_unitario", 0),
-                    lleva_iva=it.get("lleva_iva", True),
-                )
-            # recalcular totales
-            instance.calcular_totales()
-
-        return Response(self.get_serializer(instance).data, status=200)
-
     @action(detail=True, methods=["get"], url_path="pdf", permission_classes=[AllowAny])
     def pdf(self, request, pk=None):
         """
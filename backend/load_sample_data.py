@@ -6,6 +6,7 @@ from datetime import datetime, date, timedelta
 from decimal import Decimal
 from terceros.models import Tercero
 from contabilidad.models import Cuenta, AsientoContable, MovimientoContable
+from contabilidad import catalogo
 from facturacion.models import Factura, ItemFactura
 
 print("🚀 Cargando datos de prueba...")
@@ -102,6 +103,9 @@ for data in cuentas_data:
     if created:
         print(f"  ✅ Cuenta creada: {cuenta.codigo} - {cuenta.nombre}")
 
+# Tabla de ancestros (reportes por nivel PUC) y rutas del árbol
+catalogo.reconstruir_ancestros()
+
 # 3. Crear Asientos Contables de ejemplo
 print("\n📖 Creando asientos contables...")
 tercero1 = Tercero.objects.first()
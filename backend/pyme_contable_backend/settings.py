@@ -99,6 +99,25 @@ DATABASES = {
 }
 
 
+# Cache
+# "reportes" guarda resultados de reportes contables (ver contabilidad/cache_reportes.py).
+# LocMemCache desaloja por LRU al llegar a MAX_ENTRIES; para compartirla entre
+# procesos use p.ej. REPORTES_CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache
+# y REPORTES_CACHE_LOCATION=/var/tmp/pyme_reportes
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "reportes": {
+        "BACKEND": os.getenv("REPORTES_CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.getenv("REPORTES_CACHE_LOCATION", "reportes"),
+        "TIMEOUT": int(os.getenv("REPORTES_CACHE_TIMEOUT", 3600)),
+        "OPTIONS": {"MAX_ENTRIES": int(os.getenv("REPORTES_CACHE_MAX_ENTRIES", 300))},
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 